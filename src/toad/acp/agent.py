@@ -1,11 +1,9 @@
 import asyncio
 
 from datetime import datetime
-import json
 import os
 from pathlib import Path
-from typing import Any, cast, NamedTuple
-from copy import deepcopy
+from typing import Any, AsyncIterator, cast, NamedTuple
 
 import rich.repr
 
@@ -19,15 +17,23 @@ from toad.agent_schema import Agent as AgentData
 from toad.agent import AgentBase, AgentReady, AgentFail
 from toad.acp import protocol
 from toad.acp import api
-from toad.acp.api import API
 from toad.acp import messages
+from toad.acp.coalesce import ChunkCoalescer
 from toad.acp.prompt import build as build_prompt
+from toad.acp.terminals import TerminalRegistry, TerminalSession
 from toad import paths
+from toad.log_writer import get_log_writer
 from toad import constants
 from toad.answer import Answer
 
 PROTOCOL_VERSION = 1
 
+READ_SIZE = 256 * 1024
+"""Maximum number of bytes to read from the agent at once."""
+
+CHUNK_UPDATES = {"agent_message_chunk", "agent_thought_chunk"}
+"""Session updates which may be coalesced."""
+
 
 class Mode(NamedTuple):
     """An agent mode."""
@@ -62,16 +68,50 @@ def generate_datetime_filename(
     return file_name_stem + suffix
 
 
+async def read_line_batches(
+    reader: asyncio.StreamReader,
+) -> AsyncIterator[list[bytes]]:
+    """Read lines from a stream, in batches.
+
+    Each batch contains every complete line buffered at the time of the read, which
+    amortizes the cost of reading over many small lines.
+
+    Args:
+        reader: A stream reader.
+
+    Yields:
+        Lists of lines, without line endings.
+    """
+    partial: list[bytes] = []
+    while data := await reader.read(READ_SIZE):
+        if b"\n" not in data:
+            partial.append(data)
+            continue
+        if partial:
+            partial.append(data)
+            data = b"".join(partial)
+            partial.clear()
+        *lines, remainder = data.split(b"\n")
+        if remainder:
+            partial.append(remainder)
+        yield lines
+    if partial:
+        yield [b"".join(partial)]
+
+
 @rich.repr.auto
 class Agent(AgentBase):
     """An agent that speaks the APC (https://agentclientprotocol.com/overview/introduction) protocol."""
 
-    def __init__(self, project_root: Path, agent: AgentData) -> None:
+    def __init__(
+        self, project_root: Path, agent: AgentData, update_rate: float = 60.0
+    ) -> None:
         """
 
         Args:
             project_root: Project root path.
             command: Command to launch agent.
+            update_rate: Maximum number of message (and thought) updates per second.
         """
         super().__init__(project_root)
 
@@ -79,6 +119,8 @@ class Agent(AgentBase):
 
         self.server = jsonrpc.Server()
         self.server.expose_instance(self)
+        self.api = jsonrpc.API()
+        """Calls to the agent (for this connection only)."""
 
         self._agent_task: asyncio.Task | None = None
         self._task: asyncio.Task | None = None
@@ -97,8 +139,10 @@ class Agent(AgentBase):
         self.session_id: str = ""
         self.tool_calls: dict[str, protocol.ToolCall] = {}
         self._message_target: MessagePump | None = None
+        self._chunks = ChunkCoalescer(self.post_message, update_rate)
 
-        self._terminal_count: int = 0
+        self.terminals = TerminalRegistry()
+        """Terminals created by the agent."""
 
         log_filename: str = generate_datetime_filename(f"{agent['name']}", ".txt")
         if log_path := os.environ.get("TOAD_LOG"):
@@ -123,30 +167,7 @@ class Agent(AgentBase):
             line: Text to be logged.
 
         """
-        if self._message_target is not None:
-            self._message_target.call_later(self._log, line)
-
-    async def _log(self, line: str) -> None:
-        """Write text to the agent log file.
-
-        Intended to be called from `log`
-
-        Args:
-            line: Text to be logged.
-        """
-
-        if self._message_target is None:
-            return
-
-        def write_log(log_file_path: Path, line: str):
-            """Write log in a thread."""
-            try:
-                with log_file_path.open("at") as log_file:
-                    log_file.write(line)
-            except OSError:
-                pass
-
-        await asyncio.to_thread(write_log, self._log_file_path, line)
+        get_log_writer().write(self._log_file_path, line)
 
     def get_info(self) -> Content:
         agent_name = self._agent_data["name"]
@@ -172,13 +193,13 @@ class Agent(AgentBase):
         """
         assert self._process is not None, "Process should be present here"
 
-        self.log(f"[client] {request.body}")
+        self.log(f"[client] {request.body}\n")
         if (stdin := self._process.stdin) is not None:
             stdin.write(b"%s\n" % request.body_json)
 
     def request(self) -> jsonrpc.Request:
         """Create a request object."""
-        return API.request(self.send)
+        return self.api.request(self.send)
 
     def post_message(self, message: Message) -> bool:
         """Post a message to the message target (the Conversation).
@@ -193,7 +214,7 @@ class Agent(AgentBase):
             return False
         return message_target.post_message(message)
 
-    @jsonrpc.expose("session/update")
+    @jsonrpc.expose("session/update", validation="shallow")
     def rpc_session_update(
         self,
         sessionId: str,
@@ -211,18 +232,21 @@ class Agent(AgentBase):
             ) is not None:
                 status_line = open_hands_metrics.get("status_line")
 
+        if update.get("sessionUpdate") not in CHUNK_UPDATES:
+            self._chunks.flush()
+
         match update:
             case {
                 "sessionUpdate": "agent_message_chunk",
                 "content": {"type": type, "text": text},
             }:
-                self.post_message(messages.Update(type, text))
+                self._chunks.add(sessionId, messages.Update, type, text)
 
             case {
                 "sessionUpdate": "agent_thought_chunk",
                 "content": {"type": type, "text": text},
             }:
-                self.post_message(messages.Thinking(type, text))
+                self._chunks.add(sessionId, messages.Thinking, type, text)
 
             case {
                 "sessionUpdate": "tool_call",
@@ -239,13 +263,21 @@ class Agent(AgentBase):
                 "toolCallId": tool_call_id,
             }:
                 if tool_call_id in self.tool_calls:
-                    current_tool_call = self.tool_calls[tool_call_id]
-                    for key, value in update.items():
-                        if value is not None:
-                            current_tool_call[key] = value
-
+                    # Tool calls are never modified once posted, so the new tool call
+                    # shares unchanged values with the previous one (rather than copy)
+                    current_tool_call = self.tool_calls[tool_call_id] = cast(
+                        protocol.ToolCall,
+                        {
+                            **self.tool_calls[tool_call_id],
+                            **{
+                                key: value
+                                for key, value in update.items()
+                                if value is not None
+                            },
+                        },
+                    )
                     self.post_message(
-                        messages.ToolCallUpdate(deepcopy(current_tool_call), update)
+                        messages.ToolCallUpdate(current_tool_call, update)
                     )
                 else:
                     # The agent can send a tool call update, without previously sending the tool call *rolls eyes*
@@ -298,9 +330,9 @@ class Agent(AgentBase):
             permission_tool_call = toolCall.copy()
             permission_tool_call.pop("sessionUpdate", None)
             tool_call = cast(protocol.ToolCall, permission_tool_call)
-            self.tool_calls[tool_call_id] = deepcopy(tool_call)
+            self.tool_calls[tool_call_id] = tool_call
         else:
-            tool_call = deepcopy(self.tool_calls[tool_call_id])
+            tool_call = self.tool_calls[tool_call_id]
 
         message = messages.RequestPermission(options, tool_call, result_future)
         self.post_message(message)
@@ -348,8 +380,27 @@ class Agent(AgentBase):
         write_path = self.project_root_path / path
         write_path.write_text(content, encoding="utf-8", errors="ignore")
 
+    def _get_terminal(self, terminal_id: str) -> TerminalSession:
+        """Get a terminal session from its ID.
+
+        Args:
+            terminal_id: ID of the terminal.
+
+        Raises:
+            jsonrpc.JSONRPCError: If there is no terminal with the given ID.
+
+        Returns:
+            Terminal session.
+        """
+        if (session := self.terminals.get(terminal_id)) is None:
+            raise jsonrpc.JSONRPCError(
+                f"No terminal with id {terminal_id!r}",
+                code=jsonrpc.ErrorCode.INVALID_PARAMS,
+            )
+        return session
+
     # https://agentclientprotocol.com/protocol/schema#createterminalrequest
-    @jsonrpc.expose("terminal/create")
+    @jsonrpc.expose("terminal/create", concurrency=constants.TERMINAL_CONCURRENCY)
     async def rpc_terminal_create(
         self,
         command: str,
@@ -360,58 +411,47 @@ class Agent(AgentBase):
         outputByteLimit: int | None = None,
         sessionId: str | None = None,
     ) -> protocol.CreateTerminalResponse:
-        # Assign a terminal id
-        self._terminal_count = self._terminal_count + 1
-        terminal_id = f"terminal-{self._terminal_count}"
-
+        session = self.terminals.create(outputByteLimit)
         terminal_env = (
             {variable["name"]: variable["value"] for variable in env} if env else {}
         )
         result_future: asyncio.Future[bool] = asyncio.Future()
         self.post_message(
             messages.CreateTerminal(
-                terminal_id,
+                session,
                 command=command,
                 args=args,
                 cwd=cwd,
                 env=terminal_env,
-                output_byte_limit=outputByteLimit,
                 result_future=result_future,
             )
         )
         await result_future
         if not result_future.result():
+            self.terminals.release(session.terminal_id)
             raise jsonrpc.JSONRPCError("Failed to create a terminal.")
-        return {"terminalId": terminal_id}
+        return {"terminalId": session.terminal_id}
 
     # https://agentclientprotocol.com/protocol/schema#killterminalcommandrequest
     @jsonrpc.expose("terminal/kill")
     def rpc_terminal_kill(
         self, sessionID: str, terminalId: str, _meta: dict | None = None
     ) -> protocol.KillTerminalCommandResponse:
-        self.post_message(messages.KillTerminal(terminalId))
+        self._get_terminal(terminalId).kill()
         return {}
 
     # https://agentclientprotocol.com/protocol/schema#terminal%2Foutput
     @jsonrpc.expose("terminal/output")
-    async def rpc_terminal_output(
+    def rpc_terminal_output(
         self, sessionId: str, terminalId: str, _meta: dict | None = None
     ) -> protocol.TerminalOutputResponse:
-        from toad.widgets.terminal_tool import ToolState
-
-        result_future: asyncio.Future[ToolState] = asyncio.Future()
-
-        if not self.post_message(messages.GetTerminalState(terminalId, result_future)):
-            raise RuntimeError("Unable to get terminal output")
-
-        await result_future
-        terminal_state = result_future.result()
-
+        session = self._get_terminal(terminalId)
+        output, truncated = session.output.get_text()
         result: protocol.TerminalOutputResponse = {
-            "output": terminal_state.output,
-            "truncated": terminal_state.truncated,
+            "output": output,
+            "truncated": truncated,
         }
-        if (return_code := terminal_state.return_code) is not None:
+        if (return_code := session.return_code) is not None:
             result["exitStatus"] = {"exitCode": return_code}
         return result
 
@@ -420,7 +460,7 @@ class Agent(AgentBase):
     def rpc_terminal_release(
         self, sessionId: str, terminalId: str, _meta: dict | None = None
     ) -> protocol.ReleaseTerminalResponse:
-        self.post_message(messages.ReleaseTerminal(terminalId))
+        self.terminals.release(terminalId)
         return {}
 
     # https://agentclientprotocol.com/protocol/schema#terminal%2Fwait-for-exit
@@ -428,15 +468,8 @@ class Agent(AgentBase):
     async def rpc_terminal_wait_for_exit(
         self, sessionId: str, terminalId: str, _meta: dict | None = None
     ) -> protocol.WaitForTerminalExitResponse:
-        result_future: asyncio.Future[tuple[int, str | None]] = asyncio.Future()
-        if not self.post_message(
-            messages.WaitForTerminalExit(terminalId, result_future)
-        ):
-            raise RuntimeError("Unable to wait for terminal exit; no terminal found")
-
-        await result_future
-        return_code, signal = result_future.result()
-        return {"exitCode": return_code, "signal": signal}
+        return_code, signal = await self._get_terminal(terminalId).wait_for_exit()
+        return {"exitCode": return_code or 0, "signal": signal}
 
     async def _run_agent(self) -> None:
         """Task to communicate with the agent subprocess."""
@@ -473,59 +506,79 @@ class Agent(AgentBase):
         tasks: set[asyncio.Task] = set()
 
         async def call_jsonrpc(request: jsonrpc.JSONObject | jsonrpc.JSONList) -> None:
-            try:
-                if (result := await self.server.call(request)) is not None:
-                    result_json = json.dumps(result).encode("utf-8")
-                    if process.stdin is not None:
-                        process.stdin.write(b"%s\n" % result_json)
-            finally:
-                if (task := asyncio.current_task()) is not None:
-                    tasks.discard(task)
-
-        while line := await process.stdout.readline():
-            # This line should contain JSON, which may be:
+            """Call a method exposed to the agent, and send the result."""
+            if (result := await self.server.call(request)) is not None:
+                if process.stdin is not None:
+                    process.stdin.write(b"%s\n" % jsonrpc.dumps(result))
+
+        async for lines in read_line_batches(process.stdout):
+            # Each line should contain JSON, which may be:
             #   A) a JSONRPC request
             #   B) a JSONRPC response to a previous request
-            if not line.strip():
-                continue
-
-            try:
-                line_str = line.decode("utf-8")
-            except Exception as error:
-                self.log(f"[error] Unable to decode utf-8 from agent: {error}")
-                continue
-
-            self.log(f"[agent] {line_str}")
-            try:
-                agent_data: jsonrpc.JSONType = json.loads(line_str)
-            except Exception as error:
-                self.log(f"[error] failed to decode JSON from agent: {error}")
-                continue
-
-            if isinstance(agent_data, dict):
-                if "result" in agent_data or "error" in agent_data:
-                    API.process_response(agent_data)
+            log_lines: list[str] = []
+            batch: list[jsonrpc.JSONType] = []
+            for line in lines:
+                if not line.strip():
                     continue
-
-            elif isinstance(agent_data, list):
-                if not all(isinstance(datum, dict) for datum in agent_data):
-                    self.log(f"[error] Agent sent invalid data: {agent_data!r}")
+                try:
+                    line_str = line.decode("utf-8")
+                except Exception as error:
+                    log_lines.append(
+                        f"[error] Unable to decode utf-8 from agent: {error}\n"
+                    )
                     continue
-                if all(
-                    isinstance(datum, dict) and ("result" in datum or "error" in datum)
-                    for datum in agent_data
-                ):
-                    API.process_response(agent_data)
+                log_lines.append(f"[agent] {line_str}\n")
+                try:
+                    batch.append(jsonrpc.loads(line_str))
+                except Exception as error:
+                    log_lines.append(
+                        f"[error] failed to decode JSON from agent: {error}\n"
+                    )
+            if log_lines:
+                self.log("".join(log_lines))
+
+            for agent_data in batch:
+                if not (isinstance(agent_data, dict) and "id" not in agent_data):
+                    # Anything other than a notification must follow the preceding chunks
+                    self._chunks.flush()
+
+                if isinstance(agent_data, dict):
+                    if "result" in agent_data or "error" in agent_data:
+                        self.api.process_response(agent_data)
+                        continue
+
+                elif isinstance(agent_data, list):
+                    if not all(isinstance(datum, dict) for datum in agent_data):
+                        self.log(f"[error] Agent sent invalid data: {agent_data!r}\n")
+                        continue
+                    if all(
+                        isinstance(datum, dict)
+                        and ("result" in datum or "error" in datum)
+                        for datum in agent_data
+                    ):
+                        self.api.process_response(agent_data)
+                        continue
+
+                if not isinstance(agent_data, dict):
+                    self.log(f"[error] Invalid JSON from agent {agent_data!r}\n")
                     continue
 
-            if not isinstance(agent_data, dict):
-                self.log("[error] Invalid JSON from agent {agent_data!r}")
-                continue
-
-            # By this point we know it is a JSON RPC call
-            assert isinstance(agent_data, dict)
-            tasks.add(asyncio.create_task(call_jsonrpc(agent_data)))
-
+                # By this point we know it is a JSON RPC call
+                if "id" in agent_data:
+                    # A request may wait on the user, so run it in a task
+                    task = asyncio.create_task(call_jsonrpc(agent_data))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    # Notifications have no response, so dispatch them inline (in order)
+                    await call_jsonrpc(agent_data)
+
+        self._chunks.flush()
+        if outstanding := self.api.close("the agent process exited"):
+            self.log(
+                "[error] Agent exited with no response to "
+                f"{', '.join(repr(method_call.method) for method_call in outstanding)}\n"
+            )
         if process.returncode:
             assert process.stderr is not None
             fail_details = (await process.stderr.read()).decode("utf-8", "replace")
@@ -540,6 +593,7 @@ class Agent(AgentBase):
 
     async def stop(self) -> None:
         """Gracefully stop the process."""
+        self.terminals.release_all()
         if self._process is not None:
             self._process.terminate()
 
@@ -595,7 +649,7 @@ class Agent(AgentBase):
                 },
             )
 
-        response = await initialize_response.wait()
+        response = await initialize_response.wait(constants.ACP_TIMEOUT or None)
         assert response is not None
 
         # Store agents capabilities
@@ -611,7 +665,7 @@ class Agent(AgentBase):
                 str(self.project_root_path),
                 [],
             )
-        response = await session_new_response.wait()
+        response = await session_new_response.wait(constants.ACP_TIMEOUT or None)
         assert response is not None
         self.session_id = response["sessionId"]
         if (modes := response.get("modes", None)) is not None:
@@ -645,7 +699,7 @@ class Agent(AgentBase):
         with self.request():
             response = api.session_set_mode(self.session_id, mode_id)
         try:
-            await response.wait()
+            await response.wait(constants.ACP_TIMEOUT or None)
         except jsonrpc.APIError as error:
             match error.data:
                 case {"details": details}:
@@ -1,6 +1,9 @@
 # mypy: disable-error-code="empty-body"
 """
 ACP remote API
+
+Calls may be made within a request from the `jsonrpc.API` instance of an agent
+connection (see `Agent.request`), which tracks the responses for that connection.
 """
 
 from toad import jsonrpc
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Callable
+
+from textual.message import Message
+
+from toad.acp import messages
+
+type ChunkMessage = type[messages.Update] | type[messages.Thinking]
+
+
+class ChunkCoalescer:
+    """Merges consecutive message (and thought) chunks from an agent.
+
+    Agents may stream a chunk per token, which would otherwise mean a message, and a
+    Markdown update, per token. Consecutive chunks of the same kind are concatenated,
+    and posted at most once per frame, so the final text is unchanged.
+
+    """
+
+    def __init__(
+        self, post_message: Callable[[Message], bool], update_rate: float = 60.0
+    ) -> None:
+        """
+
+        Args:
+            post_message: Callable to post a message to the conversation.
+            update_rate: Maximum number of messages to post per second.
+        """
+        self._post_message = post_message
+        self._interval = 1 / update_rate
+        self._pending_key: tuple[str, ChunkMessage, str] | None = None
+        """Session ID, message type, and content type of the pending chunks."""
+        self._pending: list[str] = []
+        """Text of the pending chunks."""
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    def add(
+        self, session_id: str, message_type: ChunkMessage, content_type: str, text: str
+    ) -> None:
+        """Add a chunk, to be posted on the next frame.
+
+        Args:
+            session_id: Session the chunk belongs to.
+            message_type: Message to post.
+            content_type: Type of the content.
+            text: Text of the chunk.
+        """
+        key = (session_id, message_type, content_type)
+        if key != self._pending_key:
+            self.flush()
+            self._pending_key = key
+        self._pending.append(text)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self._interval, self.flush
+            )
+
+    def flush(self) -> None:
+        """Post pending chunks immediately.
+
+        Call this before posting any other message from the agent, to preserve order.
+
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending_key is None:
+            return
+        _session_id, message_type, content_type = self._pending_key
+        text = "".join(self._pending)
+        self._pending_key = None
+        self._pending.clear()
+        self._post_message(message_type(content_type, text))
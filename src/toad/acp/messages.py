@@ -14,7 +14,7 @@ from toad.acp.encode_tool_call_id import encode_tool_call_id
 from toad.acp.agent import Mode
 
 if TYPE_CHECKING:
-    from toad.widgets.terminal_tool import ToolState
+    from toad.acp.terminals import TerminalSession
 
 
 class AgentMessage(Message):
@@ -83,43 +83,17 @@ class AvailableCommandsUpdate(AgentMessage):
 class CreateTerminal(AgentMessage):
     """Request a terminal in the conversation."""
 
-    terminal_id: str
+    session: TerminalSession
     command: str
     result_future: Future[bool]
     args: list[str] | None = None
     cwd: str | None = None
     env: Mapping[str, str] | None = None
-    output_byte_limit: int | None = None
 
-
-@dataclass
-class KillTerminal(AgentMessage):
-    """Kill a terminal process."""
-
-    terminal_id: str
-
-
-@dataclass
-class GetTerminalState(AgentMessage):
-    """Get the state of the terminal."""
-
-    terminal_id: str
-    result_future: Future[ToolState]
-
-
-@dataclass
-class ReleaseTerminal(AgentMessage):
-    """Release the terminal."""
-
-    terminal_id: str
-
-
-@dataclass
-class WaitForTerminalExit(AgentMessage):
-    """Wait for the terminal to exit."""
-
-    terminal_id: str
-    result_future: Future[tuple[int, str | None]]
+    @property
+    def terminal_id(self) -> str:
+        """ID of the terminal."""
+        return self.session.terminal_id
 
 
 @rich.repr.auto
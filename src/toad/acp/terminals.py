@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+from asyncio.subprocess import Process
+
+import rich.repr
+
+from toad.output_buffer import OutputBuffer
+
+type ExitStatus = tuple[int | None, str | None]
+"""Return code and signal."""
+
+
+@rich.repr.auto
+class TerminalSession:
+    """The state of a terminal requested by an agent.
+
+    The `TerminalTool` widget runs the process, and writes to the session. The agent
+    answers requests for output (and waits for exit) from the session directly, without
+    a round trip through the conversation.
+
+    """
+
+    def __init__(self, terminal_id: str, output_byte_limit: int | None = None) -> None:
+        """
+
+        Args:
+            terminal_id: ID of the terminal.
+            output_byte_limit: Maximum number of bytes of output to retain.
+        """
+        self.terminal_id = terminal_id
+        self.output = OutputBuffer(output_byte_limit)
+        self.process: Process | None = None
+        self.return_code: int | None = None
+        self.released = False
+        self._exit_future: asyncio.Future[ExitStatus] = (
+            asyncio.get_running_loop().create_future()
+        )
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield self.terminal_id
+        yield "return_code", self.return_code, None
+        yield "released", self.released, False
+
+    @property
+    def exited(self) -> bool:
+        """Has the process exited (or failed to start)?"""
+        return self._exit_future.done()
+
+    def set_exit(self, return_code: int | None, signal: str | None = None) -> None:
+        """Record the process exit.
+
+        Args:
+            return_code: Return code, or `None` if the process didn't start.
+            signal: Signal which terminated the process, if known.
+        """
+        self.return_code = return_code
+        if not self._exit_future.done():
+            self._exit_future.set_result((return_code, signal))
+
+    async def wait_for_exit(self) -> ExitStatus:
+        """Wait for the process to exit.
+
+        Returns:
+            Return code and signal.
+        """
+        return await asyncio.shield(self._exit_future)
+
+    def kill(self) -> bool:
+        """Kill the process.
+
+        Returns:
+            `True` if the process was killed, or `False` if there was no running process.
+        """
+        if self.exited or self.process is None:
+            return False
+        try:
+            self.process.kill()
+        except Exception:
+            return False
+        return True
+
+
+class TerminalRegistry:
+    """The terminals created by an agent session, by ID."""
+
+    def __init__(self) -> None:
+        self._terminals: dict[str, TerminalSession] = {}
+        self._terminal_count = 0
+
+    def __len__(self) -> int:
+        return len(self._terminals)
+
+    def create(self, output_byte_limit: int | None = None) -> TerminalSession:
+        """Create a new terminal session, with a new ID.
+
+        Args:
+            output_byte_limit: Maximum number of bytes of output to retain.
+
+        Returns:
+            Terminal session.
+        """
+        self._terminal_count += 1
+        terminal_id = f"terminal-{self._terminal_count}"
+        session = self._terminals[terminal_id] = TerminalSession(
+            terminal_id, output_byte_limit
+        )
+        return session
+
+    def get(self, terminal_id: str) -> TerminalSession | None:
+        """Get a terminal session.
+
+        Args:
+            terminal_id: ID of the terminal.
+
+        Returns:
+            Terminal session, or `None` if there is no terminal with that ID (or it
+                was released).
+        """
+        return self._terminals.get(terminal_id)
+
+    def release(self, terminal_id: str) -> None:
+        """Kill the terminal process (if running), and forget the terminal.
+
+        Args:
+            terminal_id: ID of the terminal.
+        """
+        if (session := self._terminals.pop(terminal_id, None)) is not None:
+            session.kill()
+            session.released = True
+
+    def release_all(self) -> None:
+        """Release all terminals."""
+        for terminal_id in list(self._terminals):
+            self.release(terminal_id)
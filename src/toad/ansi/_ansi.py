@@ -1,12 +1,25 @@
 from __future__ import annotations
 
 import io
+from bisect import bisect_right
 from itertools import accumulate
+from operator import attrgetter
 import re2 as re
 
 from dataclasses import dataclass, field
 from functools import lru_cache
-from typing import Any, Awaitable, Callable, Iterable, Literal, Mapping, NamedTuple
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Mapping,
+    NamedTuple,
+    Sequence,
+    overload,
+)
 
 import rich.repr
 
@@ -17,8 +30,12 @@ from textual.geometry import clamp
 from textual.style import Style, NULL_STYLE
 
 from toad.ansi._ansi_colors import ANSI_COLORS
+from toad.ansi._ansi_scanner import ANSIScanner
+from toad.ansi._cells import CellGrid, CellRow
 from toad.ansi._keys import TERMINAL_KEY_MAP, CURSOR_KEYS_APPLICATION
 from toad.ansi._control_codes import CONTROL_CODES
+from toad.ansi._fold_index import FoldIndex
+from toad.ansi._scrollback import ScrollbackLines
 from toad.ansi._sgr_styles import SGR_STYLES
 from toad.ansi._stream_parser import (
     StreamParser,
@@ -27,7 +44,6 @@ from toad.ansi._stream_parser import (
     Pattern,
     PatternCheck,
     ParseResult,
-    Token,
 )
 
 from toad.dec import CHARSET_MAP
@@ -139,8 +155,13 @@ class FEPattern(Pattern):
                 return ("control", character)
 
 
-class ANSIParser(StreamParser[tuple[str, str]]):
-    """Parse a stream of text containing escape sequences in to logical tokens."""
+class GeneratorANSIParser(StreamParser[tuple[str, str]]):
+    """Parse a stream of text containing escape sequences in to logical tokens.
+
+    This is the reference implementation, which processes escape sequences a character
+    at a time. See `ANSIParser` for the faster equivalent.
+
+    """
 
     def parse(self) -> ParseResult[tuple[str, str]]:
         NEW_LINE = "\n"
@@ -162,8 +183,15 @@ class ANSIParser(StreamParser[tuple[str, str]]):
             yield "content", token.text
 
 
+class ANSIParser(ANSIScanner):
+    """Parse a stream of text containing escape sequences in to logical tokens."""
+
+
 EMPTY_LINE = Content()
 
+REFLOW_SLICE_LINES = 2000
+"""Default number of lines to fold per call to `TerminalState.continue_reflow`."""
+
 
 type ClearType = Literal["cursor_to_end", "cursor_to_beginning", "screen", "scrollback"]
 ANSI_CLEAR: Mapping[int, ClearType] = {
@@ -423,9 +451,25 @@ class ANSIStream:
             `ANSICommand` instances.
         """
 
+        on_token = self.on_token
         for token in self.parser.feed(text):
-            if not isinstance(token, Token):
-                yield from self.on_token(token)
+            yield from on_token(token)
+
+    def feed_sequences(self, text: str) -> Iterable[ANSICommand]:
+        """Feed text, and parse only the escape sequences.
+
+        Text and separators are skipped, so no `ANSIContent` (or new lines) are
+        produced.
+
+        Args:
+            text: Text to feed.
+
+        Yields:
+            `ANSICommand` instances.
+        """
+        on_token = self.on_token
+        for token in self.parser.feed_sequences(text):
+            yield from on_token(token)
 
     ANSI_SEPARATORS = {
         "\n": ANSICursor(delta_y=+1, absolute_x=0),
@@ -553,9 +597,10 @@ class ANSIStream:
                 case ["2", _, "K"]:
                     return cls.CLEAR_LINE
                 case [top, bottom, "r"]:
+                    # Lines are numbered from 1, but a 0 is treated as a 1
                     return ANSIScrollMargin(
-                        int(top or "1") - 1 if top else None,
-                        int(bottom or "1") - 1 if top else None,
+                        max(0, int(top) - 1) if top else None,
+                        max(0, int(bottom or "1") - 1) if top else None,
                     )
                 case ["4", _, "h" | "l" as replace_mode]:
                     return (
@@ -722,10 +767,16 @@ class LineFold(NamedTuple):
 
 @dataclass
 class LineRecord:
-    """A single line in the terminal."""
+    """A single line in the terminal.
 
-    content: Content
-    """The content."""
+    Content appended to the end of a line is stored as a list of pieces, which are only
+    joined when the content is read. Programs which write very long lines in many small
+    chunks would otherwise rebuild the entire line for each chunk.
+
+    """
+
+    _content: Content
+    """The content, excluding pieces appended since it was last read."""
 
     style: Style = NULL_STYLE
     """The style for the remaining line."""
@@ -736,6 +787,67 @@ class LineRecord:
     updates: int = 0
     """An integer used for caching."""
 
+    fold_key: tuple[int, int, bool] | None = None
+    """The updates, width, and auto wrap the folds were created with, or `None` if unknown."""
+
+    previous_folds: tuple[tuple[int, int, bool], list[LineFold]] | None = None
+    """The fold key and folds prior to the most recent reflow."""
+
+    _pieces: list[Content] | None = None
+    """Content appended to the line, yet to be joined."""
+
+    _length: int = -1
+    """Length of the content including pieces, or -1 if not yet calculated."""
+
+    _cell_length: int = -1
+    """Cell length of the content (with tabs expanded), or -1 if unknown."""
+
+    @property
+    def content(self) -> Content:
+        """The content."""
+        if self._pieces is not None:
+            self._content = Content.assemble(
+                self._content, *self._pieces, strip_control_codes=False
+            )
+            self._pieces = None
+        return self._content
+
+    @content.setter
+    def content(self, content: Content) -> None:
+        self._content = content
+        self._pieces = None
+        self._length = -1
+        self._cell_length = -1
+
+    @property
+    def content_length(self) -> int:
+        """Length of the content, without joining appended pieces."""
+        if self._length == -1:
+            self._length = len(self._content)
+        return self._length
+
+    @property
+    def cell_length(self) -> int:
+        """Cell length of the content, with tabs expanded."""
+        if self._cell_length == -1:
+            self._cell_length = self.content.expand_tabs(8).cell_length
+        return self._cell_length
+
+    def append(self, content: Content) -> None:
+        """Append content to the end of the line.
+
+        Args:
+            content: Content to append (which should not contain tabs).
+        """
+        length = self.content_length
+        cell_length = self.cell_length
+        if self._pieces is None:
+            self._pieces = [content]
+        else:
+            self._pieces.append(content)
+        self._length = length + len(content)
+        self._cell_length = cell_length + content.cell_length
+
 
 @rich.repr.auto
 class ScrollMargin(NamedTuple):
@@ -765,18 +877,77 @@ class ScrollMargin(NamedTuple):
         )
 
 
+class FoldedLines(Sequence[LineFold]):
+    """A read-only view of the folded lines in a buffer."""
+
+    __slots__ = ["_lines", "_fold_index"]
+
+    def __init__(
+        self, lines: list[LineRecord] | ScrollbackLines, fold_index: FoldIndex
+    ) -> None:
+        self._lines = lines
+        self._fold_index = fold_index
+
+    def __len__(self) -> int:
+        return self._fold_index.total
+
+    @overload
+    def __getitem__(self, index: int) -> LineFold: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[LineFold]: ...
+
+    def __getitem__(self, index: int | slice) -> LineFold | list[LineFold]:
+        if isinstance(index, slice):
+            return [self[folded_line_no] for folded_line_no in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        line_no, line_offset = self._fold_index.find(index)
+        return self._lines[line_no].folds[line_offset]
+
+    def __iter__(self) -> Iterator[LineFold]:
+        for line in self._lines:
+            yield from line.folds
+
+
+class LineToFold(Sequence[int]):
+    """A read-only view which maps unfolded line numbers on to folded line numbers."""
+
+    __slots__ = ["_fold_index"]
+
+    def __init__(self, fold_index: FoldIndex) -> None:
+        self._fold_index = fold_index
+
+    def __len__(self) -> int:
+        return len(self._fold_index)
+
+    @overload
+    def __getitem__(self, index: int) -> int: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[int]: ...
+
+    def __getitem__(self, index: int | slice) -> int | list[int]:
+        if isinstance(index, slice):
+            return [self[line_no] for line_no in range(len(self))[index]]
+        line_count = len(self._fold_index)
+        if index < 0:
+            index += line_count
+        if not 0 <= index < line_count:
+            raise IndexError("line out of range")
+        return self._fold_index.prefix(index)
+
+
 @dataclass
 class Buffer:
     """A terminal buffer (scrollback or alternate)"""
 
     name: str = "buffer"
     """Name of the buffer (debugging aid)."""
-    lines: list[LineRecord] = field(default_factory=list)
+    lines: list[LineRecord] | ScrollbackLines = field(default_factory=list)
     """unfolded lines."""
-    line_to_fold: list[int] = field(default_factory=list)
-    """An index from folded lines on to unfolded lines."""
-    folded_lines: list[LineFold] = field(default_factory=list)
-    """Folded lines."""
+    fold_index: FoldIndex = field(default_factory=FoldIndex)
+    """Number of folds per unfolded line."""
     scroll_margin: ScrollMargin = ScrollMargin(None, None)
     """Scroll margins"""
     cursor_line: int = 0
@@ -787,8 +958,23 @@ class Buffer:
     """The longest line in the buffer."""
     updates: int = 0
     """Updates count (used in caching)."""
+    reflow_end: int = 0
+    """Lines prior to this index are yet to be folded following a change of width."""
+    reflow_cursor: tuple[tuple[int, int], tuple[int, int, int]] | None = None
+    """The unfolded cursor when a reflow started, and the folded cursor and line count
+    after the last slice of the reflow."""
+    cells: CellGrid | None = None
+    """Lines being drawn, which are yet to be written back (alternate screen only)."""
     _updated_lines: set[int] | None = None
 
+    def __post_init__(self) -> None:
+        if len(self.fold_index) != len(self.lines):
+            self.fold_index.rebuild(len(line.folds) for line in self.lines)
+        self.line_to_fold = LineToFold(self.fold_index)
+        """An index from unfolded lines on to folded lines."""
+        self.folded_lines = FoldedLines(self.lines, self.fold_index)
+        """Folded lines."""
+
     @property
     def line_count(self) -> int:
         """Total number of lines."""
@@ -797,8 +983,7 @@ class Buffer:
     @property
     def height(self) -> int:
         """Height of the buffer (number of folded lines)."""
-        height = len(self.folded_lines)
-        return height
+        return self.fold_index.total
 
     @property
     def last_line_no(self) -> int:
@@ -808,26 +993,23 @@ class Buffer:
     @property
     def unfolded_line(self) -> int:
         """THh unfolded line index under the cursor."""
-        cursor_folded_line = self.folded_lines[self.cursor_line]
-        return cursor_folded_line.line_no
+        line_no, _line_offset = self.fold_index.find(self.cursor_line)
+        return line_no
 
     @property
     def cursor(self) -> tuple[int, int]:
         """The cursor offset within the un-folded lines."""
 
-        if self.cursor_line >= len(self.folded_lines):
-            return (len(self.folded_lines), 0)
-        cursor_folded_line = self.folded_lines[self.cursor_line]
-        cursor_line_offset = cursor_folded_line.line_offset
-        line_no = cursor_folded_line.line_no
-        line = self.lines[line_no]
-        position = 0
-        for folded_line_offset, folded_line in enumerate(line.folds):
-            if folded_line_offset == cursor_line_offset:
-                position += self.cursor_offset
-                break
-            position += len(folded_line.content)
-
+        if self.cursor_line >= self.height:
+            return (self.height, 0)
+        line_no, cursor_line_offset = self.fold_index.find(self.cursor_line)
+        folds = self.lines[line_no].folds
+        if cursor_line_offset < len(folds):
+            position = folds[cursor_line_offset].offset + self.cursor_offset
+        elif folds:
+            position = folds[-1].offset + len(folds[-1].content)
+        else:
+            position = 0
         return (line_no, position)
 
     @property
@@ -846,23 +1028,18 @@ class Buffer:
             line_no: Unfolded line number.
             cursor_line_offset: Offset within the line.
         """
-        line = self.lines[line_no]
-        fold_line_start = self.line_to_fold[line_no]
-        position = 0
-        fold_offset = 0
-        for fold_offset, fold in enumerate(line.folds):
-            line_length = len(fold.content)
-            if (
-                cursor_line_offset >= position
-                and cursor_line_offset < position + line_length
-            ):
-                self.cursor_line = fold_line_start + fold_offset
-                self.cursor_offset = cursor_line_offset - position
-                break
-            position += line_length
-        else:
-            self.cursor_line = fold_line_start + len(line.folds) - 1
-            self.cursor_offset = len(line.folds[-1].content)
+        folds = self.lines[line_no].folds
+        fold_line_start = self.fold_index.prefix(line_no)
+        # Folds are in offset order, so the fold under the cursor may be bisected
+        fold_offset = bisect_right(folds, cursor_line_offset, key=attrgetter("offset"))
+        if fold_offset:
+            fold = folds[fold_offset - 1]
+            if cursor_line_offset < fold.offset + len(fold.content):
+                self.cursor_line = fold_line_start + fold_offset - 1
+                self.cursor_offset = cursor_line_offset - fold.offset
+                return
+        self.cursor_line = fold_line_start + len(folds) - 1
+        self.cursor_offset = len(folds[-1].content)
 
     def update_line(self, line_no: int) -> None:
         """Record an updated line.
@@ -873,6 +1050,35 @@ class Buffer:
         if self._updated_lines is not None:
             self._updated_lines.add(line_no)
 
+    def append_line(self, line_record: LineRecord) -> None:
+        """Add a line to the end of the buffer.
+
+        Args:
+            line_record: New line.
+        """
+        self.lines.append(line_record)
+        self.fold_index.append(len(line_record.folds))
+
+    def set_folds(self, line_no: int, folds: list[LineFold]) -> None:
+        """Replace the folds of a line.
+
+        Args:
+            line_no: Unfolded line number.
+            folds: New folds.
+        """
+        self.lines[line_no].folds = folds
+        self.fold_index.set_count(line_no, len(folds))
+
+    def truncate(self, line_count: int) -> None:
+        """Remove lines from the end of the buffer.
+
+        Args:
+            line_count: Number of lines to keep.
+        """
+        del self.lines[line_count:]
+        self.fold_index.truncate(line_count)
+        self.reflow_end = min(self.reflow_end, line_count)
+
     def clear(self, updates: int) -> None:
         """Clear the buffer to its initial state.
 
@@ -881,8 +1087,9 @@ class Buffer:
 
         """
         del self.lines[:]
-        del self.line_to_fold[:]
-        del self.folded_lines[:]
+        self.fold_index.clear()
+        self.reflow_end = 0
+        self.reflow_cursor = None
         self.cursor_line = 0
         self.cursor_offset = 0
         self.max_line_width = 0
@@ -891,10 +1098,7 @@ class Buffer:
     def remove_last_line(self) -> None:
         if not self.lines:
             return
-        last_line_index = len(self.lines) - 1
-        del self.lines[-1]
-        del self.folded_lines[self.line_to_fold[last_line_index] :]
-        del self.line_to_fold[last_line_index]
+        self.truncate(len(self.lines) - 1)
         self.updates += 1
 
 
@@ -963,11 +1167,14 @@ class TerminalState:
         *,
         width: int = 80,
         height: int = 24,
+        scrollback_lines: int | None = None,
     ) -> None:
         """
         Args:
             width: Initial width.
             height: Initial height.
+            scrollback_lines: Maximum number of scrollback lines to keep in memory
+                (older lines are moved to disk), or `None` for no limit.
         """
         self._write_stdin = write_stdin
 
@@ -996,9 +1203,12 @@ class TerminalState:
         """Should content wrap?"""
         self.current_directory: str = ""
         """Current working directory."""
-        self.scrollback_buffer = Buffer("scrollback")
+        self._scrollback_lines = ScrollbackLines(self._fold_line)
+        # Lines on screen are always kept in memory
+        self._scrollback_lines.keep_lines = height
+        self.scrollback_buffer = Buffer("scrollback", self._scrollback_lines)
         """Scrollbar buffer lines."""
-        self.alternate_buffer = Buffer("alternate")
+        self.alternate_buffer = Buffer("alternate", cells=CellGrid())
         """Alternate buffer lines."""
         self.dec_state = DECState()
         """The DEC (character set) state."""
@@ -1008,6 +1218,8 @@ class TerminalState:
         self._updates: int = 0
         """Incrementing integer used in caching."""
 
+        self.scrollback_lines = scrollback_lines
+
     def __rich_repr__(self) -> rich.repr.Result:
         yield "width", self.width
         yield "height", self.height
@@ -1035,6 +1247,15 @@ class TerminalState:
     def screen_end_line_no(self) -> int:
         return self.buffer.line_count
 
+    @property
+    def scrollback_lines(self) -> int | None:
+        """Maximum number of scrollback lines to keep in memory, or `None` for no limit."""
+        return self._scrollback_lines.max_lines
+
+    @scrollback_lines.setter
+    def scrollback_lines(self, scrollback_lines: int | None) -> None:
+        self._scrollback_lines.max_lines = scrollback_lines
+
     @property
     def updates(self) -> int:
         """An integer that advanvces when the state is changed."""
@@ -1072,6 +1293,7 @@ class TerminalState:
             self.width = width
         if height is not None:
             self.height = height
+            self._scrollback_lines.keep_lines = height
 
         if previous_width != width:
             self._reflow()
@@ -1120,34 +1342,80 @@ class TerminalState:
                 break
             buffer.remove_last_line()
 
+    @property
+    def reflow_pending(self) -> bool:
+        """Are there lines yet to be folded following a change of width?"""
+        return bool(
+            self.scrollback_buffer.reflow_end or self.alternate_buffer.reflow_end
+        )
+
     def _reflow(self) -> None:
+        """Refold the current buffer following a change of width.
+
+        Only the lines at the end of the buffer (where the cursor typically is) are folded
+        immediately. Call `continue_reflow` to fold the remaining lines.
+
+        """
         buffer = self.buffer
         if not buffer.lines:
             return
+        buffer.reflow_end = len(buffer.lines)
+        buffer.reflow_cursor = None
+        self._reflow_lines(buffer, max(self.height, 1) * 2)
+
+    def continue_reflow(self, line_count: int = REFLOW_SLICE_LINES) -> bool:
+        """Fold some of the lines remaining from a reflow.
+
+        Lines are folded from the end of the buffer towards the start. The lines yet to be
+        folded retain their previous folds, so the buffer remains consistent between calls.
+
+        Args:
+            line_count: Maximum number of lines to fold per buffer.
+
+        Returns:
+            `True` if there are more lines to fold, or `False` if the reflow is complete.
+        """
+        for buffer in (self.scrollback_buffer, self.alternate_buffer):
+            if buffer.reflow_end:
+                self._reflow_lines(buffer, line_count)
+        return self.reflow_pending
 
+    def _reflow_lines(self, buffer: Buffer, line_count: int) -> None:
+        """Fold lines preceding `buffer.reflow_end`, and update the cursor.
+
+        Args:
+            buffer: Buffer to reflow.
+            line_count: Maximum number of lines to fold.
+        """
         buffer._updated_lines = None
         # Unfolded cursor position
-        cursor_line, cursor_offset = buffer.cursor
-
-        buffer.folded_lines.clear()
-        buffer.line_to_fold.clear()
-        width = self.width
+        reflow_cursor = buffer.reflow_cursor
+        if reflow_cursor is not None and reflow_cursor[1] == (
+            buffer.cursor_line,
+            buffer.cursor_offset,
+            len(buffer.lines),
+        ):
+            # Unchanged since the last slice, where the mapping may not round trip
+            cursor_line, cursor_offset = reflow_cursor[0]
+        else:
+            cursor_line, cursor_offset = buffer.cursor
 
-        for line_no, line_record in enumerate(buffer.lines):
-            line_expanded_tabs = line_record.content.expand_tabs(8)
-            line_record.folds[:] = self._fold_line(line_no, line_expanded_tabs, width)
-            line_record.updates = self.advance_updates()
-            buffer.line_to_fold.append(len(buffer.folded_lines))
-            buffer.folded_lines.extend(line_record.folds)
+        reflow_end = buffer.reflow_end
+        reflow_start = max(0, reflow_end - line_count)
+        refold_line = self._refold_line
+        for line_no in range(reflow_start, reflow_end):
+            refold_line(buffer, line_no)
+        buffer.reflow_end = reflow_start
+        buffer.updates = self.advance_updates()
 
         # After reflow, we need to work out where the cursor is within the folded lines
         # cursor_line = min(cursor_line, len(buffer.lines) - 1)
         if cursor_line >= len(buffer.lines):
-            buffer.cursor_line = len(buffer.lines)
+            buffer.cursor_line = buffer.fold_index.total
             buffer.cursor_offset = 0
         else:
             line = buffer.lines[cursor_line]
-            fold_cursor_line = buffer.line_to_fold[cursor_line]
+            fold_cursor_line = buffer.fold_index.prefix(cursor_line)
 
             fold_cursor_offset = 0
             for fold in reversed(line.folds):
@@ -1158,6 +1426,46 @@ class TerminalState:
 
             buffer.cursor_line = fold_cursor_line
             buffer.cursor_offset = fold_cursor_offset
+        if buffer.reflow_end:
+            buffer.reflow_cursor = (
+                (cursor_line, cursor_offset),
+                (buffer.cursor_line, buffer.cursor_offset, len(buffer.lines)),
+            )
+        else:
+            buffer.reflow_cursor = None
+
+    def _refold_line(self, buffer: Buffer, line_no: int) -> None:
+        """Fold a line to the current width.
+
+        The folds from before the previous reflow are retained, so that toggling between
+        two widths doesn't require folding again.
+
+        Args:
+            buffer: Buffer containing the line.
+            line_no: Unfolded line number.
+        """
+        line_record = buffer.lines[line_no]
+        width = self.width
+        auto_wrap = self.auto_wrap
+        fold_key = (line_record.updates, width, auto_wrap)
+        if line_record.fold_key != fold_key:
+            previous_folds = line_record.previous_folds
+            if previous_folds is not None and previous_folds[0] == fold_key:
+                folds = previous_folds[1]
+            else:
+                folds = self._fold_line(
+                    line_no, line_record.content.expand_tabs(8), width
+                )
+            line_record.previous_folds = (
+                None
+                if line_record.fold_key is None
+                else (line_record.fold_key, line_record.folds)
+            )
+            line_record.folds = folds
+            line_record.fold_key = fold_key
+            buffer.fold_index.set_count(line_no, len(folds))
+        if isinstance(buffer.lines, ScrollbackLines):
+            buffer.lines.set_folded(line_no, width, auto_wrap)
 
     async def write(
         self, text: str, *, hide_output: bool = False
@@ -1179,12 +1487,14 @@ class TerminalState:
         scrollback_buffer._updated_lines = set()
         # Write sequences and update
         if hide_output:
-            for ansi_command in self._ansi_stream.feed(text):
-                if not isinstance(ansi_command, (ANSIContent, ANSICursor)):
+            # Only escape sequences which change state are required
+            for ansi_command in self._ansi_stream.feed_sequences(text):
+                if not isinstance(ansi_command, ANSICursor):
                     await self._handle_ansi_command(ansi_command)
         else:
             for ansi_command in self._ansi_stream.feed(text):
                 await self._handle_ansi_command(ansi_command)
+        self._flush_cells(alternate_buffer)
 
         # Get deltas
         scrollback_updates = (
@@ -1205,34 +1515,29 @@ class TerminalState:
 
     def get_cursor_line_offset(self, buffer: Buffer) -> int:
         """The cursor offset within the un-folded lines."""
-        cursor_folded_line = buffer.folded_lines[buffer.cursor_line]
-        cursor_line_offset = cursor_folded_line.line_offset
-        line_no = cursor_folded_line.line_no
-        line = buffer.lines[line_no]
-        position = 0
-        for folded_line_offset, folded_line in enumerate(line.folds):
-            if folded_line_offset == cursor_line_offset:
-                position += buffer.cursor_offset
-                break
-            position += len(folded_line.content)
-        return position
+        line_no, cursor_line_offset = buffer.fold_index.find(buffer.cursor_line)
+        folds = buffer.lines[line_no].folds
+        if cursor_line_offset < len(folds):
+            return folds[cursor_line_offset].offset + buffer.cursor_offset
+        if not folds:
+            return 0
+        last_fold = folds[-1]
+        return last_fold.offset + len(last_fold.content)
 
     def clear_buffer(self, clear: ClearType) -> None:
         buffer = self.buffer
+        self._flush_cells(buffer)
         if clear == "screen":
             buffer.clear(self.advance_updates())
             # for _ in range(self.height):
             #     self.add_line(buffer, EMPTY_CONTENT)
         elif clear == "cursor_to_end":
             buffer._updated_lines = None
-            folded_cursor_line = buffer.cursor_line
             cursor_line, cursor_line_offset = buffer.cursor
-            while buffer.cursor_line >= len(buffer.folded_lines):
+            while buffer.cursor_line >= buffer.height:
                 self.add_line(buffer, EMPTY_LINE)
             line = buffer.lines[cursor_line]
-            del buffer.lines[cursor_line + 1 :]
-            del buffer.line_to_fold[cursor_line + 1 :]
-            del buffer.folded_lines[folded_cursor_line + 1 :]
+            buffer.truncate(cursor_line + 1)
             self.update_line(buffer, cursor_line, line.content[:cursor_line_offset])
         else:
             # print(f"TODO: clear_buffer({clear!r})")
@@ -1241,44 +1546,85 @@ class TerminalState:
     def scroll_buffer(self, direction: int, lines: int) -> None:
         """Scroll the buffer.
 
+        Line records within the scroll margins are moved, rather than copied, so lines
+        which move keep their folds (and their rendering may be cached).
+
         Args:
             direction: +1 for down, -1 for up.
             lines: Number of lines.
         """
         buffer = self.buffer
+        self._flush_cells(buffer)
         margin_top, margin_bottom = buffer.scroll_margin.get_line_range(self.height)
+        # Negative line numbers would wrap around to the end of the buffer
+        margin_top = max(0, margin_top)
+        if margin_top > margin_bottom:
+            return
+        while buffer.line_count <= margin_bottom:
+            self.add_line(buffer, EMPTY_LINE)
+        margin_bottom = min(margin_bottom, buffer.line_count - 1)
 
+        line_records = buffer.lines
+        region = [
+            line_records[line_no] for line_no in range(margin_top, margin_bottom + 1)
+        ]
+        scroll_count = min(max(lines, 0), len(region))
+        blank_lines: list[LineRecord | None] = [None] * scroll_count
         if direction == -1:
             # up (first in test)
-            for line_no in range(margin_top, margin_bottom + 1):
-                copy_line_no = line_no + lines
-                copy_content = EMPTY_CONTENT
-                copy_style = NULL_STYLE
-                if copy_line_no <= margin_bottom:
-                    try:
-                        copy_line = buffer.lines[copy_line_no]
-                    except IndexError:
-                        pass
-                    else:
-                        copy_content = copy_line.content
-                        copy_style = copy_line.style
-
-                self.update_line(buffer, line_no, copy_content, copy_style)
+            scrolled_region = [*region[scroll_count:], *blank_lines]
         else:
             # down
-            for line_no in reversed(range(margin_top, margin_bottom + 1)):
-                copy_line_no = line_no - lines
-                copy_content = EMPTY_CONTENT
-                copy_style = NULL_STYLE
-                if copy_line_no >= margin_top:
-                    try:
-                        copy_line = buffer.lines[copy_line_no]
-                    except IndexError:
-                        pass
-                    else:
-                        copy_content = copy_line.content
-                        copy_style = copy_line.style
-                self.update_line(buffer, line_no, copy_content, copy_style)
+            scrolled_region = [*blank_lines, *region[: len(region) - scroll_count]]
+
+        fold_index = buffer.fold_index
+        fold_count = fold_index.total
+        width = self.width
+        auto_wrap = self.auto_wrap
+        for line_no, (line_record, previous_line_record) in enumerate(
+            zip(scrolled_region, region), margin_top
+        ):
+            if line_record is None:
+                updates = self.advance_updates()
+                line_record = LineRecord(
+                    EMPTY_CONTENT,
+                    NULL_STYLE,
+                    self._fold_line(line_no, EMPTY_CONTENT, width),
+                    updates,
+                    (updates, width, auto_wrap),
+                )
+            elif (fold_key := line_record.fold_key) is None or fold_key[1:] != (
+                width,
+                auto_wrap,
+            ):
+                # Folded to a different width, or unknown
+                line_record.folds = self._fold_line(
+                    line_no, line_record.content.expand_tabs(8), width
+                )
+                line_record.updates = self.advance_updates()
+                line_record.fold_key = (line_record.updates, width, auto_wrap)
+                line_record.previous_folds = None
+            elif line_record is not previous_line_record:
+                line_record.folds = [
+                    fold._replace(line_no=line_no) for fold in line_record.folds
+                ]
+                line_record.previous_folds = None
+            else:
+                continue
+            line_records[line_no] = line_record
+            fold_index.set_count(line_no, len(line_record.folds))
+
+        if buffer._updated_lines is not None:
+            if fold_index.total != fold_count:
+                # Lines after the scroll region have moved
+                buffer._updated_lines = None
+            else:
+                buffer._updated_lines.update(
+                    range(
+                        fold_index.prefix(margin_top),
+                        fold_index.prefix(margin_bottom + 1),
+                    )
+                )
 
     @classmethod
     def _expand_content(cls, content: Content, offset: int, style: Style) -> Content:
@@ -1310,6 +1656,9 @@ class TerminalState:
 
             case ANSIContent(text):
                 buffer = self.buffer
+                if self._write_cells(buffer, text):
+                    return
+                self._flush_cells(buffer)
                 folded_lines = buffer.folded_lines
                 while buffer.cursor_line >= len(folded_lines):
                     self.add_line(buffer, EMPTY_LINE)
@@ -1319,16 +1668,22 @@ class TerminalState:
                 line = buffer.lines[line_no]
 
                 cursor_line_offset = self.get_cursor_line_offset(buffer)
-                line_content = line.content
-                if cursor_line_offset > len(line_content):
-                    line_content = self._expand_content(
-                        line_content, cursor_line_offset, line.style
-                    )
                 content = Content.styled(
                     self.dec_state.translate(text),
                     self.style,
                     strip_control_codes=False,
                 )
+                if cursor_line_offset == line.content_length and self._append_line(
+                    buffer, line_no, content
+                ):
+                    buffer.update_cursor(line_no, cursor_line_offset + len(content))
+                    buffer.updates = self.advance_updates()
+                    return
+                line_content = line.content
+                if cursor_line_offset > len(line_content):
+                    line_content = self._expand_content(
+                        line_content, cursor_line_offset, line.style
+                    )
                 if self.replace_mode:
                     updated_line = Content.assemble(
                         line_content[:cursor_line_offset],
@@ -1388,7 +1743,10 @@ class TerminalState:
                 if update_background:
                     line.style = self.style
 
-                if clear_range is not None:
+                if clear_range is not None and not self._clear_cells(
+                    buffer, ansi_command
+                ):
+                    self._flush_cells(buffer)
                     cursor_line_offset = self.get_cursor_line_offset(buffer)
 
                     line_content = line.content
@@ -1454,6 +1812,8 @@ class TerminalState:
                     self._line_updated(buffer, buffer.cursor_line)
 
             case ANSIFeatures() as features:
+                # Lines in the grid are folded with the current features
+                self._flush_cells(self.alternate_buffer)
                 if features.show_cursor is not None:
                     self.show_cursor = features.show_cursor
                 if features.alternate_screen is not None:
@@ -1512,6 +1872,125 @@ class TerminalState:
             case _:
                 print("Unhandled", ansi_command)
 
+    def _get_cell_row(self, buffer: Buffer) -> tuple[int, CellRow] | None:
+        """Get the row in the cell grid under the cursor, copying the line if necessary.
+
+        Args:
+            buffer: Buffer.
+
+        Returns:
+            A tuple of line number and row, or `None` if the line can't be stored
+                in the grid.
+        """
+        if (cells := buffer.cells) is None:
+            return None
+        if buffer.cursor_line >= buffer.fold_index.total:
+            return None
+        line_no, line_offset = buffer.fold_index.find(buffer.cursor_line)
+        if line_offset:
+            return None
+        if (row := cells.rows.get(line_no)) is None:
+            line = buffer.lines[line_no]
+            if (
+                len(line.folds) != 1
+                or (row := cells.load(line_no, line.content)) is None
+            ):
+                return None
+        return line_no, row
+
+    def _write_cells(self, buffer: Buffer, text: str) -> bool:
+        """Write text to the cell grid, if possible.
+
+        The text must not wrap, since the line isn't refolded until the grid
+        is flushed.
+
+        Args:
+            buffer: Buffer.
+            text: Text to write at the cursor.
+
+        Returns:
+            `True` if the text was written, or `False` if it must be written to the line.
+        """
+        if buffer.cells is None:
+            return False
+        text = self.dec_state.translate(text)
+        if not CellGrid.is_single_cell(text):
+            return False
+        if (cell_row := self._get_cell_row(buffer)) is None:
+            return False
+        line_no, row = cell_row
+        offset = buffer.cursor_offset
+        if self.replace_mode:
+            length = max(len(row), offset + len(text))
+        else:
+            length = max(len(row), offset) + len(text)
+        if self.auto_wrap and length > self.width:
+            return False
+        cells = buffer.cells
+        cells.write(
+            row,
+            offset,
+            text,
+            cells.get_style_id(self.style),
+            cells.get_style_id(buffer.lines[line_no].style),
+            self.replace_mode,
+        )
+        buffer.cursor_offset = offset + len(text)
+        buffer.max_line_width = max(buffer.max_line_width, len(row))
+        if buffer._updated_lines is not None:
+            buffer._updated_lines.add(buffer.cursor_line)
+        buffer.updates = self.advance_updates()
+        return True
+
+    def _clear_cells(self, buffer: Buffer, ansi_command: ANSICursor) -> bool:
+        """Clear a range in the cell grid, if possible.
+
+        Args:
+            buffer: Buffer.
+            ansi_command: Cursor command with a clear range.
+
+        Returns:
+            `True` if the range was cleared, or `False` if it must be cleared in the line.
+        """
+        if (cell_row := self._get_cell_row(buffer)) is None:
+            return False
+        line_no, row = cell_row
+        offset = buffer.cursor_offset
+        clear_start, clear_end = ansi_command.get_clear_offsets(
+            offset, max(len(row), offset)
+        )
+        length = CellGrid.get_length(
+            len(row), offset, clear_start, clear_end, ansi_command.erase
+        )
+        if self.auto_wrap and length > self.width:
+            return False
+        cells = buffer.cells
+        assert cells is not None
+        cells.clear(
+            row,
+            offset,
+            clear_start,
+            clear_end,
+            cells.get_style_id(self.style),
+            cells.get_style_id(buffer.lines[line_no].style),
+            ansi_command.erase,
+        )
+        buffer.max_line_width = max(buffer.max_line_width, len(row))
+        if buffer._updated_lines is not None:
+            buffer._updated_lines.add(buffer.cursor_line)
+        return True
+
+    def _flush_cells(self, buffer: Buffer) -> None:
+        """Write lines in the cell grid back to the buffer.
+
+        Args:
+            buffer: Buffer.
+        """
+        if (cells := buffer.cells) is None or not cells.rows:
+            return
+        for line_no, content in cells.flush():
+            self.update_line(buffer, line_no, content)
+
     def _line_updated(self, buffer: Buffer, line_no: int) -> None:
         """Mark a line has having been udpated.
 
@@ -1526,9 +2005,11 @@ class TerminalState:
         except IndexError:
             pass
 
-    def _fold_line(self, line_no: int, line: Content, width: int) -> list[LineFold]:
+    def _fold_line(
+        self, line_no: int, line: Content, width: int, auto_wrap: bool | None = None
+    ) -> list[LineFold]:
         updates = self._updates
-        if not self.auto_wrap:
+        if not (self.auto_wrap if auto_wrap is None else auto_wrap):
             return [LineFold(line_no, 0, 0, line, updates)]
         if not width:
             return [LineFold(0, 0, 0, line, updates)]
@@ -1559,19 +2040,72 @@ class TerminalState:
             self._fold_line(line_no, content, width),
             updates,
         )
-        buffer.lines.append(line_record)
-        folds = line_record.folds
-        buffer.line_to_fold.append(len(buffer.folded_lines))
-        fold_count = len(buffer.folded_lines)
+        fold_count = buffer.height
+        buffer.append_line(line_record)
         if buffer._updated_lines is not None:
-            buffer._updated_lines.update(range(fold_count, fold_count + len(folds)))
-        buffer.folded_lines.extend(folds)
+            buffer._updated_lines.update(
+                range(fold_count, fold_count + len(line_record.folds))
+            )
         buffer.updates = updates
 
+    def _append_line(self, buffer: Buffer, line_no: int, content: Content) -> bool:
+        """Append content to the end of a line, refolding only the last fold.
+
+        Args:
+            buffer: Buffer.
+            line_no: Line number (unfolded).
+            content: Content to append.
+
+        Returns:
+            `True` if the content was appended, or `False` if the line must be updated
+                in full.
+        """
+        width = self.width
+        line_record = buffer.lines[line_no]
+        folds = line_record.folds
+        fold_key = line_record.fold_key
+        if (
+            not (self.auto_wrap and width and folds)
+            or fold_key is None
+            or fold_key[1:] != (width, True)
+            or "\t" in content.plain
+        ):
+            return False
+        last_fold = folds[-1]
+        fold_offset = last_fold.offset
+        if fold_offset + len(last_fold.content) != line_record.content_length:
+            # Tabs were expanded, so offsets in the folds don't match the content
+            return False
+
+        line_record.append(content)
+        buffer.max_line_width = max(line_record.cell_length, buffer.max_line_width)
+        line_offset = last_fold.line_offset
+        tail_folds = [
+            fold._replace(
+                line_offset=line_offset + fold.line_offset,
+                offset=fold_offset + fold.offset,
+            )
+            for fold in self._fold_line(line_no, last_fold.content + content, width)
+        ]
+        folds[line_offset:] = tail_folds
+        buffer.fold_index.set_count(line_no, len(folds))
+        line_record.updates = self.advance_updates()
+        line_record.fold_key = (line_record.updates, width, True)
+        line_record.previous_folds = None
+        # Write back, in case the line was evicted from memory
+        buffer.lines[line_no] = line_record
+
+        if buffer._updated_lines is not None:
+            fold_start = buffer.fold_index.prefix(line_no)
+            buffer._updated_lines.update(
+                range(fold_start + line_offset, fold_start + len(folds))
+            )
+        return True
+
     def update_line(
         self, buffer: Buffer, line_index: int, line: Content, style: Style | None = None
     ) -> None:
-        """Update a line (potentially refolding and moving subsequencte lines down).
+        """Update a line (potentially refolding, which moves subsequent folds down).
 
         Args:
             buffer: Buffer.
@@ -1588,25 +2122,20 @@ class TerminalState:
         )
         line_record = buffer.lines[line_index]
         line_record.content = line
+        line_record._cell_length = line_expanded_tabs.cell_length
         if style is not None:
             line_record.style = style
-        line_record.folds[:] = self._fold_line(
-            line_index, line_expanded_tabs, self.width
+        buffer.set_folds(
+            line_index, self._fold_line(line_index, line_expanded_tabs, self.width)
         )
         line_record.updates = self.advance_updates()
+        line_record.fold_key = (line_record.updates, self.width, self.auto_wrap)
+        line_record.previous_folds = None
+        # Write back, in case the line was evicted from memory
+        buffer.lines[line_index] = line_record
 
         if buffer._updated_lines is not None:
-            fold_start = buffer.line_to_fold[line_index]
+            fold_start = buffer.fold_index.prefix(line_index)
             buffer._updated_lines.update(
                 range(fold_start, fold_start + len(line_record.folds))
             )
-
-        fold_line = buffer.line_to_fold[line_index]
-        del buffer.line_to_fold[line_index:]
-        del buffer.folded_lines[fold_line:]
-
-        for line_no in range(line_index, buffer.line_count):
-            line_record = buffer.lines[line_no]
-            buffer.line_to_fold.append(len(buffer.folded_lines))
-            for fold in line_record.folds:
-                buffer.folded_lines.append(fold)
@@ -0,0 +1,210 @@
+"""
+A table-driven scanner for streams containing ANSI escape sequences.
+
+Produces the same `(kind, text)` tokens as the generator based parser, but consumes
+whole runs of plain text and whole escape sequences per step.
+
+"""
+
+from __future__ import annotations
+
+import re  # re2 re-encodes the entire string when matching from an offset
+
+from typing import Iterable
+
+type ScanToken = tuple[str, str]
+
+ESCAPE = "\x1b"
+SEPARATORS = frozenset({"\n", "\r", "\x08"})
+
+# Line boundaries (other than \n and \r) recognized by str.splitlines.
+# Content tokens end after these, for compatibility with the generator parser.
+LINE_BOUNDARIES = "\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+CONTENT = re.compile(f"[^\n\r\x08\x1b{LINE_BOUNDARIES}]*[{LINE_BOUNDARIES}]?")
+
+CSI_END = re.compile(r"[\x40-\x7e]")
+OSC_END = re.compile(r"[\x07\x9c]|\x1b\\")
+DCS_END = re.compile(r"\x9c|\x1b\\")
+
+STRING_TERMINATOR = "\x1b\\"
+"""ST (string terminator). Note the generator parser stores the backslash twice."""
+
+BODY_SEQUENCES = {
+    "[": ("csi", CSI_END),
+    "]": ("osc", OSC_END),
+    "P": ("dcs", DCS_END),
+}
+"""Sequences with a variable length body, mapped on to token name and terminator regex."""
+
+CHARACTER_SET_FINAL = frozenset(map(chr, range(0x30, 0x7E + 1)))
+CHARACTER_SET_INTRODUCERS = frozenset({"(", ")", "*", "+", "-", ".", "/"})
+DEC_INVOKE = frozenset({"n", "o", "~", "}", "|", "N", "O"})
+TWO_CHARACTER_SEQUENCES = {"#": "la", " ": "sp"}
+
+
+class ANSIScanner:
+    """Scans a stream of text in to `(kind, text)` tokens.
+
+    Escape sequences may be split over multiple calls to `feed`.
+
+    """
+
+    def __init__(self) -> None:
+        self._pending: list[str] | None = None
+        """Parts of an incomplete escape sequence (excluding the ESC), or `None`."""
+
+    def feed(self, text: str) -> Iterable[ScanToken]:
+        """Feed text in to the scanner.
+
+        Args:
+            text: Text from stream.
+
+        Yields:
+            Tuples of token kind and text.
+        """
+        if not text:
+            return
+        position = 0
+        length = len(text)
+        if self._pending is not None:
+            position, token = self._resume(text)
+            if token is not None:
+                yield token
+
+        match_content = CONTENT.match
+        scan_sequence = self._scan_sequence
+        while position < length:
+            character = text[position]
+            if character == ESCAPE:
+                position, token = scan_sequence(text, position + 1)
+                if token is not None:
+                    yield token
+            elif character in SEPARATORS:
+                yield ("separator", character)
+                position += 1
+            else:
+                content_match = match_content(text, position)
+                position = content_match.end()
+                yield ("content", content_match.group())
+
+    def feed_sequences(self, text: str) -> Iterable[ScanToken]:
+        """Feed text in to the scanner, skipping everything but escape sequences.
+
+        Used when output is hidden, where only the state changed by escape sequences
+        is required. Runs of text are skipped without creating tokens.
+
+        Args:
+            text: Text from stream.
+
+        Yields:
+            Tuples of token kind and text, for escape sequences only.
+        """
+        if not text:
+            return
+        position = 0
+        if self._pending is not None:
+            position, token = self._resume(text)
+            if token is not None:
+                yield token
+
+        find_escape = text.find
+        scan_sequence = self._scan_sequence
+        while (position := find_escape(ESCAPE, position)) != -1:
+            position, token = scan_sequence(text, position + 1)
+            if token is not None:
+                yield token
+
+    def _resume(self, text: str) -> tuple[int, ScanToken | None]:
+        """Continue scanning an escape sequence from a previous call to `feed`.
+
+        Args:
+            text: New text.
+
+        Returns:
+            Offset following the sequence, and a token (or `None`).
+        """
+        assert self._pending is not None
+        pending = self._pending
+        self._pending = None
+        introducer = pending[0]
+        if introducer in BODY_SEQUENCES:
+            if (
+                introducer != "["
+                and pending[-1].endswith(ESCAPE)
+                and text.startswith("\\")
+            ):
+                # String terminator straddles the two chunks
+                name = BODY_SEQUENCES[introducer][0]
+                return 1, (name, f"{''.join(pending)}\\\\")
+            return self._scan_body(introducer, text, 0, pending)
+
+        # Escape or introducer without its final character; cheap to re-scan
+        prefix = pending[0]
+        position, token = self._scan_sequence(prefix + text, 0)
+        return max(0, position - len(prefix)), token
+
+    def _scan_body(
+        self, introducer: str, text: str, position: int, parts: list[str]
+    ) -> tuple[int, ScanToken | None]:
+        """Scan the body of a CSI, OSC, or DCS sequence.
+
+        Args:
+            introducer: Character following ESC.
+            text: Text to scan.
+            position: Offset of the first body character in `text`.
+            parts: Previously scanned parts of the sequence.
+
+        Returns:
+            Offset following the sequence, and a token (or `None` if incomplete).
+        """
+        name, end_regex = BODY_SEQUENCES[introducer]
+        if (end_match := end_regex.search(text, position)) is None:
+            if position < len(text):
+                parts.append(text[position:])
+            self._pending = parts
+            return len(text), None
+        end = end_match.end()
+        sequence = "".join(parts) + text[position:end]
+        if introducer != "[" and end_match.group() == STRING_TERMINATOR:
+            sequence += "\\"
+        return end, (name, sequence)
+
+    def _scan_sequence(self, text: str, position: int) -> tuple[int, ScanToken | None]:
+        """Scan an escape sequence.
+
+        Args:
+            text: Text to scan.
+            position: Offset of the character following ESC.
+
+        Returns:
+            Offset following the sequence, and a token (or `None` if the sequence
+                was invalid or incomplete).
+        """
+        length = len(text)
+        if position >= length:
+            self._pending = [""]
+            return length, None
+
+        introducer = text[position]
+        if introducer in BODY_SEQUENCES:
+            return self._scan_body(introducer, text, position + 1, [introducer])
+
+        if introducer in DEC_INVOKE:
+            return position + 1, ("dec_invoke", introducer)
+
+        if introducer in CHARACTER_SET_INTRODUCERS:
+            if position + 1 >= length:
+                self._pending = [introducer]
+                return length, None
+            final = text[position + 1]
+            if final not in CHARACTER_SET_FINAL:
+                return position + 2, None
+            return position + 2, ("dec", introducer + final)
+
+        if (name := TWO_CHARACTER_SEQUENCES.get(introducer)) is not None:
+            if position + 1 >= length:
+                self._pending = [introducer]
+                return length, None
+            return position + 2, (name, text[position : position + 2])
+
+        return position + 1, ("control", introducer)
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+from array import array
+from itertools import pairwise
+
+from rich.cells import cell_len
+from textual.content import Content, Span
+from textual.style import Style, NULL_STYLE
+
+
+class CellRow:
+    """The characters of a line, and the id of each character's style."""
+
+    __slots__ = ["characters", "styles"]
+
+    def __init__(self, characters: array[str], styles: array[int]) -> None:
+        self.characters = characters
+        self.styles = styles
+
+    def __len__(self) -> int:
+        return len(self.characters)
+
+
+class CellGrid:
+    """A grid of cells, for the lines of the alternate screen which are being drawn.
+
+    Writing to a line of `Content` means slicing and re-assembling the line, and
+    refolding it, for every write. Full screen applications write to the screen in
+    many small pieces, so lines are instead copied in to arrays of characters and
+    style ids, which are written to in place, and converted back to `Content` once per
+    batch of writes.
+
+    Only lines where one character is one cell (no tabs, or double width characters)
+    may be copied in to the grid.
+
+    """
+
+    MAX_STYLES = 4096
+    """Maximum number of styles before the style table is reset."""
+
+    def __init__(self) -> None:
+        self.rows: dict[int, CellRow] = {}
+        """Rows in the grid, keyed by line number."""
+        self._styles: list[Style] = [NULL_STYLE]
+        self._style_ids: dict[Style, int] = {NULL_STYLE: 0}
+        self._last_style: Style = NULL_STYLE
+        self._last_style_id = 0
+
+    def get_style_id(self, style: Style) -> int:
+        """Get an id for the given style, adding it to the table if necessary.
+
+        Args:
+            style: A style.
+
+        Returns:
+            Integer id.
+        """
+        if style is self._last_style:
+            return self._last_style_id
+        if (style_id := self._style_ids.get(style)) is None:
+            style_id = self._style_ids[style] = len(self._styles)
+            self._styles.append(style)
+        self._last_style = style
+        self._last_style_id = style_id
+        return style_id
+
+    @classmethod
+    def is_single_cell(cls, text: str) -> bool:
+        """Check if every character in the text is a single cell.
+
+        Args:
+            text: Text to check.
+
+        Returns:
+            `True` if the text may be written to the grid.
+        """
+        return "\t" not in text and cell_len(text) == len(text)
+
+    def load(self, line_no: int, content: Content) -> CellRow | None:
+        """Copy a line in to the grid.
+
+        Args:
+            line_no: Line number.
+            content: Content of the line.
+
+        Returns:
+            A row, or `None` if the line can't be stored in the grid.
+        """
+        text = content.plain
+        if not self.is_single_cell(text):
+            return None
+        spans = content.spans
+        if not all(isinstance(span.style, Style) for span in spans):
+            return None
+        length = len(text)
+        styles = array("I", [0]) * length
+        if spans:
+            get_style_id = self.get_style_id
+            if all(span.start >= previous.end for previous, span in pairwise(spans)):
+                for start, end, style in spans:
+                    end = min(end, length)
+                    if end > start:
+                        styles[start:end] = array("I", [get_style_id(style)]) * (
+                            end - start
+                        )
+            else:
+                # Overlapping spans are combined (as they are when rendered)
+                offsets = sorted(
+                    {0, length, *[offset for span in spans for offset in span[:2]]}
+                )
+                for start, end in pairwise(offsets):
+                    if start >= length:
+                        break
+                    style = Style.combine(
+                        [
+                            span.style
+                            for span in spans
+                            if span.start <= start and span.end >= end
+                        ]  # type: ignore[misc]
+                    )
+                    styles[start:end] = array("I", [get_style_id(style)]) * (
+                        end - start
+                    )
+        row = self.rows[line_no] = CellRow(array("w", text), styles)
+        return row
+
+    def write(
+        self,
+        row: CellRow,
+        offset: int,
+        text: str,
+        style_id: int,
+        pad_style_id: int,
+        replace: bool = True,
+    ) -> None:
+        """Write text in to a row.
+
+        Args:
+            row: Row to write to.
+            offset: Offset of the first character.
+            text: Text to write.
+            style_id: Style of the text.
+            pad_style_id: Style of spaces added if the offset is past the end of the row.
+            replace: Replace characters (`True`) or insert (`False`)?
+        """
+        characters = row.characters
+        styles = row.styles
+        if (pad := offset - len(characters)) > 0:
+            characters.extend(" " * pad)
+            styles.extend(array("I", [pad_style_id]) * pad)
+        text_length = len(text)
+        end = offset + text_length if replace else offset
+        characters[offset:end] = array("w", text)
+        styles[offset:end] = array("I", [style_id]) * text_length
+
+    def clear(
+        self,
+        row: CellRow,
+        offset: int,
+        start: int,
+        end: int,
+        style_id: int,
+        pad_style_id: int,
+        erase: bool = False,
+    ) -> None:
+        """Clear a range of cells.
+
+        Args:
+            row: Row to clear.
+            offset: Cursor offset (the row is padded to this length).
+            start: Start of range.
+            end: End of range (inclusive).
+            style_id: Style of the spaces which replace the range.
+            pad_style_id: Style of spaces added if the offset is past the end of the row.
+            erase: Remove the range (`True`), or replace it with spaces (`False`).
+        """
+        characters = row.characters
+        styles = row.styles
+        if (pad := offset - len(characters)) > 0:
+            characters.extend(" " * pad)
+            styles.extend(array("I", [pad_style_id]) * pad)
+        blank_width = 0 if erase else max(0, end - start + 1)
+        row.characters = (
+            characters[:start] + array("w", " " * blank_width) + characters[end + 1 :]
+        )
+        row.styles = (
+            styles[:start] + array("I", [style_id]) * blank_width + styles[end + 1 :]
+        )
+
+    @classmethod
+    def get_length(
+        cls, length: int, offset: int, start: int, end: int, erase: bool = False
+    ) -> int:
+        """Get the length of a row after a call to `clear`.
+
+        Args:
+            length: Length of the row.
+            offset: Cursor offset.
+            start: Start of range.
+            end: End of range (inclusive).
+            erase: Remove the range (`True`), or replace it with spaces (`False`).
+
+        Returns:
+            New length.
+        """
+        cells = range(max(length, offset))
+        blank_width = 0 if erase else max(0, end - start + 1)
+        return len(cells[:start]) + blank_width + len(cells[end + 1 :])
+
+    def to_content(self, row: CellRow) -> Content:
+        """Convert a row to Content.
+
+        Args:
+            row: A row.
+
+        Returns:
+            Content for the row.
+        """
+        styles = row.styles
+        style_table = self._styles
+        spans: list[Span] = []
+        start = 0
+        length = len(styles)
+        while start < length:
+            style_id = styles[start]
+            end = start + 1
+            while end < length and styles[end] == style_id:
+                end += 1
+            if style_id:
+                spans.append(Span(start, end, style_table[style_id]))
+            start = end
+        return Content(
+            row.characters.tounicode(), spans, length, strip_control_codes=False
+        )
+
+    def flush(self) -> list[tuple[int, Content]]:
+        """Remove all rows from the grid.
+
+        Returns:
+            A list of line numbers and content, in line order.
+        """
+        to_content = self.to_content
+        lines = [
+            (line_no, to_content(row)) for line_no, row in sorted(self.rows.items())
+        ]
+        self.rows.clear()
+        if len(self._styles) > self.MAX_STYLES:
+            del self._styles[1:]
+            self._style_ids = {NULL_STYLE: 0}
+            self._last_style = NULL_STYLE
+            self._last_style_id = 0
+        return lines
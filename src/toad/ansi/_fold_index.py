@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+import rich.repr
+
+
+@rich.repr.auto
+class FoldIndex:
+    """Maps unfolded line numbers on to folded line numbers (and back again).
+
+    Stores the number of folds in each line in a Fenwick (binary indexed) tree,
+    so that updating the fold count of a line, and mapping between folded and
+    unfolded line numbers are O(log n).
+
+    """
+
+    __slots__ = ["_counts", "_tree"]
+
+    def __init__(self, counts: Iterable[int] = ()) -> None:
+        """
+        Args:
+            counts: Initial fold counts per line.
+        """
+        self._counts: list[int] = []
+        self._tree: list[int] = [0]
+        self.rebuild(counts)
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield "lines", len(self._counts)
+        yield "folds", self.total
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    @property
+    def total(self) -> int:
+        """Total number of folded lines."""
+        return self.prefix(len(self._counts))
+
+    def rebuild(self, counts: Iterable[int]) -> None:
+        """Replace all fold counts (O(n)).
+
+        Args:
+            counts: Fold counts per line.
+        """
+        self._counts[:] = counts
+        size = len(self._counts)
+        tree = self._tree = [0, *self._counts]
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+
+    def clear(self) -> None:
+        """Remove all lines."""
+        self._counts.clear()
+        self._tree[1:] = []
+
+    def append(self, count: int) -> None:
+        """Add a line.
+
+        Args:
+            count: Number of folds in the new line.
+        """
+        counts = self._counts
+        counts.append(count)
+        index = len(counts)
+        # The new node covers the range (index - lowbit, index]
+        self._tree.append(
+            count + self.prefix(index - 1) - self.prefix(index - (index & -index))
+        )
+
+    def truncate(self, line_count: int) -> None:
+        """Remove lines from the end, so that `line_count` lines remain.
+
+        Args:
+            line_count: Number of lines to keep.
+        """
+        # Nodes only cover lines at or below their own index, so the tail can be dropped.
+        del self._counts[line_count:]
+        del self._tree[line_count + 1 :]
+
+    def get_count(self, line_no: int) -> int:
+        """Get the number of folds in a line.
+
+        Args:
+            line_no: Unfolded line number.
+
+        Returns:
+            Number of folds.
+        """
+        return self._counts[line_no]
+
+    def set_count(self, line_no: int, count: int) -> None:
+        """Update the number of folds in a line.
+
+        Args:
+            line_no: Unfolded line number.
+            count: New number of folds.
+
+        Raises:
+            IndexError: If the line is out of range.
+        """
+        if not 0 <= line_no < len(self._counts):
+            raise IndexError("line out of range")
+        delta = count - self._counts[line_no]
+        if not delta:
+            return
+        self._counts[line_no] = count
+        tree = self._tree
+        size = len(self._counts)
+        index = line_no + 1
+        while index <= size:
+            tree[index] += delta
+            index += index & -index
+
+    def prefix(self, line_no: int) -> int:
+        """Get the number of folded lines preceding the given line.
+
+        Args:
+            line_no: Unfolded line number, or the number of lines for the total.
+
+        Raises:
+            IndexError: If the line is out of range.
+
+        Returns:
+            Folded line number of the first fold in `line_no`.
+        """
+        if not 0 <= line_no <= len(self._counts):
+            raise IndexError("line out of range")
+        tree = self._tree
+        total = 0
+        index = line_no
+        while index > 0:
+            total += tree[index]
+            index &= index - 1
+        return total
+
+    def find(self, folded_line_no: int) -> tuple[int, int]:
+        """Find the line containing a folded line.
+
+        Args:
+            folded_line_no: Folded line number.
+
+        Raises:
+            IndexError: If the folded line is out of range.
+
+        Returns:
+            A tuple of the unfolded line number and the offset of the fold within it.
+        """
+        if folded_line_no < 0:
+            raise IndexError("folded line out of range")
+        tree = self._tree
+        size = len(self._counts)
+        position = 0
+        remaining = folded_line_no
+        step = 1 << size.bit_length()
+        while step:
+            next_position = position + step
+            if next_position <= size and tree[next_position] <= remaining:
+                position = next_position
+                remaining -= tree[next_position]
+            step >>= 1
+        if position >= size:
+            raise IndexError("folded line out of range")
+        return position, remaining
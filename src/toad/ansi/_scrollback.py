@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+from array import array
+import struct
+import tempfile
+from typing import TYPE_CHECKING, Callable, Iterator, overload
+
+from textual.cache import LRUCache
+from textual.content import Content, Span
+from textual.style import Style
+
+if TYPE_CHECKING:
+    from toad.ansi._ansi import LineFold, LineRecord
+
+
+LINE_HEADER = struct.Struct("<IIII")
+"""Header of an evicted line: text length (bytes), span count, line style id, and fold count."""
+SPAN = struct.Struct("<III")
+"""A style run: start, end, and style id."""
+FOLD = struct.Struct("<II")
+"""A fold: offset and length."""
+
+type FoldLine = Callable[[int, Content, int, bool], list[LineFold]]
+
+
+class SpillFile:
+    """An append-only file containing lines evicted from memory.
+
+    Lines are stored as plain text, with style runs that refer to a table of styles
+    (which remains in memory), and the offsets of the folds.
+
+    """
+
+    def __init__(self) -> None:
+        self._file = tempfile.TemporaryFile(prefix="toad-scrollback-")
+        self._size = 0
+        self._styles: list[Style | str] = []
+        self._style_ids: dict[Style | str, int] = {}
+
+    @property
+    def size(self) -> int:
+        """Size of the file in bytes."""
+        return self._size
+
+    def _get_style_id(self, style: Style | str) -> int:
+        """Get an id for the given style, adding it to the table if necessary.
+
+        Args:
+            style: A style.
+
+        Returns:
+            Integer id.
+        """
+        if (style_id := self._style_ids.get(style)) is None:
+            style_id = self._style_ids[style] = len(self._styles)
+            self._styles.append(style)
+        return style_id
+
+    def write(
+        self, line_record: LineRecord, offset: int | None = None, length: int = 0
+    ) -> tuple[int, int]:
+        """Write a line to the file.
+
+        The line overwrites a previous line if it fits, otherwise it is appended.
+
+        Args:
+            line_record: Line to write.
+            offset: Offset of a previous line to overwrite, or `None` to append.
+            length: Length of the previous line.
+
+        Returns:
+            A tuple of the offset and length of the space containing the encoded line.
+        """
+        get_style_id = self._get_style_id
+        content = line_record.content
+        text = content.plain.encode("utf-8", "surrogatepass")
+        spans = content.spans
+        folds = line_record.folds
+        encoded = b"".join(
+            [
+                LINE_HEADER.pack(
+                    len(text), len(spans), get_style_id(line_record.style), len(folds)
+                ),
+                text,
+                *[
+                    SPAN.pack(start, end, get_style_id(span_style))
+                    for start, end, span_style in spans
+                ],
+                *[FOLD.pack(fold.offset, len(fold.content)) for fold in folds],
+            ]
+        )
+        if offset is None or len(encoded) > length:
+            offset = self._size
+            length = len(encoded)
+            self._size += length
+        self._file.seek(offset)
+        self._file.write(encoded)
+        return offset, length
+
+    def read(
+        self, offset: int, length: int
+    ) -> tuple[Content, Style, list[tuple[int, int]]]:
+        """Read a line from the file.
+
+        Args:
+            offset: Offset of the encoded line.
+            length: Length of the space containing the encoded line (which may have
+                unused bytes at the end).
+
+        Returns:
+            A tuple of the line content, style of the remaining line, and a list of
+                fold offsets and lengths.
+        """
+        self._file.seek(offset)
+        encoded = self._file.read(length)
+        text_length, span_count, style_id, fold_count = LINE_HEADER.unpack_from(encoded)
+        position = LINE_HEADER.size
+        text = encoded[position : position + text_length].decode(
+            "utf-8", "surrogatepass"
+        )
+        position += text_length
+        styles = self._styles
+        spans = [
+            Span(start, end, styles[span_style_id])
+            for start, end, span_style_id in SPAN.iter_unpack(
+                encoded[position : position + span_count * SPAN.size]
+            )
+        ]
+        position += span_count * SPAN.size
+        folds = list(
+            FOLD.iter_unpack(encoded[position : position + fold_count * FOLD.size])
+        )
+        line_style = styles[style_id]
+        assert isinstance(line_style, Style)
+        return Content(text, spans, strip_control_codes=False), line_style, folds
+
+    def clear(self) -> None:
+        """Remove all lines."""
+        self._file.truncate(0)
+        self._size = 0
+        self._styles.clear()
+        self._style_ids.clear()
+
+
+class ScrollbackLines:
+    """A list of lines which evicts the oldest lines to disk past a maximum.
+
+    Evicted lines are loaded on demand, and retained in a small cache.
+
+    """
+
+    CACHE_SIZE = 1024
+
+    def __init__(self, fold_line: FoldLine, max_lines: int | None = None) -> None:
+        """
+        Args:
+            fold_line: Callable that folds a line, used when loading lines which were
+                refolded after they were evicted.
+            max_lines: Maximum number of lines to keep in memory, or `None` for no limit.
+        """
+        self._fold_line = fold_line
+        self._max_lines = max_lines
+        self._keep_lines = 0
+        self._lines: list[LineRecord] = []
+        """Lines in memory."""
+        self._spill_file: SpillFile | None = None
+        self._offsets = array("q")
+        """Offsets of evicted lines within the spill file."""
+        self._lengths = array("q")
+        """Length of the space for evicted lines within the spill file."""
+        self._updates = array("q")
+        """Updates value of evicted lines."""
+        self._fold_policies = array("q")
+        """Index in to `_policies` for each evicted line, or -1 to use the stored folds."""
+        self._policies: list[tuple[int, bool]] = []
+        """Width and auto wrap combinations used to refold evicted lines."""
+        self._policy_ids: dict[tuple[int, bool], int] = {}
+        self._cache: LRUCache[int, LineRecord] = LRUCache(self.CACHE_SIZE)
+
+    @property
+    def max_lines(self) -> int | None:
+        """Maximum number of lines to keep in memory, or `None` for no limit."""
+        return self._max_lines
+
+    @max_lines.setter
+    def max_lines(self, max_lines: int | None) -> None:
+        self._max_lines = max_lines
+        self._evict()
+
+    @property
+    def keep_lines(self) -> int:
+        """Number of lines at the end (on screen) which are never evicted."""
+        return self._keep_lines
+
+    @keep_lines.setter
+    def keep_lines(self, keep_lines: int) -> None:
+        self._keep_lines = keep_lines
+        self._evict()
+
+    @property
+    def evicted_count(self) -> int:
+        """Number of lines evicted from memory."""
+        return len(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._lines)
+
+    def __bool__(self) -> bool:
+        return bool(self._offsets) or bool(self._lines)
+
+    @overload
+    def __getitem__(self, index: int) -> LineRecord: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[LineRecord]: ...
+
+    def __getitem__(self, index: int | slice) -> LineRecord | list[LineRecord]:
+        if isinstance(index, slice):
+            return [self[line_no] for line_no in range(len(self))[index]]
+        evicted_count = len(self._offsets)
+        if index < 0:
+            index += len(self)
+        if index >= evicted_count:
+            return self._lines[index - evicted_count]
+        if index < 0:
+            raise IndexError("line index out of range")
+        return self._load(index)
+
+    def __setitem__(self, index: int, line_record: LineRecord) -> None:
+        evicted_count = len(self._offsets)
+        if index < 0:
+            index += len(self)
+        if index >= evicted_count:
+            self._lines[index - evicted_count] = line_record
+            return
+        if index < 0:
+            raise IndexError("line index out of range")
+        # Updates to an evicted line overwrite it in the spill file if they fit
+        assert self._spill_file is not None
+        offset, length = self._spill_file.write(
+            line_record, self._offsets[index], self._lengths[index]
+        )
+        self._offsets[index] = offset
+        self._lengths[index] = length
+        self._updates[index] = line_record.updates
+        self._fold_policies[index] = -1
+        # The cache won't replace an existing key
+        self._cache.discard(index)
+        self._cache[index] = line_record
+
+    def __delitem__(self, index: slice) -> None:
+        start, stop, step = index.indices(len(self))
+        assert stop == len(self) and step == 1, (
+            "Only removing lines from the end is supported"
+        )
+        self.truncate(start)
+
+    def __iter__(self) -> Iterator[LineRecord]:
+        for line_no in range(len(self._offsets)):
+            yield self._load(line_no)
+        yield from self._lines
+
+    def _load(self, line_no: int) -> LineRecord:
+        """Load an evicted line.
+
+        Args:
+            line_no: Line number.
+
+        Returns:
+            Line record.
+        """
+        from toad.ansi._ansi import LineFold, LineRecord
+
+        if (line_record := self._cache.get(line_no)) is not None:
+            return line_record
+        assert self._spill_file is not None
+        content, style, fold_ranges = self._spill_file.read(
+            self._offsets[line_no], self._lengths[line_no]
+        )
+        line = content.expand_tabs(8)
+        updates = self._updates[line_no]
+        fold_key: tuple[int, int, bool] | None = None
+        if (policy_id := self._fold_policies[line_no]) != -1:
+            # Refolded after it was evicted, so fold as the reflow did
+            width, auto_wrap = self._policies[policy_id]
+            folds = self._fold_line(line_no, line, width, auto_wrap)
+            fold_key = (updates, width, auto_wrap)
+        else:
+            folds = [
+                LineFold(
+                    line_no,
+                    line_offset,
+                    offset,
+                    line[offset : offset + length],
+                    updates,
+                )
+                for line_offset, (offset, length) in enumerate(fold_ranges)
+            ]
+        line_record = LineRecord(content, style, folds, updates, fold_key)
+        self._cache[line_no] = line_record
+        return line_record
+
+    def _evict(self) -> None:
+        """Evict lines from memory if the maximum has been exceeded."""
+        max_lines = self._max_lines
+        if max_lines is None:
+            return
+        # Evict in batches, so that the cost is amortized, but never the lines to keep
+        batch_size = max_lines // 8
+        line_limit = max(max_lines, self._keep_lines + batch_size)
+        if len(self._lines) <= line_limit:
+            return
+        evict_count = len(self._lines) - line_limit + batch_size
+        if self._spill_file is None:
+            self._spill_file = SpillFile()
+        write = self._spill_file.write
+        for line_record in self._lines[:evict_count]:
+            offset, length = write(line_record)
+            self._offsets.append(offset)
+            self._lengths.append(length)
+            self._updates.append(line_record.updates)
+            self._fold_policies.append(-1)
+        del self._lines[:evict_count]
+
+    def append(self, line_record: LineRecord) -> None:
+        """Add a line to the end.
+
+        Args:
+            line_record: New line.
+        """
+        self._lines.append(line_record)
+        if self._max_lines is not None and len(self._lines) > self._max_lines:
+            self._evict()
+
+    def set_folded(self, line_no: int, width: int, auto_wrap: bool) -> None:
+        """Record that a line was refolded, so that it is folded the same way if reloaded.
+
+        Has no effect on lines in memory.
+
+        Args:
+            line_no: Line number.
+            width: Width the line was folded to.
+            auto_wrap: Auto wrap setting the line was folded with.
+        """
+        if line_no >= len(self._offsets):
+            return
+        policy = (width, auto_wrap)
+        if (policy_id := self._policy_ids.get(policy)) is None:
+            policy_id = self._policy_ids[policy] = len(self._policies)
+            self._policies.append(policy)
+        self._fold_policies[line_no] = policy_id
+
+    def truncate(self, line_count: int) -> None:
+        """Remove lines from the end, so that `line_count` lines remain.
+
+        Args:
+            line_count: Number of lines to keep.
+        """
+        evicted_count = len(self._offsets)
+        if line_count >= evicted_count:
+            del self._lines[line_count - evicted_count :]
+            return
+        self._lines.clear()
+        del self._offsets[line_count:]
+        del self._lengths[line_count:]
+        del self._updates[line_count:]
+        del self._fold_policies[line_count:]
+        self._cache.clear()
+        if not line_count and self._spill_file is not None:
+            self._spill_file.clear()
+
+    def clear(self) -> None:
+        """Remove all lines."""
+        self.truncate(0)
@@ -26,6 +26,7 @@ from toad.settings_schema import SCHEMA
 from toad.version import VersionMeta
 from toad import paths
 from toad import atomic
+from toad import compute
 
 if TYPE_CHECKING:
     from toad.screens.main import MainScreen
@@ -565,6 +566,7 @@ class ToadApp(App, inherit_bindings=False):
                 )
 
     def run_on_exit(self):
+        compute.shutdown()
         if self.update_required and self.version_meta is not None:
             version_meta = self.version_meta
             from rich.console import Console
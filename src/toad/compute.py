@@ -0,0 +1,101 @@
+"""
+Pools for CPU bound work, such as diffing and syntax highlighting.
+
+Work runs in a dedicated thread pool, so it doesn't hold up I/O in the default executor
+(used by `asyncio.to_thread`), and I/O doesn't hold up rendering. Very large inputs may
+be sent to a process pool, which isn't limited by the GIL (see
+`constants.CPU_PROCESS_THRESHOLD`).
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from toad import constants
+
+_thread_pool: ThreadPoolExecutor | None = None
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Get the thread pool, created on first use.
+
+    Returns:
+        Thread pool executor.
+    """
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            constants.CPU_WORKERS, thread_name_prefix="toad-cpu"
+        )
+    return _thread_pool
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the process pool, created on first use.
+
+    Returns:
+        Process pool executor.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(constants.CPU_WORKERS)
+    return _process_pool
+
+
+async def run[**P, T](function: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    """Run a function in the thread pool.
+
+    Args:
+        function: Function to run.
+        *args: Positional arguments.
+        **kwargs: Keyword arguments.
+
+    Returns:
+        The return value of the function.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_thread_pool(), partial(context.run, function, *args, **kwargs)
+    )
+
+
+async def run_sized[**P, T](
+    size: int, function: Callable[P, T], *args: P.args, **kwargs: P.kwargs
+) -> T:
+    """Run a function in the process pool if the input is very large, otherwise in the
+    thread pool.
+
+    The function, arguments, and return value must be picklable.
+
+    Args:
+        size: Size of the input (in characters).
+        function: Function to run.
+        *args: Positional arguments.
+        **kwargs: Keyword arguments.
+
+    Returns:
+        The return value of the function.
+    """
+    threshold = constants.CPU_PROCESS_THRESHOLD
+    if threshold and size >= threshold:
+        return await asyncio.get_running_loop().run_in_executor(
+            get_process_pool(), partial(function, *args, **kwargs)
+        )
+    return await run(function, *args, **kwargs)
+
+
+def shutdown() -> None:
+    """Shut down the pools, and discard pending work."""
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -54,5 +54,39 @@ def _get_environ_int(
 ACP_INITIALIZE: Final[bool] = _get_environ_bool("TOAD_ACP_INITIALIZE", True)
 """Initialize ACP agents?"""
 
+ACP_TIMEOUT: Final[int] = _get_environ_int("TOAD_ACP_TIMEOUT", 120, minimum=0)
+"""Seconds to wait for an agent to respond to setup calls, or 0 to wait indefinitely."""
+
+CPU_WORKERS: Final[int] = _get_environ_int(
+    "TOAD_CPU_WORKERS", min(4, os.cpu_count() or 1), minimum=1
+)
+"""Number of threads for CPU bound work (diffing and highlighting)."""
+
+CPU_PROCESS_THRESHOLD: Final[int] = _get_environ_int(
+    "TOAD_CPU_PROCESS_THRESHOLD", 0, minimum=0
+)
+"""Size of input (in characters) to diff in a process pool, or 0 to never use processes."""
+
 DEBUG: Final[bool] = _get_environ_bool("DEBUG", False)
 """Debug flag."""
+
+HIGHLIGHT_CACHE_SIZE: Final[int] = _get_environ_int(
+    "TOAD_HIGHLIGHT_CACHE_SIZE", 4 * 1024 * 1024, minimum=0
+)
+"""Maximum number of characters of syntax highlighted code to cache."""
+
+LOG_MAX_SIZE: Final[int] = _get_environ_int(
+    "TOAD_LOG_MAX_SIZE", 10 * 1024 * 1024, minimum=0
+)
+"""Size (in bytes) at which agent logs are rotated, or 0 to never rotate."""
+
+LOG_BACKUPS: Final[int] = _get_environ_int("TOAD_LOG_BACKUPS", 5, minimum=0)
+"""Number of rotated agent logs to keep."""
+
+LOG_COMPRESSION: Final[str] = get_environ("TOAD_LOG_COMPRESSION", "").lower()
+"""Compression for rotated agent logs: "gzip", "zstd", or "" for none."""
+
+TERMINAL_CONCURRENCY: Final[int] = _get_environ_int(
+    "TOAD_TERMINAL_CONCURRENCY", 8, minimum=1
+)
+"""Maximum number of terminals an agent may be creating at once."""
@@ -0,0 +1,342 @@
+"""
+A line diff for the diff view.
+
+Lines are matched with a patience diff: lines which occur once in each file are used as
+anchors, and the gaps between anchors are diffed recursively, falling back to a Myers
+diff where there are no unique lines. Characters are compared only within changed
+hunks, and only while they fit in a size budget, so the cost of a diff grows with the
+size of the changes rather than the size of the files.
+
+The results are in the same format as `difflib.SequenceMatcher`.
+
+"""
+
+from __future__ import annotations
+
+import difflib
+from bisect import bisect_left
+from collections.abc import Sequence
+
+type Opcode = tuple[str, int, int, int, int]
+"""A tag ("equal", "replace", "delete", or "insert"), and ranges of lines in a and b."""
+
+MAX_EDIT_COST = 1000
+"""Maximum number of edits in a Myers diff, before a range is considered replaced."""
+MAX_REFINE_SIZE = 10_000
+"""Maximum number of characters in a hunk, to compare characters."""
+MAX_REFINE_TOTAL = 500_000
+"""Maximum number of characters to compare over all hunks."""
+
+
+def _unique_anchors(
+    a: Sequence[str], a_lo: int, a_hi: int, b: Sequence[str], b_lo: int, b_hi: int
+) -> list[tuple[int, int]]:
+    """Find the longest sequence of lines which occur once in each range.
+
+    Args:
+        a: Lines of a.
+        a_lo: Start of range in a.
+        a_hi: End of range in a.
+        b: Lines of b.
+        b_lo: Start of range in b.
+        b_hi: End of range in b.
+
+    Returns:
+        Pairs of matching line indexes, in order.
+    """
+    a_counts: dict[str, int] = {}
+    for index in range(a_lo, a_hi):
+        line = a[index]
+        a_counts[line] = -1 if line in a_counts else index
+    b_counts: dict[str, int] = {}
+    for index in range(b_lo, b_hi):
+        line = b[index]
+        if a_counts.get(line, -1) != -1:
+            b_counts[line] = -1 if line in b_counts else index
+    pairs = [
+        (a_counts[line], b_index) for line, b_index in b_counts.items() if b_index != -1
+    ]
+    if not pairs:
+        return []
+    pairs.sort()
+
+    # Longest increasing subsequence of b indexes (patience sort)
+    tails: list[int] = []
+    tail_indexes: list[int] = []
+    previous: list[int] = [-1] * len(pairs)
+    for pair_index, (_a_index, b_index) in enumerate(pairs):
+        position = bisect_left(tails, b_index)
+        if position == len(tails):
+            tails.append(b_index)
+            tail_indexes.append(pair_index)
+        else:
+            tails[position] = b_index
+            tail_indexes[position] = pair_index
+        previous[pair_index] = tail_indexes[position - 1] if position else -1
+
+    anchors: list[tuple[int, int]] = []
+    pair_index = tail_indexes[-1]
+    while pair_index != -1:
+        anchors.append(pairs[pair_index])
+        pair_index = previous[pair_index]
+    anchors.reverse()
+    return anchors
+
+
+def _myers(
+    a: Sequence[str],
+    a_lo: int,
+    a_hi: int,
+    b: Sequence[str],
+    b_lo: int,
+    b_hi: int,
+    max_cost: int = MAX_EDIT_COST,
+) -> list[tuple[int, int]]:
+    """Match lines with a Myers diff.
+
+    Args:
+        a: Lines of a.
+        a_lo: Start of range in a.
+        a_hi: End of range in a.
+        b: Lines of b.
+        b_lo: Start of range in b.
+        b_hi: End of range in b.
+        max_cost: Maximum number of edits.
+
+    Returns:
+        Pairs of matching line indexes, or an empty list if there are more than
+            `max_cost` edits.
+    """
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    max_d = min(n + m, max_cost)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace: list[list[int]] = []
+    for d in range(max_d + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                break
+        else:
+            continue
+        break
+    else:
+        return []
+
+    matches: list[tuple[int, int]] = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = v[offset + previous_k]
+        previous_y = previous_x - previous_k
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+            matches.append((a_lo + x, b_lo + y))
+        x, y = previous_x, previous_y
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        matches.append((a_lo + x, b_lo + y))
+    return matches
+
+
+def _match_lines(a: Sequence[str], b: Sequence[str]) -> list[tuple[int, int]]:
+    """Match lines with a patience diff.
+
+    Args:
+        a: Lines of a.
+        b: Lines of b.
+
+    Returns:
+        Pairs of matching line indexes, in order.
+    """
+    matches: list[tuple[int, int]] = []
+    add_match = matches.append
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+        # Common prefix and suffix
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            add_match((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            add_match((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+        if anchors := _unique_anchors(a, a_lo, a_hi, b, b_lo, b_hi):
+            for a_index, b_index in anchors:
+                add_match((a_index, b_index))
+                stack.append((a_lo, a_index, b_lo, b_index))
+                a_lo = a_index + 1
+                b_lo = b_index + 1
+            stack.append((a_lo, a_hi, b_lo, b_hi))
+        else:
+            matches.extend(_myers(a, a_lo, a_hi, b, b_lo, b_hi))
+    matches.sort()
+    return matches
+
+
+def diff_lines(a: Sequence[str], b: Sequence[str]) -> list[Opcode]:
+    """Diff two sequences of lines.
+
+    Args:
+        a: Lines before.
+        b: Lines after.
+
+    Returns:
+        Opcodes, as `difflib.SequenceMatcher.get_opcodes`.
+    """
+    opcodes: list[Opcode] = []
+    i = j = 0
+    matches = _match_lines(a, b)
+    matches.append((len(a), len(b)))
+    index = 0
+    last_index = len(matches) - 1
+    while index <= last_index:
+        a_index, b_index = matches[index]
+        # Extend to a block of consecutive matches (the sentinel has a size of 0)
+        size = 0 if index == last_index else 1
+        while (
+            size
+            and index + size < last_index
+            and matches[index + size][0] == a_index + size
+            and matches[index + size][1] == b_index + size
+        ):
+            size += 1
+        if i < a_index and j < b_index:
+            opcodes.append(("replace", i, a_index, j, b_index))
+        elif i < a_index:
+            opcodes.append(("delete", i, a_index, j, b_index))
+        elif j < b_index:
+            opcodes.append(("insert", i, a_index, j, b_index))
+        if size:
+            opcodes.append(("equal", a_index, a_index + size, b_index, b_index + size))
+        i = a_index + size
+        j = b_index + size
+        index += size or 1
+    return opcodes
+
+
+def group_opcodes(opcodes: list[Opcode], context: int = 3) -> list[list[Opcode]]:
+    """Group opcodes in to hunks, with lines of context.
+
+    Args:
+        opcodes: Opcodes from `diff_lines`.
+        context: Number of lines of context.
+
+    Returns:
+        Groups of opcodes, as `difflib.SequenceMatcher.get_grouped_opcodes`.
+    """
+    codes = list(opcodes)
+    if not codes:
+        codes = [("equal", 0, 1, 0, 1)]
+    # Fixup leading and trailing groups if they show no changes
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    double_context = context + context
+    groups: list[list[Opcode]] = []
+    group: list[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        # End the current group and start a new one, for a large range of equal lines
+        if tag == "equal" and i2 - i1 > double_context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def get_line_offsets(lines: Sequence[str]) -> list[int]:
+    """Get the offset of each line in the lines joined with newlines.
+
+    Args:
+        lines: Lines of text.
+
+    Returns:
+        Offsets, with an additional offset for the end of the text.
+    """
+    offsets = [0] * (len(lines) + 1)
+    offset = 0
+    for index, line in enumerate(lines):
+        offsets[index] = offset
+        offset += len(line) + 1
+    offsets[-1] = offset
+    return offsets
+
+
+def refine_opcodes(
+    a: Sequence[str],
+    b: Sequence[str],
+    opcodes: list[Opcode],
+    max_size: int = MAX_REFINE_SIZE,
+    max_total: int = MAX_REFINE_TOTAL,
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """Find the characters removed and added within replaced lines.
+
+    Args:
+        a: Lines before.
+        b: Lines after.
+        opcodes: Opcodes from `diff_lines`.
+        max_size: Maximum size of a hunk (in characters) to compare.
+        max_total: Maximum number of characters to compare over all hunks.
+
+    Returns:
+        Ranges of removed characters in a, and added characters in b, as offsets in
+            to the lines joined with newlines.
+    """
+    removed: list[tuple[int, int]] = []
+    added: list[tuple[int, int]] = []
+    offsets_a = get_line_offsets(a)
+    offsets_b = get_line_offsets(b)
+    total = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "replace":
+            continue
+        start_a = offsets_a[i1]
+        start_b = offsets_b[j1]
+        text_a = "\n".join(a[i1:i2])
+        text_b = "\n".join(b[j1:j2])
+        size = len(text_a) + len(text_b)
+        if size > max_size or total + size > max_total:
+            continue
+        total += size
+        sequence_matcher = difflib.SequenceMatcher(
+            lambda character: character in " \t", text_a, text_b, autojunk=False
+        )
+        # Changes at the end of a line aren't highlighted, including the last line
+        # of a hunk (unless it is the last line of the file)
+        terminated_a = text_a + "\n" if i2 < len(a) else text_a
+        terminated_b = text_b + "\n" if j2 < len(b) else text_b
+        for character_tag, c1, c2, d1, d2 in sequence_matcher.get_opcodes():
+            if character_tag == "delete" and "\n" not in terminated_a[c1 : c2 + 1]:
+                removed.append((start_a + c1, start_a + c2))
+            elif character_tag == "insert" and "\n" not in terminated_b[d1 : d2 + 1]:
+                added.append((start_b + d1, start_b + d2))
+    return removed, added
@@ -1,4 +1,8 @@
+from __future__ import annotations
+
 from pathlib import Path
+from typing import TYPE_CHECKING
+
 import rich.repr
 
 import threading
@@ -20,6 +24,9 @@ from watchdog.events import (
 from watchdog.observers import Observer
 from watchdog.observers.polling import PollingObserver
 
+if TYPE_CHECKING:
+    from toad.file_index import FileIndex
+
 
 class DirectoryChanged(Message):
     """The directory was changed."""
@@ -32,15 +39,19 @@ class DirectoryChanged(Message):
 class DirectoryWatcher(threading.Thread, FileSystemEventHandler):
     """Watch for changes to a directory, ignoring purely file data changes."""
 
-    def __init__(self, path: Path, widget: Widget) -> None:
+    def __init__(
+        self, path: Path, widget: Widget, file_index: FileIndex | None = None
+    ) -> None:
         """
 
         Args:
             path: Root path to monitor.
             widget: Widget which will receive the `DirectoryChanged` event.
+            file_index: File index to update with events, or `None`.
         """
         self._path = path
         self._widget = widget
+        self._file_index = file_index
         self._stop_event = threading.Event()
         self._enabled = False
         super().__init__(name=repr(self))
@@ -52,6 +63,8 @@ class DirectoryWatcher(threading.Thread, FileSystemEventHandler):
 
     def on_any_event(self, event: FileSystemEvent) -> None:
         """Send DirectoryChanged event when the FS is updated."""
+        if self._file_index is not None:
+            self._file_index.record_event(event)
         self._widget.post_message(DirectoryChanged())
 
     def __rich_repr__(self) -> rich.repr.Result:
@@ -83,8 +96,12 @@ class DirectoryWatcher(threading.Thread, FileSystemEventHandler):
         except Exception:
             return
         self._enabled = True
+        if self._file_index is not None:
+            self._file_index.watching = True
         while not self._stop_event.wait(1):
             pass
+        if self._file_index is not None:
+            self._file_index.watching = False
         try:
             observer.stop()
         except Exception:
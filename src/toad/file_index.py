@@ -0,0 +1,447 @@
+"""
+An index of the files in a project, shared by the path search, tree view, and path completion.
+
+The index is persisted in the project data directory, so that it is available as soon as
+Toad starts. While a `DirectoryWatcher` is watching the project, the index is updated from
+its events, rather than rescanning the project.
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+from time import monotonic
+
+import rich.repr
+from watchdog.events import FileSystemEvent
+
+from toad import paths
+from toad.path_filter import PathFilter
+
+DIRECTORY = 1
+"""Flag for an entry which is a directory."""
+IGNORED = 2
+"""Flag for an entry which is excluded by the path filter (and not scanned)."""
+LINK = 4
+"""Flag for a directory which is a symbolic link (and not scanned)."""
+
+INDEX_VERSION = 1
+INDEX_FILENAME = "file_index.zlib"
+SAVE_INTERVAL = 30.0
+"""Minimum time between saving updates from the watcher."""
+
+type Entries = dict[str, int]
+"""Entry names mapped on to flags."""
+
+
+@rich.repr.auto
+class FileIndex:
+    """An index of the paths in a project directory.
+
+    Paths excluded by the path filter (i.e. .gitignore) are recorded in the index, so
+    they may be completed, but ignored directories aren't scanned.
+
+    The index is thread safe.
+
+    """
+
+    def __init__(self, root: Path, index_path: Path | None = None) -> None:
+        """
+
+        Args:
+            root: Root (project) directory.
+            index_path: Path to persist the index, or `None` to not persist.
+        """
+        self.root = root
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self._directories: dict[str, Entries] = {}
+        """Entries of each scanned directory, keyed by path relative to the root."""
+        self._path_filter: PathFilter | None = None
+        self._pending: list[tuple[str, str, str | None, bool]] = []
+        """Events from the watcher: event type, source path, destination path, and is directory."""
+        self._watching = False
+        self._current = False
+        """Is the index up to date, if pending events are applied?"""
+        self._loaded = False
+        self._scan_task: asyncio.Task | None = None
+        self._generation = 0
+        self._saved_generation = 0
+        self._save_time = monotonic()
+        self._paths: tuple[int, list[str]] | None = None
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield self.root
+        yield "directories", len(self._directories)
+
+    @property
+    def generation(self) -> int:
+        """A value which changes when the paths change."""
+        return self._generation
+
+    @property
+    def path_filter(self) -> PathFilter | None:
+        """The path filter used by the last scan."""
+        return self._path_filter
+
+    @property
+    def watching(self) -> bool:
+        """Is a `DirectoryWatcher` supplying events?"""
+        return self._watching
+
+    @watching.setter
+    def watching(self, watching: bool) -> None:
+        with self._lock:
+            self._watching = watching
+            if not watching:
+                # Changes will be missed, so the next update will rescan
+                self._current = False
+                self._pending.clear()
+
+    def record_event(self, event: FileSystemEvent) -> None:
+        """Record a file system event, to be applied on the next update.
+
+        Called from the `DirectoryWatcher` thread.
+
+        Args:
+            event: Watchdog event.
+        """
+        if event.event_type not in ("created", "deleted", "moved"):
+            return
+        destination = os.fsdecode(event.dest_path) if event.dest_path else None
+        with self._lock:
+            self._pending.append(
+                (
+                    event.event_type,
+                    os.fsdecode(event.src_path),
+                    destination,
+                    event.is_directory,
+                )
+            )
+
+    async def update(self) -> None:
+        """Bring the index up to date.
+
+        The first update loads the persisted index (if there is one) and returns
+        immediately, while the project is rescanned in the background. Subsequent
+        updates apply events from the watcher, or rescan if there is no watcher.
+
+        """
+        if not self._loaded:
+            self._loaded = True
+            if await asyncio.to_thread(self._load):
+                self._scan_task = asyncio.create_task(
+                    asyncio.to_thread(self._scan), name=f"scan {str(self.root)!r}"
+                )
+                return
+        if self._scan_task is not None:
+            if not self._scan_task.done():
+                return
+            self._scan_task = None
+        if self._current:
+            await asyncio.to_thread(self._apply_events)
+            if monotonic() - self._save_time >= SAVE_INTERVAL:
+                await asyncio.to_thread(self.save)
+        else:
+            await asyncio.to_thread(self._scan)
+
+    def get_paths(self) -> list[str]:
+        """Get the paths which aren't excluded by the filter.
+
+        Returns:
+            Paths relative to the root (directories have a trailing slash), in no
+                particular order.
+        """
+        with self._lock:
+            if self._paths is not None and self._paths[0] == self._generation:
+                return self._paths[1]
+            paths: list[str] = []
+            add_path = paths.append
+            for directory, entries in self._directories.items():
+                prefix = f"{directory}/" if directory else ""
+                for name, flags in entries.items():
+                    if flags & IGNORED:
+                        continue
+                    add_path(
+                        f"{prefix}{name}/" if flags & DIRECTORY else f"{prefix}{name}"
+                    )
+            self._paths = (self._generation, paths)
+            return paths
+
+    def list_directory(
+        self, path: Path, include_ignored: bool = False
+    ) -> list[tuple[str, bool]] | None:
+        """List a directory from the index, if the index is known to be current.
+
+        Pending events are applied first, so this may block briefly.
+
+        Args:
+            path: Absolute path of a directory.
+            include_ignored: Include entries excluded by the path filter?
+
+        Returns:
+            A list of names and a flag which indicates directories, or `None` if the
+                directory isn't in the index.
+        """
+        if not self._current:
+            return None
+        if (relative := self._relative(str(path))) is None:
+            return None
+        with self._lock:
+            self._apply_events()
+            if (entries := self._directories.get(relative)) is None:
+                return None
+            return [
+                (name, bool(flags & DIRECTORY))
+                for name, flags in entries.items()
+                if include_ignored or not flags & IGNORED
+            ]
+
+    def save(self) -> None:
+        """Persist the index, if it changed since it was last saved."""
+        if self.index_path is None:
+            return
+        with self._lock:
+            if self._saved_generation == self._generation:
+                return
+            lines = [f"toad-file-index {INDEX_VERSION}"]
+            for directory, entries in self._directories.items():
+                prefix = f"{directory}/" if directory else ""
+                lines.extend(
+                    [
+                        f"{flags}{prefix}{name}"
+                        for name, flags in entries.items()
+                        if "\n" not in name
+                    ]
+                )
+            self._saved_generation = self._generation
+            self._save_time = monotonic()
+        data = zlib.compress("\n".join(lines).encode("utf-8", "surrogateescape"))
+        try:
+            with tempfile.NamedTemporaryFile(
+                "wb",
+                delete=False,
+                dir=self.index_path.parent,
+                prefix=f".{self.index_path.name}_tmp_",
+            ) as index_file:
+                index_file.write(data)
+            os.replace(index_file.name, self.index_path)
+        except OSError:
+            pass
+
+    def _relative(self, path: str) -> str | None:
+        """Get a path relative to the root.
+
+        Args:
+            path: Absolute path.
+
+        Returns:
+            Relative path with forward slashes, "" for the root, or `None` if the path
+                isn't under the root.
+        """
+        root = str(self.root)
+        if path == root:
+            return ""
+        if not path.startswith(root.rstrip(os.sep) + os.sep):
+            return None
+        relative = path[len(root.rstrip(os.sep)) + 1 :]
+        return relative.replace(os.sep, "/") if os.sep != "/" else relative
+
+    def _load(self) -> bool:
+        """Load the persisted index.
+
+        Returns:
+            `True` if the index was loaded.
+        """
+        if self.index_path is None:
+            return False
+        try:
+            data = zlib.decompress(self.index_path.read_bytes())
+        except (OSError, zlib.error):
+            return False
+        header, _, body = data.decode("utf-8", "surrogateescape").partition("\n")
+        if header != f"toad-file-index {INDEX_VERSION}":
+            return False
+        directories: dict[str, Entries] = {"": {}}
+        try:
+            for line in body.split("\n") if body else []:
+                flags = int(line[0])
+                relative = line[1:]
+                parent, _, name = relative.rpartition("/")
+                directories.setdefault(parent, {})[name] = flags
+                if flags == DIRECTORY:
+                    directories.setdefault(relative, {})
+        except (ValueError, IndexError):
+            return False
+        with self._lock:
+            self._directories = directories
+            self._generation += 1
+            self._saved_generation = self._generation
+        return True
+
+    def _scan(self) -> None:
+        """Scan the whole project (in a thread)."""
+        path_filter = PathFilter.from_git_root(self.root)
+        with self._lock:
+            # Events from this point will be applied after the scan
+            current = self._watching
+            self._pending.clear()
+        directories: dict[str, Entries] = {}
+        self._scan_directory("", path_filter, directories)
+        with self._lock:
+            self._path_filter = path_filter
+            self._directories = directories
+            self._current = current and self._watching
+            self._generation += 1
+            self._apply_events()
+        self.save()
+
+    def _scan_directory(
+        self,
+        relative: str,
+        path_filter: PathFilter,
+        directories: dict[str, Entries],
+    ) -> None:
+        """Scan a directory and its descendants.
+
+        Args:
+            relative: Path of directory, relative to the root.
+            path_filter: Filter for paths to exclude.
+            directories: Dict to add the scanned directories to.
+        """
+        root = self.root
+        stack = [relative]
+        while stack:
+            relative = stack.pop()
+            prefix = f"{relative}/" if relative else ""
+            entries: Entries = {}
+            directories[relative] = entries
+            try:
+                with os.scandir(root / relative) as scan:
+                    for entry in scan:
+                        try:
+                            is_directory = entry.is_dir()
+                            is_link = is_directory and entry.is_symlink()
+                        except OSError:
+                            is_directory = is_link = False
+                        flags = DIRECTORY if is_directory else 0
+                        if is_link:
+                            flags |= LINK
+                        if path_filter.match(Path(entry.path)):
+                            flags |= IGNORED
+                        elif flags == DIRECTORY:
+                            stack.append(f"{prefix}{entry.name}")
+                        entries[entry.name] = flags
+            except OSError:
+                pass
+
+    def _apply_events(self) -> None:
+        """Apply pending events from the watcher."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = []
+            path_filter = self._path_filter
+            if path_filter is None:
+                return
+            for event_type, source, destination, is_directory in pending:
+                if event_type != "created":
+                    self._remove(source)
+                if event_type == "created":
+                    self._add(source, is_directory, path_filter)
+                elif event_type == "moved" and destination is not None:
+                    self._add(destination, is_directory, path_filter)
+                if any(
+                    os.path.basename(event_path) == ".gitignore"
+                    for event_path in (source, destination)
+                    if event_path is not None
+                ):
+                    # The filter has changed, so rescan on the next update
+                    self._current = False
+            self._generation += 1
+
+    def _add(self, path: str, is_directory: bool, path_filter: PathFilter) -> None:
+        """Add a path to the index.
+
+        Args:
+            path: Absolute path.
+            is_directory: Is the path a directory?
+            path_filter: Filter for paths to exclude.
+        """
+        if not (relative := self._relative(path)):
+            return
+        parent, _, name = relative.rpartition("/")
+        if (entries := self._directories.get(parent)) is None:
+            # Parent is excluded, or not yet in the index
+            return
+        flags = DIRECTORY if is_directory else 0
+        if is_directory and os.path.islink(path):
+            flags |= LINK
+        if path_filter.match(Path(path)):
+            flags |= IGNORED
+        entries[name] = flags
+        if flags == DIRECTORY:
+            # A directory may be moved in to the project, with no events for its contents
+            self._scan_directory(relative, path_filter, self._directories)
+
+    def _remove(self, path: str) -> None:
+        """Remove a path (and its descendants) from the index.
+
+        Args:
+            path: Absolute path.
+        """
+        if not (relative := self._relative(path)):
+            return
+        parent, _, name = relative.rpartition("/")
+        if (entries := self._directories.get(parent)) is None:
+            return
+        if (flags := entries.pop(name, None)) is not None and flags & DIRECTORY:
+            directories = self._directories
+            prefix = f"{relative}/"
+            for directory in [
+                directory
+                for directory in directories
+                if directory == relative or directory.startswith(prefix)
+            ]:
+                del directories[directory]
+
+
+_file_indexes: dict[Path, FileIndex] = {}
+
+
+def get_file_index(root: Path) -> FileIndex:
+    """Get the (shared) file index for a project directory.
+
+    Args:
+        root: Project directory.
+
+    Returns:
+        File index.
+    """
+    root = root.expanduser().resolve()
+    if (file_index := _file_indexes.get(root)) is None:
+        file_index = _file_indexes[root] = FileIndex(
+            root, paths.get_project_data(root) / INDEX_FILENAME
+        )
+    return file_index
+
+
+def find_file_index(path: Path) -> FileIndex | None:
+    """Find an existing file index which contains the given path.
+
+    Args:
+        path: Absolute path.
+
+    Returns:
+        File index, or `None` if no index contains the path.
+    """
+    for root, file_index in _file_indexes.items():
+        if path.is_relative_to(root):
+            return file_index
+    return None
@@ -61,6 +61,31 @@ class FuzzySearch:
     def get_first_letters(cls, candidate: str) -> frozenset[int]:
         return frozenset({match.start() for match in finditer(r"\w+", candidate)})
 
+    @classmethod
+    def score_counts(
+        cls, offset_count: int, first_letter_count: int, groups: int
+    ) -> float:
+        """Score a match from its counts.
+
+        The matcher relies on the score increasing with first letter matches, and
+        decreasing with the number of groups.
+
+        Args:
+            offset_count: Number of matched letters.
+            first_letter_count: Number of matched letters which are first letters.
+            groups: Number of groups of consecutive matched letters.
+
+        Returns:
+            Score.
+        """
+        # This is a heuristic, and can be tweaked for better results
+        # Boost first letter matches
+        score: float = offset_count + first_letter_count
+        # Boost to favor less groups
+        normalized_groups = (offset_count - (groups - 1)) / offset_count
+        score *= 1 + (normalized_groups * normalized_groups)
+        return score
+
     def score(self, candidate: str, positions: Sequence[int]) -> float:
         """Score a search.
 
@@ -71,35 +96,40 @@ class FuzzySearch:
             Score.
         """
         first_letters = self.get_first_letters(candidate)
-        # This is a heuristic, and can be tweaked for better results
-        # Boost first letter matches
-        offset_count = len(positions)
-        score: float = offset_count + len(first_letters.intersection(positions))
-
         groups = 1
         last_offset, *offsets = positions
         for offset in offsets:
             if offset != last_offset + 1:
                 groups += 1
             last_offset = offset
-
-        # Boost to favor less groups
-        normalized_groups = (offset_count - (groups - 1)) / offset_count
-        score *= 1 + (normalized_groups * normalized_groups)
-        return score
+        return self.score_counts(
+            len(positions), len(first_letters.intersection(positions)), groups
+        )
 
     def _match(
         self, query: str, candidate: str
     ) -> Iterable[tuple[float, Sequence[int]]]:
-        letter_positions: list[list[int]] = []
-        position = 0
+        """Find the best match.
+
+        Finds the highest scoring offsets (the first, in order, if there is a tie)
+        without enumerating every combination. For each matched letter, and each
+        number of breaks between groups in the remainder of the match, the maximum
+        number of first letters which may be matched is calculated (working backwards
+        from the last letter of the query).
+
+        Args:
+            query: The fuzzy query.
+            candidate: A candidate to check.
 
+        Yields:
+            A single pair of (score, offsets).
+        """
         if not self.case_sensitive:
             candidate = candidate.lower()
             query = query.lower()
 
-        score = self.score
-
+        letter_positions: list[list[int]] = []
+        position = 0
         for offset, letter in enumerate(query):
             last_index = len(candidate) - offset
             positions: list[int] = []
@@ -115,26 +145,84 @@ class FuzzySearch:
                 return
             position = positions[0] + 1
 
-        possible_offsets: list[list[int]] = []
         query_length = len(query)
+        if not query_length:
+            return
+        first_letters = self.get_first_letters(candidate)
 
-        def get_offsets(offsets: list[int], positions_index: int) -> None:
-            """Recursively match offsets.
-
-            Args:
-                offsets: A list of offsets.
-                positions_index: Index of query letter.
-
-            """
-            for offset in letter_positions[positions_index]:
-                if not offsets or offset > offsets[-1]:
-                    new_offsets = [*offsets, offset]
-                    if len(new_offsets) == query_length:
-                        possible_offsets.append(new_offsets)
-                    else:
-                        get_offsets(new_offsets, positions_index + 1)
-
-        get_offsets([], 0)
+        # best[letter][position] maps the number of breaks between groups on to the
+        # maximum number of first letters matched from `letter` onwards, with the letter
+        # at `position`.
+        best: list[dict[int, dict[int, int]]] = [{} for _ in range(query_length)]
+        best[-1] = {
+            offset: {0: int(offset in first_letters)} for offset in letter_positions[-1]
+        }
+        for letter_index in range(query_length - 2, -1, -1):
+            next_best = best[letter_index + 1]
+            next_positions = letter_positions[letter_index + 1]
+            # Maximum counts for positions from the index onwards (to start a new group)
+            following_best: list[dict[int, int]] = [{}]
+            for next_offset in reversed(next_positions):
+                following = following_best[-1].copy()
+                for breaks, count in next_best[next_offset].items():
+                    if count > following.get(breaks, -1):
+                        following[breaks] = count
+                following_best.append(following)
+            following_best.reverse()
+
+            letter_best = best[letter_index]
+            next_index = 0
+            next_count = len(next_positions)
+            for offset in letter_positions[letter_index]:
+                while (
+                    next_index < next_count and next_positions[next_index] <= offset + 1
+                ):
+                    next_index += 1
+                first_letter = int(offset in first_letters)
+                # Continue the group
+                if (contiguous := next_best.get(offset + 1)) is not None:
+                    counts = {
+                        breaks: count + first_letter
+                        for breaks, count in contiguous.items()
+                    }
+                else:
+                    counts = {}
+                # Start a new group
+                for breaks, count in following_best[next_index].items():
+                    count += first_letter
+                    if count > counts.get(breaks + 1, -1):
+                        counts[breaks + 1] = count
+                letter_best[offset] = counts
+
+        score_counts = self.score_counts
+        scores = {
+            (breaks, count): score_counts(query_length, count, breaks + 1)
+            for counts in best[0].values()
+            for breaks, count in counts.items()
+        }
+        best_score = max(scores.values())
+
+        # Follow the first offsets which lead to the best score.
+        # Candidates are the number of breaks remaining, and the first letter count.
+        candidates = {key for key, score in scores.items() if score == best_score}
+        offsets: list[int] = []
+        previous_offset = -2
+        for letter_index, letter_best in enumerate(best):
+            for offset in letter_positions[letter_index]:
+                if offset <= previous_offset:
+                    continue
+                first_letter = int(offset in first_letters)
+                counts = letter_best[offset]
+                new_break = int(bool(offsets) and offset != previous_offset + 1)
+                next_candidates = {
+                    (breaks - new_break, count - first_letter)
+                    for breaks, count in candidates
+                    if counts.get(breaks - new_break) == count
+                }
+                if next_candidates:
+                    break
+            offsets.append(offset)
+            candidates = next_candidates
+            previous_offset = offset
 
-        for offsets in possible_offsets:
-            yield score(candidate, offsets), offsets
+        yield best_score, offsets
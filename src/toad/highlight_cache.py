@@ -0,0 +1,271 @@
+"""
+A cache of syntax highlighted code, shared by all widgets.
+
+The same code is often highlighted several times (a diff may be shown when the agent
+asks for permission, in the tool call, and in the conversation). Highlighted lines are
+cached by language, a hash of the code, and highlight theme.
+
+When code is an edit of code highlighted previously, only the changed lines are
+highlighted, along with enough lines around them for the lexer to resynchronize.
+
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Sequence
+from hashlib import sha1
+from threading import Lock
+
+import rich.repr
+from textual import highlight
+from textual.content import Content
+from textual.highlight import HighlightTheme
+
+from toad import constants, diff
+
+type HighlightKey = tuple[str, str, str]
+"""Language, SHA1 of the code, and highlight theme."""
+
+RESYNC_LINES = 20
+"""Initial number of lines highlighted around a change."""
+
+
+def highlight_lines(
+    lines: Sequence[str], language: str, theme: type[HighlightTheme] = HighlightTheme
+) -> list[Content]:
+    """Highlight lines of code (without a cache).
+
+    Args:
+        lines: Lines of code.
+        language: Language of the code.
+        theme: Highlight theme.
+
+    Returns:
+        A highlighted `Content` per line.
+    """
+    if not lines:
+        return []
+    code = highlight.highlight("\n".join(lines), language=language, theme=theme)
+    highlighted = code.split("\n", allow_blank=True)
+    # Trailing blank lines are stripped by the highlighter
+    highlighted.extend([Content("")] * (len(lines) - len(highlighted)))
+    return highlighted
+
+
+def _lines_match(
+    window: list[Content],
+    window_start: int,
+    reference: list[Content | None],
+    start: int,
+    end: int,
+) -> bool:
+    """Check that a range of highlighted lines are the same as reference lines.
+
+    Args:
+        window: Highlighted lines.
+        window_start: Line number of the first line in the window.
+        reference: Reference lines (or `None` for lines yet to be highlighted).
+        start: First line to compare.
+        end: End of range to compare.
+
+    Returns:
+        `True` if the lines are the same, otherwise `False`.
+    """
+    for line_number in range(start, end):
+        reference_line = reference[line_number]
+        if reference_line is None or not window[line_number - window_start].is_same(
+            reference_line
+        ):
+            return False
+    return True
+
+
+def highlight_changes(
+    lines: Sequence[str],
+    base_lines: Sequence[str],
+    base_highlighted: list[Content],
+    language: str,
+    theme: type[HighlightTheme] = HighlightTheme,
+) -> list[Content]:
+    """Highlight lines of code, reusing the highlighted lines of a previous version.
+
+    Args:
+        lines: Lines of code.
+        base_lines: Lines of a previous version of the code.
+        base_highlighted: Highlighted lines of the previous version.
+        language: Language of the code.
+        theme: Highlight theme.
+
+    Returns:
+        A highlighted `Content` per line.
+    """
+    opcodes = diff.diff_lines(base_lines, lines)
+    line_count = len(lines)
+    highlighted: list[Content | None] = [None] * line_count
+    changes: list[list[int]] = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            highlighted[j1:j2] = base_highlighted[i1:i2]
+        elif changes and j1 - changes[-1][1] < RESYNC_LINES * 2:
+            changes[-1][1] = j2
+        else:
+            changes.append([j1, j2])
+    if sum(end - start for start, end in changes) * 2 > line_count:
+        return highlight_lines(lines, language, theme)
+
+    for change_start, change_end in changes:
+        context = RESYNC_LINES
+        while True:
+            start = max(0, change_start - context)
+            end = min(line_count, change_end + context)
+            if start == 0 and end == line_count:
+                return highlight_lines(lines, language, theme)
+            window = highlight_lines(lines[start:end], language, theme)
+            # The lexer is assumed to be in the same state as in the previous version,
+            # where lines either side of the change are highlighted identically
+            sync_lines = context // 2
+            if (
+                start == 0
+                or _lines_match(
+                    window,
+                    start,
+                    highlighted,
+                    max(start, change_start - sync_lines),
+                    change_start,
+                )
+            ) and (
+                end == line_count
+                or _lines_match(window, start, highlighted, end - sync_lines, end)
+            ):
+                highlighted[change_start:end] = window[change_start - start :]
+                break
+            context *= 2
+
+    assert None not in highlighted
+    return highlighted  # type: ignore[return-value]
+
+
+@rich.repr.auto
+class HighlightCache:
+    """A size bounded cache of highlighted lines."""
+
+    def __init__(self, max_size: int) -> None:
+        """
+
+        Args:
+            max_size: Maximum number of characters of code to cache.
+        """
+        self.max_size = max_size
+        self._size = 0
+        self._cache: OrderedDict[
+            HighlightKey, tuple[Sequence[str], list[Content], int]
+        ] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield "max_size", self.max_size
+        yield "size", self._size
+        yield "hits", self.hits
+        yield "misses", self.misses
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @classmethod
+    def get_key(
+        cls, lines: Sequence[str], language: str, theme: type[HighlightTheme]
+    ) -> HighlightKey:
+        """Get the key for highlighted code.
+
+        Args:
+            lines: Lines of code.
+            language: Language of the code.
+            theme: Highlight theme.
+
+        Returns:
+            Cache key.
+        """
+        digest = sha1(
+            "\n".join(lines).encode("utf-8", "surrogatepass"), usedforsecurity=False
+        ).hexdigest()
+        return (language, digest, f"{theme.__module__}.{theme.__qualname__}")
+
+    def clear(self) -> None:
+        """Clear the cache."""
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+
+    def highlight(
+        self,
+        lines: Sequence[str],
+        language: str,
+        *,
+        theme: type[HighlightTheme] = HighlightTheme,
+        base: Sequence[str] | None = None,
+    ) -> list[Content]:
+        """Highlight lines of code.
+
+        May be called from threads.
+
+        Args:
+            lines: Lines of code.
+            language: Language of the code.
+            theme: Highlight theme.
+            base: Lines of a previous version of the code, which are reused if
+                they are in the cache.
+
+        Returns:
+            A highlighted `Content` per line.
+        """
+        key = self.get_key(lines, language, theme)
+        base_entry = None
+        with self._lock:
+            if (entry := self._cache.get(key)) is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+            if base is not None:
+                base_entry = self._cache.get(self.get_key(base, language, theme))
+
+        if base_entry is None:
+            highlighted = highlight_lines(lines, language, theme)
+        else:
+            base_lines, base_highlighted, _size = base_entry
+            highlighted = highlight_changes(
+                lines, base_lines, base_highlighted, language, theme
+            )
+        self._store(key, lines, highlighted)
+        return list(highlighted)
+
+    def _store(
+        self, key: HighlightKey, lines: Sequence[str], highlighted: list[Content]
+    ) -> None:
+        """Store highlighted lines, and discard the least recently used.
+
+        Args:
+            key: Cache key.
+            lines: Lines of code.
+            highlighted: Highlighted lines.
+        """
+        size = sum(map(len, lines))
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = (list(lines), highlighted, size)
+            self._size += size
+            while self._size > self.max_size:
+                _key, (_lines, _highlighted, discard_size) = self._cache.popitem(
+                    last=False
+                )
+                self._size -= discard_size
+
+
+highlight_cache = HighlightCache(constants.HIGHLIGHT_CACHE_SIZE)
+"""The cache shared by all widgets."""
@@ -3,17 +3,31 @@ from __future__ import annotations
 import asyncio
 import json
 from asyncio import Future, get_running_loop
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from functools import wraps
 import inspect
 from inspect import signature
 from enum import IntEnum
 import logging
-from types import TracebackType
-import weakref
+from types import NoneType, TracebackType, UnionType
 
 import rich.repr
-from typing import Callable, ParamSpec, TypeVar
+from typing import (
+    Annotated,
+    Any,
+    Callable,
+    Literal,
+    NewType,
+    NotRequired,
+    ParamSpec,
+    Required,
+    TypeAliasType,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+    is_typeddict,
+)
 from typeguard import check_type, CollectionCheckStrategy, TypeCheckError
 
 import textual
@@ -23,20 +37,156 @@ type JSONValue = str | int | float | bool | None
 type JSONType = dict[str, JSONType] | list[JSONType] | str | int | float | bool | None
 type JSONObject = dict[str, JSONType]
 type JSONList = list[JSONType]
+type Validation = Literal["full", "shallow"]
+"""How parameters are validated: "full" checks every item of collections, "shallow"
+checks only the top level type (i.e. that a TypedDict is a dict)."""
 
 log = logging.getLogger("jsonrpc")
 
 
-def expose(name: str = "", prefix: str = ""):
-    """Expose a method."""
+def _get_codec() -> tuple[
+    Callable[[bytes | str], JSONType], Callable[[JSONType], bytes]
+]:
+    """Get the fastest available JSON decoder and encoder.
+
+    Uses orjson or msgspec if installed, otherwise the standard library.
+
+    Returns:
+        A tuple of decode and encode callables.
+    """
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        return orjson.loads, orjson.dumps
+
+    try:
+        import msgspec.json
+    except ImportError:
+        pass
+    else:
+        return msgspec.json.decode, msgspec.json.encode
+
+    def dumps(value: JSONType) -> bytes:
+        return json.dumps(value).encode("utf-8")
+
+    return json.loads, dumps
+
+
+loads, dumps = _get_codec()
+"""Decode and encode JSON."""
+
+
+def expose(
+    name: str = "",
+    prefix: str = "",
+    *,
+    validation: Validation = "full",
+    concurrency: int | None = None,
+):
+    """Expose a method.
+
+    Args:
+        name: The name of the exposed method. Leave blank to auto-detect.
+        prefix: A prefix to be applied to the name.
+        validation: How parameters are validated. Use "shallow" for frequent calls with
+            large parameters, where a full check would dominate.
+        concurrency: Maximum number of concurrent calls, or `None` for no limit.
+    """
 
     def expose_method[T: Callable](callable: T) -> T:
         setattr(callable, "_jsonrpc_expose", f"{prefix}{name or callable.__name__}")
+        setattr(callable, "_jsonrpc_validation", validation)
+        setattr(callable, "_jsonrpc_concurrency", concurrency)
         return callable
 
     return expose_method
 
 
+def get_shape(annotation: object) -> tuple[type, ...] | None:
+    """Get the types a value must be an instance of, ignoring the contents.
+
+    Args:
+        annotation: A type annotation.
+
+    Returns:
+        A tuple of types, or `None` if any value is accepted.
+    """
+    if isinstance(annotation, TypeAliasType):
+        return get_shape(annotation.__value__)
+    if annotation is None or annotation is NoneType:
+        return (NoneType,)
+    if annotation is Any or annotation is object:
+        return None
+    if annotation is float:
+        # An int is acceptable where a float is expected
+        return (int, float)
+    if is_typeddict(annotation):
+        return (dict,)
+    if isinstance(annotation, NewType):
+        return get_shape(annotation.__supertype__)
+    origin = get_origin(annotation)
+    if origin is Union or origin is UnionType:
+        shapes: list[type] = []
+        for argument in get_args(annotation):
+            if (shape := get_shape(argument)) is None:
+                return None
+            shapes.extend(shape)
+        return tuple(dict.fromkeys(shapes))
+    if origin is Literal:
+        return tuple(dict.fromkeys(type(value) for value in get_args(annotation)))
+    if origin is Annotated or origin is Required or origin is NotRequired:
+        return get_shape(get_args(annotation)[0])
+    if origin is not None:
+        annotation = origin
+    if isinstance(annotation, type):
+        return (annotation,)
+    return None
+
+
+SHALLOW_TYPES = {str, int, float, bool, dict, list}
+"""Types where a full check is no more than a check of the top level type."""
+
+
+def compile_validator(
+    parameter_type: object, validation: Validation = "full"
+) -> Callable[[JSONType], None] | None:
+    """Compile a function to validate a parameter.
+
+    Args:
+        parameter_type: Type annotation of the parameter.
+        validation: Validation mode.
+
+    Returns:
+        A callable which raises `TypeCheckError` if a value isn't the expected type,
+            or `None` if no validation is required.
+    """
+    if parameter_type is inspect.Parameter.empty:
+        return None
+    if validation == "shallow" or parameter_type in SHALLOW_TYPES:
+        if (shape := get_shape(parameter_type)) is None:
+            return None
+        type_names = " | ".join(shape_type.__name__ for shape_type in shape)
+
+        def validate_shape(value: JSONType) -> None:
+            if not isinstance(value, shape):
+                raise TypeCheckError(
+                    f"{type(value).__name__} is not an instance of {type_names}"
+                )
+
+        return validate_shape
+
+    def validate(value: JSONType) -> None:
+        check_type(
+            value,
+            parameter_type,
+            collection_check_strategy=CollectionCheckStrategy.ALL_ITEMS,
+        )
+
+    return validate
+
+
 class NoDefault:
     def __repr__(self) -> str:
         return "NO_DEFAULT"
@@ -60,6 +210,10 @@ class ErrorCode(IntEnum):
 class Parameter:
     type: type
     default: JSONType | NoDefault
+    validate: Callable[[JSONType], None] | None = None
+    """Raises `TypeCheckError` for an invalid value, or `None` to skip validation."""
+    is_server: bool = False
+    """Is the parameter set to the server (rather than a value from the call)?"""
 
 
 @dataclass
@@ -67,6 +221,26 @@ class Method:
     name: str
     callable: Callable
     parameters: dict[str, Parameter]
+    semaphore: asyncio.Semaphore | None = None
+    """Limits concurrent calls, or `None` for no limit."""
+    is_async: bool = field(init=False)
+    positional: list[tuple[str, Parameter]] = field(init=False)
+    """Parameters which may be set from a list of params."""
+    server_parameters: list[str] = field(init=False)
+    defaults: dict[str, JSONType | NoDefault] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.is_async = inspect.iscoroutinefunction(self.callable)
+        parameters = self.parameters.items()
+        self.positional = [
+            (name, parameter)
+            for name, parameter in parameters
+            if not parameter.is_server
+        ]
+        self.server_parameters = [
+            name for name, parameter in parameters if parameter.is_server
+        ]
+        self.defaults = {name: parameter.default for name, parameter in parameters}
 
 
 @rich.repr.auto
@@ -118,6 +292,26 @@ class APIError(Exception):
             super().__init__(f"{message} ({code}); data={data!r}")
 
 
+class RequestTimeout(APIError):
+    """The remote end didn't respond to a call before its deadline."""
+
+    def __init__(self, method: str, timeout: float) -> None:
+        super().__init__(
+            int(ErrorCode.INTERNAL_ERROR),
+            f"No response to {method!r} after {timeout:g} seconds",
+            None,
+        )
+
+
+class ConnectionClosed(APIError):
+    """The connection closed before the remote end responded to a call."""
+
+    def __init__(self, method: str, reason: str) -> None:
+        super().__init__(
+            int(ErrorCode.INTERNAL_ERROR), f"No response to {method!r}; {reason}", None
+        )
+
+
 class Server:
     def __init__(self) -> None:
         self._methods: dict[str, Method] = {}
@@ -129,7 +323,7 @@ class Server:
         else:
             # Batch call
             response = await self._dispatch_batch(json)
-        log.debug(f"OUT {response}")
+        log.debug("OUT %r", response)
         return response
 
     def expose_instance(self, instance: object) -> None:
@@ -137,7 +331,11 @@ class Server:
         for method_name in dir(instance):
             method = getattr(instance, method_name)
             if (jsonrpc_expose := getattr(method, "_jsonrpc_expose", None)) is not None:
-                self.method(jsonrpc_expose)(method)
+                self.method(
+                    jsonrpc_expose,
+                    validation=getattr(method, "_jsonrpc_validation", "full"),
+                    concurrency=getattr(method, "_jsonrpc_concurrency", None),
+                )(method)
 
     async def _dispatch_object(self, json: JSONObject) -> JSONType | None:
         json_id = json.get("id")
@@ -208,52 +406,41 @@ class Server:
                 "Invalid request; 'params' attribute should be a list or an object"
             )
 
-        arguments: dict[str, JSONType | Server | NoDefault] = {
-            name: parameter.default for name, parameter in method.parameters.items()
-        }
+        arguments: dict[str, JSONType | Server | NoDefault] = method.defaults.copy()
 
-        def validate(value: JSONType, parameter_type: type) -> None:
+        def validate(parameter: Parameter, value: JSONType) -> None:
             """Validate types."""
             try:
-                check_type(
-                    value,
-                    parameter_type,
-                    collection_check_strategy=CollectionCheckStrategy.ALL_ITEMS,
-                )
+                parameter.validate(value)  # type: ignore[misc]
             except TypeCheckError as error:
                 raise InvalidParams(
-                    f"Parameter is not the expected type ({parameter_type}); {error}",
+                    f"Parameter is not the expected type ({parameter.type}); {error}",
                     id=request_id,
                 )
 
         if isinstance(params, list):
-            parameter_items = [
-                (name, parameter)
-                for name, parameter in method.parameters.items()
-                if not issubclass(parameter.type, Server)
-            ]
-            for (parameter_name, parameter), value in zip(parameter_items, params):
-                if issubclass(parameter.type, Server):
-                    value = self
-                else:
-                    validate(value, parameter.type)
+            for (parameter_name, parameter), value in zip(method.positional, params):
+                if parameter.validate is not None:
+                    validate(parameter, value)
                 arguments[parameter_name] = value
         else:
             for parameter_name, value in params.items():
-                if parameter := method.parameters.get(parameter_name):
-                    validate(value, parameter.type)
+                if (
+                    parameter := method.parameters.get(parameter_name)
+                ) is not None and not parameter.is_server:
+                    if parameter.validate is not None:
+                        validate(parameter, value)
                     arguments[parameter_name] = value
 
-        for name, parameter in method.parameters.items():
-            if inspect.isclass(parameter.type) and issubclass(parameter.type, Server):
-                arguments[name] = self
+        for name in method.server_parameters:
+            arguments[name] = self
 
         try:
-            call_result = method.callable(**arguments)
-            if inspect.isawaitable(call_result):
-                result = await call_result
+            if method.semaphore is None:
+                result = await self._call_method(method, arguments)
             else:
-                result = call_result
+                async with method.semaphore:
+                    result = await self._call_method(method, arguments)
         except JSONRPCError as error:
             error.id = request_id
             raise error
@@ -271,12 +458,52 @@ class Server:
         response_object = {"jsonrpc": "2.0", "result": result, "id": request_id}
         return response_object
 
+    async def _call_method(
+        self, method: Method, arguments: dict[str, JSONType | Server | NoDefault]
+    ) -> JSONType:
+        """Call an exposed method.
+
+        Args:
+            method: Method to call.
+            arguments: Arguments for the method.
+
+        Returns:
+            The return value.
+        """
+        call_result = method.callable(**arguments)
+        if inspect.isawaitable(call_result):
+            return await call_result
+        return call_result
+
     async def _dispatch_batch(self, json: JSONList) -> list[JSONType]:
-        batch_results: list[JSONType] = []
+        """Dispatch a batch of calls.
+
+        Calls to async methods run concurrently (in tasks). Calls to other methods
+        run immediately, so they run in the order they were sent.
+
+        Args:
+            json: A list of JSONRPC call objects.
+
+        Returns:
+            A list of results, in the order of the calls.
+        """
+        results: list[JSONType | asyncio.Task[JSONType | None]] = []
         for request in json:
             if not isinstance(request, dict):
                 continue
-            result = await self._dispatch_object(request)
+            method_name = request.get("method")
+            if (
+                isinstance(method_name, str)
+                and (method := self._methods.get(method_name)) is not None
+                and method.is_async
+            ):
+                results.append(asyncio.create_task(self._dispatch_object(request)))
+            else:
+                results.append(await self._dispatch_object(request))
+        batch_results: list[JSONType] = []
+        for result in results:
+            if isinstance(result, asyncio.Task):
+                result = await result
             if result is not None:
                 batch_results.append(result)
         return batch_results
@@ -291,12 +518,19 @@ class Server:
         name: str = "",
         *,
         prefix: str = "",
+        validation: Validation = "full",
+        concurrency: int | None = None,
     ) -> Callable[[MethodT], MethodT]:
         """Decorator to expose a method via JSONRPC.
 
+        Parameter validation is compiled when the method is exposed.
+
         Args:
             name: The name of the exposed method. Leave blank to auto-detect.
             prefix: A prefix to be applied to the name.
+            validation: How parameters are validated. Use "shallow" for frequent calls
+                with large parameters, where a full check would dominate.
+            concurrency: Maximum number of concurrent calls, or `None` for no limit.
 
         Returns:
             Decorator.
@@ -308,22 +542,38 @@ class Server:
                 name = callable.__name__
             name = f"{prefix}{name}"
 
-            parameters = {
-                name: Parameter(
-                    (
-                        eval(parameter.annotation)
-                        if isinstance(parameter.annotation, str)
-                        else parameter.annotation
-                    ),
+            parameters: dict[str, Parameter] = {}
+            for parameter_name, parameter in signature(callable).parameters.items():
+                parameter_type = (
+                    eval(parameter.annotation)
+                    if isinstance(parameter.annotation, str)
+                    else parameter.annotation
+                )
+                is_server = inspect.isclass(parameter_type) and issubclass(
+                    parameter_type, Server
+                )
+                parameters[parameter_name] = Parameter(
+                    parameter_type,
                     (
                         NO_DEFAULT
                         if parameter.default is inspect._empty
                         else parameter.default
                     ),
+                    validate=(
+                        None
+                        if is_server
+                        else compile_validator(parameter_type, validation)
+                    ),
+                    is_server=is_server,
                 )
-                for name, parameter in signature(callable).parameters.items()
-            }
-            self._methods[name] = Method(name, callable, parameters)
+            self._methods[name] = Method(
+                name,
+                callable,
+                parameters,
+                semaphore=(
+                    None if concurrency is None else asyncio.Semaphore(concurrency)
+                ),
+            )
             return callable
 
         return expose_method
@@ -332,12 +582,26 @@ class Server:
 @rich.repr.auto
 class MethodCall[ReturnType]:
     def __init__(
-        self, method: str, id: int | None, parameters: dict[str, JSONType]
+        self,
+        method: str,
+        id: int | None,
+        parameters: dict[str, JSONType],
+        timeout: float | None = None,
     ) -> None:
+        """
+
+        Args:
+            method: Name of the method.
+            id: Request ID, or `None` for a notification.
+            parameters: Parameters for the call.
+            timeout: Time in seconds to wait for a response, or `None` to wait until
+                the connection is closed.
+        """
         self.method = method
         self.id = id
         self.parameters = parameters
         self.notification = False
+        self.timeout = timeout
         self.future: Future[ReturnType] = get_running_loop().create_future()
 
     def __rich_repr__(self) -> rich.repr.Result:
@@ -365,16 +629,40 @@ class MethodCall[ReturnType]:
         return json
 
     async def wait(self, timeout: float | None = None) -> ReturnType | None:
+        """Wait for the response.
+
+        Args:
+            timeout: Time in seconds to wait, or `None` to use the timeout of the call.
+
+        Raises:
+            RequestTimeout: If there was no response before the timeout.
+            ConnectionClosed: If the connection closed before a response.
+            APIError: If the remote end responded with an error.
+
+        Returns:
+            The result, or `None` for a notification.
+        """
         if self.id is None:
             return None
-        async with asyncio.timeout(timeout):
-            return await self.future
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            async with asyncio.timeout(timeout):
+                # If cancelled, the API will discard a late response
+                return await self.future
+        except TimeoutError:
+            assert timeout is not None
+            raise RequestTimeout(self.method, timeout) from None
 
 
 P = ParamSpec("P")  # Captures parameter types
 T = TypeVar("T")  # Original return type
 
 
+_requests: list[Request] = []
+"""Requests being built (within a `with` block)."""
+
+
 class Request:
     def __init__(self, api: API, callback: Callable[[Request], None] | None) -> None:
         self.api = api
@@ -385,7 +673,7 @@ class Request:
         self._calls.append(call)
 
     def __enter__(self) -> Request:
-        self.api._requests.append(self)
+        _requests.append(self)
         return self
 
     def __exit__(
@@ -394,7 +682,7 @@ class Request:
         exc_val: type[BaseException],
         exc_tb: TracebackType,
     ) -> None:
-        self.api._requests.pop()
+        _requests.pop()
         if self._callback is not None:
             self._callback(self)
 
@@ -417,32 +705,112 @@ class Request:
     @property
     def body_json(self) -> bytes:
         """Dump the body as encoded json."""
-        body_json = json.dumps(self.body).encode("utf-8")
+        body_json = dumps(self.body)
         return body_json
 
 
+@rich.repr.auto
 class API:
-    def __init__(self) -> None:
+    """A remote API.
+
+    Methods are declared with the `method` and `notification` decorators, and may be
+    called within the `with` block of a request from any API instance. Request IDs, and
+    calls waiting for a response, belong to the instance which created the request, so
+    there should be an instance per connection.
+
+    """
+
+    def __init__(self, timeout: float | None = None) -> None:
+        """
+
+        Args:
+            timeout: Default time in seconds to wait for a response, or `None` to
+                wait until the connection is closed.
+        """
+        self.timeout = timeout
         self._request_id = 0
-        self._requests: list[Request] = []
-        self._calls: weakref.WeakValueDictionary[int, MethodCall] = (
-            weakref.WeakValueDictionary()
-        )
+        self._calls: dict[int, MethodCall] = {}
+        """Calls waiting for a response, by request ID."""
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield "timeout", self.timeout, None
+        yield "pending", len(self._calls)
+
+    @property
+    def pending_calls(self) -> list[MethodCall]:
+        """Calls waiting for a response."""
+        return list(self._calls.values())
 
     def request(self, callback: Callable[[Request], None] | None = None) -> Request:
         """Create a Request context manager."""
         request = Request(self, callback)
         return request
 
+    def add_call(
+        self,
+        name: str,
+        parameters: dict[str, JSONType],
+        notification: bool = False,
+        timeout: float | None = None,
+    ) -> MethodCall:
+        """Add a call to the current request.
+
+        Args:
+            name: Name of the method.
+            parameters: Parameters for the call.
+            notification: Is the call a notification (which has no response)?
+            timeout: Time to wait for a response, or `None` for the default.
+
+        Returns:
+            A method call.
+        """
+        if notification:
+            method_call = MethodCall(name, None, parameters)
+        else:
+            self._request_id += 1
+            request_id = self._request_id
+            method_call = MethodCall(
+                name,
+                request_id,
+                parameters,
+                self.timeout if timeout is None else timeout,
+            )
+            self._calls[request_id] = method_call
+            method_call.future.add_done_callback(
+                lambda _future: self._calls.pop(request_id, None)
+            )
+        return method_call
+
+    def close(self, reason: str = "connection closed") -> list[MethodCall]:
+        """Fail any calls waiting for a response, when the connection closes.
+
+        Args:
+            reason: The reason the connection closed.
+
+        Returns:
+            The calls which were waiting for a response.
+        """
+        outstanding = list(self._calls.values())
+        self._calls.clear()
+        for method_call in outstanding:
+            if not method_call.future.done():
+                method_call.future.set_exception(
+                    ConnectionClosed(method_call.method, reason)
+                )
+        return outstanding
+
     def _process_method_response(self, response: JSONObject) -> None:
         if (id := response.get("id")) is not None and isinstance(id, int):
-            if (method_call := self._calls.get(id)) is not None:
+            if (method_call := self._calls.pop(id, None)) is not None:
+                if method_call.future.done():
+                    # Cancelled (timed out)
+                    return
                 try:
                     result = response["result"]
                 except KeyError:
                     if (error := response.get("error")) is not None:
                         if isinstance(error, dict):
-                            code = error.get("error", -1)
+                            code = error.get("code", -1)
                             if not isinstance(code, int):
                                 code = -1
                             message = str(error.get("message", "unknown error"))
@@ -450,6 +818,10 @@ class API:
                             method_call.future.set_exception(
                                 APIError(code, message, data)
                             )
+                            return
+                    method_call.future.set_exception(
+                        APIError(-1, "invalid response", response)
+                    )
                 else:
                     method_call.future.set_result(result)
 
@@ -480,22 +852,20 @@ class API:
                 name = func.__name__
             name = f"{prefix}{name}"
 
+            parameters = signature(func).parameters
+
             @wraps(func)
             def wrapper(*args: P.args, **kwargs: P.kwargs) -> MethodCall[T]:
-                parameters = signature(func).parameters
                 call_parameters = {}
                 for arg, parameter_name in zip(args, parameters):
                     call_parameters[parameter_name] = arg
-                for parameter_name, arg in kwargs:
+                for parameter_name, arg in kwargs.items():
                     call_parameters[parameter_name] = arg
-                if notification:
-                    method_call = MethodCall(name, None, call_parameters)
-                else:
-                    self._request_id += 1
-                    method_call = MethodCall(name, self._request_id, call_parameters)
-                self._requests[-1].add_call(method_call)
-                if method_call.id is not None:
-                    self._calls[method_call.id] = method_call
+                request = _requests[-1]
+                method_call = request.api.add_call(
+                    name, call_parameters, notification=notification
+                )
+                request.add_call(method_call)
                 return method_call
 
             return wrapper
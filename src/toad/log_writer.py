@@ -0,0 +1,295 @@
+"""
+A log writer shared by agents, which does its I/O in a dedicated thread.
+"""
+
+from __future__ import annotations
+
+import atexit
+import gzip
+import shutil
+import threading
+from pathlib import Path
+from queue import Empty, Full, SimpleQueue, Queue
+from time import monotonic
+from typing import BinaryIO, Literal
+
+import rich.repr
+
+from toad import constants
+
+type Compression = Literal["gzip", "zstd"]
+
+
+def _open_compressed(path: Path, compression: Compression) -> BinaryIO:
+    """Open a file for writing compressed data.
+
+    Args:
+        path: Path to file.
+        compression: Compression format. zstd requires Python 3.14 or the `zstandard`
+            package.
+
+    Returns:
+        A binary file.
+    """
+    if compression == "zstd":
+        try:
+            from compression import zstd  # type: ignore[import-not-found]
+        except ImportError:
+            import zstandard as zstd  # type: ignore[import-not-found,no-redef]
+        return zstd.open(path, "wb")
+    return gzip.open(path, "wb")
+
+
+def _has_zstd() -> bool:
+    """Check if zstd compression is available."""
+    try:
+        from compression import zstd  # type: ignore[import-not-found]  # noqa: F401
+    except ImportError:
+        try:
+            import zstandard  # type: ignore[import-not-found]  # noqa: F401
+        except ImportError:
+            return False
+    return True
+
+
+@rich.repr.auto
+class LogWriter(threading.Thread):
+    """Appends text to log files.
+
+    Text is queued, so that writing never blocks the caller. The thread buffers text,
+    and writes it when the buffer is large or the flush interval has elapsed.
+
+    If text is logged faster than it can be written, and the queue is full, the excess
+    is dropped and a line summarizing the number of dropped lines is written in its place.
+
+    Log files are rotated when they exceed a maximum size, and rotated files may be
+    compressed.
+
+    """
+
+    def __init__(
+        self,
+        *,
+        max_queue: int = 10_000,
+        flush_interval: float = 1.0,
+        flush_size: int = 64 * 1024,
+        max_size: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        compression: Compression | None = None,
+    ) -> None:
+        """
+
+        Args:
+            max_queue: Maximum number of writes to queue, before dropping lines.
+            flush_interval: Maximum time (in seconds) to buffer text.
+            flush_size: Maximum number of characters to buffer.
+            max_size: Size of a log file (in bytes) which triggers rotation, or 0 for
+                no rotation.
+            backup_count: Number of rotated log files to keep.
+            compression: Compression for rotated log files, or `None` for no compression.
+                If zstd is not available, gzip is used.
+        """
+        self._queue: Queue[tuple[Path, str]] = Queue(max_queue)
+        self._requests: SimpleQueue[threading.Event | None] = SimpleQueue()
+        """Requests to flush (an event to set when done), or `None` to wake the thread."""
+        self._idle = True
+        """Is the thread waiting for text?"""
+        self._queued_size = 0
+        """Approximate number of characters queued since the thread was last woken."""
+        self._queued_count = 0
+        """Approximate number of writes queued since the thread was last woken."""
+        self._wake_count = max(1, max_queue // 2)
+        self._stopping = threading.Event()
+        self._dropped: dict[Path, int] = {}
+        self._dropped_lock = threading.Lock()
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
+        self._max_size = max_size
+        self._backup_count = backup_count
+        if compression == "zstd" and not _has_zstd():
+            compression = "gzip"
+        self._compression = compression
+        self._suffix = {"gzip": ".gz", "zstd": ".zst", None: ""}[compression]
+        super().__init__(name=repr(self), daemon=True)
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield "compression", self._compression, None
+        yield "max_size", self._max_size
+
+    def write(self, path: Path, text: str) -> None:
+        """Append text to a log file (in the background).
+
+        Never blocks; if the queue is full, the text is dropped.
+
+        Args:
+            path: Path to log file.
+            text: Text to append.
+        """
+        try:
+            self._queue.put_nowait((path, text))
+        except Full:
+            with self._dropped_lock:
+                self._dropped[path] = self._dropped.get(path, 0) + max(
+                    1, text.count("\n")
+                )
+            return
+        self._queued_size += len(text)
+        self._queued_count += 1
+        # Only wake the thread if it is waiting, if there is enough text to flush,
+        # or if the queue is filling up
+        if (
+            self._idle
+            or self._queued_size >= self._flush_size
+            or self._queued_count >= self._wake_count
+        ):
+            self._queued_size = 0
+            self._queued_count = 0
+            self._idle = False
+            self._requests.put(None)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait for queued text to be written.
+
+        Args:
+            timeout: Maximum time to wait, or `None` for no limit.
+
+        Returns:
+            `True` if the text was written, or `False` if the timeout elapsed.
+        """
+        if not self.is_alive():
+            return False
+        flushed = threading.Event()
+        self._requests.put(flushed)
+        return flushed.wait(timeout)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Write queued text, and stop the thread.
+
+        Args:
+            timeout: Maximum time to wait, or `None` for no limit.
+        """
+        if self.is_alive():
+            self._stopping.set()
+            self._requests.put(None)
+            self.join(timeout)
+
+    def run(self) -> None:
+        buffers: dict[Path, list[str]] = {}
+        buffered_size = 0
+        flush_time = monotonic() + self._flush_interval
+        get_text = self._queue.get_nowait
+        request: threading.Event | None = None
+        while True:
+            # Text queued after this point will wake the thread
+            self._idle = True
+            while True:
+                try:
+                    path, text = get_text()
+                except Empty:
+                    break
+                buffers.setdefault(path, []).append(text)
+                buffered_size += len(text)
+            if buffers:
+                self._idle = False
+
+            stopping = self._stopping.is_set()
+            if (
+                request is not None
+                or stopping
+                or buffered_size >= self._flush_size
+                or (buffers and monotonic() >= flush_time)
+            ):
+                self._write_buffers(buffers)
+                buffered_size = 0
+                flush_time = monotonic() + self._flush_interval
+                if request is not None:
+                    request.set()
+                    request = None
+                if stopping:
+                    return
+                continue
+
+            try:
+                request = self._requests.get(
+                    timeout=max(0.0, flush_time - monotonic()) if buffers else None
+                )
+            except Empty:
+                request = None
+
+    def _write_buffers(self, buffers: dict[Path, list[str]]) -> None:
+        """Write and clear buffered text.
+
+        Args:
+            buffers: Text to write, keyed by path.
+        """
+        with self._dropped_lock:
+            dropped = self._dropped.copy()
+            self._dropped.clear()
+        for path, count in dropped.items():
+            buffers.setdefault(path, []).append(
+                f"[log] {count} line(s) dropped; logging was too slow\n"
+            )
+        for path, lines in buffers.items():
+            try:
+                with path.open("at", encoding="utf-8", errors="replace") as log_file:
+                    log_file.write("".join(lines))
+                    size = log_file.tell()
+                if self._max_size and size > self._max_size:
+                    self._rotate(path)
+            except OSError:
+                pass
+        buffers.clear()
+
+    def _rotate(self, path: Path) -> None:
+        """Rotate a log file.
+
+        The log file is renamed with the suffix ".1" (plus an extension for the
+        compression), and previously rotated files are renamed to make way.
+
+        Args:
+            path: Path to log file.
+        """
+        if not self._backup_count:
+            path.unlink()
+            return
+        suffix = self._suffix
+        backups = [
+            path.with_name(f"{path.name}.{index}{suffix}")
+            for index in range(1, self._backup_count + 1)
+        ]
+        for source, destination in reversed(list(zip(backups, backups[1:]))):
+            if source.exists():
+                source.replace(destination)
+        if self._compression is None:
+            path.replace(backups[0])
+        else:
+            with path.open("rb") as source_file:
+                with _open_compressed(backups[0], self._compression) as backup_file:
+                    shutil.copyfileobj(source_file, backup_file)
+            path.unlink()
+
+
+_log_writer: LogWriter | None = None
+_log_writer_lock = threading.Lock()
+
+
+def get_log_writer() -> LogWriter:
+    """Get the log writer shared by agents (starting it if necessary).
+
+    Returns:
+        Log writer.
+    """
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None:
+            compression = constants.LOG_COMPRESSION
+            _log_writer = LogWriter(
+                max_size=constants.LOG_MAX_SIZE,
+                backup_count=constants.LOG_BACKUPS,
+                compression=(
+                    compression if compression in ("gzip", "zstd") else None  # type: ignore[arg-type]
+                ),
+            )
+            _log_writer.start()
+            atexit.register(_log_writer.stop, timeout=5)
+        return _log_writer
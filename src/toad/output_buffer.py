@@ -0,0 +1,189 @@
+"""
+A buffer for the output of a process, which retains the most recent bytes.
+
+Output is copied in to a fixed size ring buffer, so nothing is allocated per write.
+Text is decoded incrementally, so that polling the output only decodes the bytes written
+since the last poll (rather than the whole buffer).
+
+"""
+
+from __future__ import annotations
+
+import codecs
+from collections import deque
+
+import rich.repr
+
+PIECE_SIZE = 4096
+"""Maximum number of bytes decoded at a time, which bounds the work to discard text."""
+
+
+def is_continuation(byte_value: int) -> bool:
+    """Check if the given byte is a utf-8 continuation byte.
+
+    Args:
+        byte_value: Ordinal of the byte.
+
+    Returns:
+        `True` if the byte is a continuation, or `False` if it is the start of a character.
+    """
+    return (byte_value & 0b11000000) == 0b10000000
+
+
+@rich.repr.auto
+class OutputBuffer:
+    """Retains the most recent output of a process, up to a limit."""
+
+    def __init__(self, limit: int | None = None) -> None:
+        """
+
+        Args:
+            limit: Maximum number of bytes to retain, or `None` for no limit.
+        """
+        self.limit = limit
+        self._buffer = bytearray(limit or 0)
+        self._position = 0
+        """Number of bytes written."""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._text = ""
+        """Text decoded up to the last poll."""
+        self._text_start = 0
+        """Position of the first byte in the text."""
+        self._decoded_position = 0
+        """Position of the last poll (bytes since are yet to be decoded)."""
+        self._pieces: deque[tuple[int, int, int]] = deque()
+        """Pieces of the text: start position, end position, and length of text."""
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield "limit", self.limit
+        yield "position", self._position
+
+    def __len__(self) -> int:
+        return self._position - self.start
+
+    @property
+    def position(self) -> int:
+        """Number of bytes written."""
+        return self._position
+
+    @property
+    def start(self) -> int:
+        """Position of the oldest byte retained."""
+        if self.limit is None:
+            return 0
+        return max(0, self._position - self.limit)
+
+    @property
+    def truncated(self) -> bool:
+        """Have bytes been discarded?"""
+        return self.start > 0
+
+    def write(self, data: bytes) -> None:
+        """Write bytes to the buffer.
+
+        Args:
+            data: Bytes to write.
+        """
+        size = len(data)
+        if self.limit is None:
+            self._buffer += data
+        elif self.limit:
+            limit = self.limit
+            view = memoryview(data)
+            if size > limit:
+                view = view[-limit:]
+            offset = (self._position + size - len(view)) % limit
+            first_size = min(len(view), limit - offset)
+            self._buffer[offset : offset + first_size] = view[:first_size]
+            if first_size < len(view):
+                self._buffer[: len(view) - first_size] = view[first_size:]
+        self._position += size
+
+    def read(self, start: int, end: int | None = None) -> bytes:
+        """Read bytes from the buffer.
+
+        Args:
+            start: Position of first byte (clamped to the bytes retained).
+            end: Position of the end of the range, or `None` for all bytes.
+
+        Returns:
+            Bytes.
+        """
+        start = max(start, self.start)
+        end = self._position if end is None else min(end, self._position)
+        if start >= end:
+            return b""
+        view = memoryview(self._buffer)
+        if self.limit is None:
+            return view[start:end].tobytes()
+        limit = self.limit
+        start_offset = start % limit
+        end_offset = start_offset + (end - start)
+        if end_offset <= limit:
+            return view[start_offset:end_offset].tobytes()
+        return b"".join((view[start_offset:], view[: end_offset - limit]))
+
+    def _get_character_start(self) -> int:
+        """Get the position of the first retained byte which starts a character.
+
+        Returns:
+            A position.
+        """
+        start = self.start
+        if not start:
+            return 0
+        buffer = self._buffer
+        limit = self.limit or 1
+        position = self._position
+        while start < position and is_continuation(buffer[start % limit]):
+            start += 1
+        return start
+
+    def get_text(self) -> tuple[str, bool]:
+        """Get the retained output as text.
+
+        Only the bytes written since the last call are decoded.
+
+        Returns:
+            A tuple of the text, and a bool which indicates if bytes were discarded.
+        """
+        position = self._position
+        if position == self._decoded_position:
+            return self._text, self.truncated
+        start = self._get_character_start()
+        pieces = self._pieces
+        decoder = self._decoder
+        # Bytes held in the decoder are the start of a character split across writes
+        decoded_end = self._decoded_position - len(decoder.getstate()[0])
+        if start >= decoded_end:
+            # Everything decoded has been discarded
+            decoder.reset()
+            pieces.clear()
+            self._text = ""
+            self._text_start = self._decoded_position = decoded_end = start
+        elif start > self._text_start:
+            # Remove text for discarded bytes from the start
+            discard_length = 0
+            while pieces and pieces[0][1] <= start:
+                discard_length += pieces.popleft()[2]
+            if pieces and pieces[0][0] < start:
+                # A piece is partially discarded; decode the remainder
+                _piece_start, piece_end, text_length = pieces[0]
+                remaining_length = len(
+                    self.read(start, piece_end).decode("utf-8", "replace")
+                )
+                discard_length += text_length - remaining_length
+                pieces[0] = (start, piece_end, remaining_length)
+            self._text = self._text[discard_length:]
+            self._text_start = start
+        new_text: list[str] = []
+        for piece_start in range(self._decoded_position, position, PIECE_SIZE):
+            piece_end = min(piece_start + PIECE_SIZE, position)
+            if text := decoder.decode(self.read(piece_start, piece_end)):
+                end = piece_end - len(decoder.getstate()[0])
+                pieces.append((decoded_end, end, len(text)))
+                new_text.append(text)
+                decoded_end = end
+        self._decoded_position = position
+        self._text = "".join([self._text, *new_text])
+        return self._text, self.truncated
@@ -3,6 +3,8 @@ import os
 from pathlib import Path
 from typing import Literal, Sequence
 
+from toad.file_index import find_file_index
+
 
 def longest_common_prefix(strings: list[str]) -> str:
     """
@@ -41,6 +43,11 @@ class DirectoryReadTask:
         self._task: asyncio.Task | None = None
 
     def read(self) -> None:
+        if (file_index := find_file_index(self.path)) is not None:
+            listing = file_index.list_directory(self.path, include_ignored=True)
+            if listing is not None:
+                self.directory_listing.extend(self.path / name for name, _ in listing)
+                return
         # TODO: Should this be cancellable, or have a maximum number of paths for the case of very large directories?
         for path in self.path.iterdir():
             self.directory_listing.append(path)
@@ -0,0 +1,250 @@
+"""
+A pseudo-terminal session, shared by the shell, command pane, and terminal tool.
+
+Reads and writes go through asyncio pipe transports on the PTY, so writing a keystroke
+doesn't require a round trip through a thread pool. Large writes are buffered by the
+transport (rather than partially written), and writers wait for the buffer to drain.
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import os
+import pty
+import struct
+import termios
+from asyncio.subprocess import Process
+from typing import Mapping
+
+import rich.repr
+
+from toad.shell_read import ReadStatistics, ShellReader
+
+BUFFER_SIZE = 64 * 1024
+"""Default maximum number of bytes per read."""
+WRITE_HIGH_WATER = 64 * 1024
+"""Writes wait for the write buffer to drain when it exceeds this many bytes."""
+
+
+def resize_pty(fd: int, columns: int, rows: int) -> None:
+    """Resize a pseudo terminal.
+
+    Args:
+        fd: File descriptor.
+        columns: Columns (width).
+        rows: Rows (height).
+    """
+    # Pack the dimensions into the format expected by TIOCSWINSZ
+    try:
+        size = struct.pack("HHHH", rows, columns, 0, 0)
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, size)
+    except OSError:
+        # Possibly file descriptor closed
+        pass
+
+
+class _WriteProtocol(asyncio.BaseProtocol):
+    """Tracks when the write transport is paused, for flow control."""
+
+    def __init__(self) -> None:
+        self.resumed = asyncio.Event()
+        self.resumed.set()
+
+    def pause_writing(self) -> None:
+        self.resumed.clear()
+
+    def resume_writing(self) -> None:
+        self.resumed.set()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self.resumed.set()
+
+
+@rich.repr.auto
+class PTYSession:
+    """A process running in a pseudo terminal."""
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE) -> None:
+        """
+
+        Args:
+            buffer_size: Maximum number of bytes per read.
+        """
+        self.buffer_size = buffer_size
+        self._master: int | None = None
+        self._reader: ShellReader | None = None
+        self._read_transport: asyncio.ReadTransport | None = None
+        self._write_transport: asyncio.WriteTransport | None = None
+        self._write_protocol = _WriteProtocol()
+        self._size: tuple[int, int] = (80, 24)
+        self._applied_size: tuple[int, int] | None = None
+        self._resize_handle: asyncio.Handle | None = None
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield "fd", self._master
+        yield "size", self._size
+
+    @property
+    def fd(self) -> int | None:
+        """File descriptor of the PTY, or `None` if not running."""
+        return self._master
+
+    @property
+    def read_statistics(self) -> ReadStatistics:
+        """Counters for reads from the PTY."""
+        if self._reader is None:
+            return ReadStatistics()
+        return self._reader.statistics
+
+    @property
+    def is_cooked(self) -> bool:
+        """Is the terminal in 'cooked' mode?"""
+        if self._master is None:
+            return True
+        try:
+            attrs = termios.tcgetattr(self._master)
+        except termios.error:
+            return True
+        lflag = attrs[3]
+        return bool(lflag & termios.ICANON)
+
+    async def spawn(
+        self,
+        command: str,
+        *,
+        env: Mapping[str, str] | None = None,
+        cwd: str | None = None,
+        controlling_terminal: bool = False,
+        start_new_session: bool = False,
+    ) -> Process:
+        """Run a command in a new PTY.
+
+        Args:
+            command: Command to run (with the shell).
+            env: Environment variables, or `None` to inherit.
+            cwd: Working directory, or `None` for the current directory.
+            controlling_terminal: Make the PTY the controlling terminal of the process
+                (in a new session).
+            start_new_session: Start the process in a new session.
+
+        Raises:
+            Exception: If the process could not be started.
+
+        Returns:
+            The process.
+        """
+        assert self._master is None, "PTY session already started"
+        master, slave = pty.openpty()
+        flags = fcntl.fcntl(master, fcntl.F_GETFL)
+        fcntl.fcntl(master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        # Size the PTY before the process starts, so it doesn't see a resize
+        width, height = self._size
+        resize_pty(master, width, height)
+        self._applied_size = self._size
+
+        def setup_pty() -> None:
+            os.setsid()
+            fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
+
+        try:
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdin=slave,
+                stdout=slave,
+                stderr=slave,
+                env=env,
+                cwd=cwd,
+                preexec_fn=setup_pty if controlling_terminal else None,
+                start_new_session=start_new_session,
+            )
+        except Exception:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+
+        self._master = master
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(self.buffer_size)
+        self._reader = ShellReader(reader, self.buffer_size)
+        self._read_transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader),
+            os.fdopen(master, "rb", 0),
+        )
+        write_transport, _ = await loop.connect_write_pipe(
+            lambda: self._write_protocol,
+            os.fdopen(os.dup(master), "wb", 0),
+        )
+        write_transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+        self._write_transport = write_transport
+        return process
+
+    async def read(self) -> bytes:
+        """Read output from the process.
+
+        Returns:
+            Bytes read, or empty bytes if the process has closed the PTY.
+        """
+        if self._reader is None:
+            return b""
+        return await self._reader.read()
+
+    async def write(self, data: str | bytes) -> int:
+        """Write to the process.
+
+        The data is written in full (buffered if necessary). If the buffer is large,
+        this waits for the process to read some of it.
+
+        Args:
+            data: Data to write (strings are encoded as utf-8).
+
+        Returns:
+            The number of bytes written.
+        """
+        transport = self._write_transport
+        if transport is None or transport.is_closing():
+            return 0
+        data_bytes = data.encode("utf-8", "ignore") if isinstance(data, str) else data
+        # A program started by this write should see the most recent size
+        self._apply_resize()
+        transport.write(data_bytes)
+        await self._write_protocol.resumed.wait()
+        return len(data_bytes)
+
+    def resize(self, width: int, height: int) -> None:
+        """Resize the PTY.
+
+        Resizes are coalesced, so that only the most recent size is applied, once per
+        iteration of the event loop.
+
+        Args:
+            width: Width in columns.
+            height: Height in rows.
+        """
+        self._size = (max(width, 1), max(height, 1))
+        if self._master is not None and self._resize_handle is None:
+            self._resize_handle = asyncio.get_running_loop().call_soon(
+                self._apply_resize
+            )
+
+    def _apply_resize(self) -> None:
+        """Apply a pending resize."""
+        if self._resize_handle is not None:
+            self._resize_handle.cancel()
+            self._resize_handle = None
+        if self._master is not None and self._size != self._applied_size:
+            self._applied_size = self._size
+            resize_pty(self._master, *self._size)
+
+    def close(self) -> None:
+        """Close the PTY."""
+        if self._resize_handle is not None:
+            self._resize_handle.cancel()
+            self._resize_handle = None
+        if self._write_transport is not None:
+            self._write_transport.close()
+        if self._read_transport is not None:
+            self._read_transport.close()
+        self._master = None
@@ -201,6 +201,14 @@ SCHEMA: list[SchemaDict] = [
                 "help": "Show agent's 'thoughts' in the conversation?",
                 "type": "boolean",
             },
+            {
+                "key": "update_rate",
+                "title": "Update rate",
+                "help": "Maximum number of times per second to update a streaming response.",
+                "type": "number",
+                "default": 60.0,
+                "validate": [{"type": "minimum", "value": 1}],
+            },
             # {
             #     "key": "warn",
             #     "title": "Warning against dangerous commands?",
@@ -282,6 +290,22 @@ SCHEMA: list[SchemaDict] = [
             },
         ],
     },
+    {
+        "key": "terminal",
+        "title": "Terminal settings",
+        "help": "Customize terminals (shell commands and agent terminals).",
+        "type": "object",
+        "fields": [
+            {
+                "key": "scrollback_lines",
+                "title": "Scrollback lines",
+                "help": "Maximum number of lines of terminal output to keep in memory (minimum 100). Older lines are moved to a temporary file.",
+                "type": "integer",
+                "default": 10000,
+                "validate": [{"type": "minimum", "value": 100}],
+            }
+        ],
+    },
     {
         "key": "diff",
         "title": "Diff view settings",
@@ -1,22 +1,18 @@
 from __future__ import annotations
 
 
-from contextlib import suppress
 import os
 import asyncio
 import codecs
-import fcntl
 import platform
-import pty
-import struct
-import termios
 from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
+import re2 as re
 from textual import log
 from textual.message import Message
 
-from toad.shell_read import shell_read
+from toad.pty_session import PTYSession
 
 from toad.widgets.terminal import Terminal
 
@@ -26,15 +22,85 @@ if TYPE_CHECKING:
 IS_MACOS = platform.system() == "Darwin"
 
 
-def resize_pty(fd, cols, rows):
-    """Resize the pseudo-terminal"""
-    # Pack the dimensions into the format expected by TIOCSWINSZ
-    try:
-        size = struct.pack("HHHH", rows, cols, 0, 0)
-        fcntl.ioctl(fd, termios.TIOCSWINSZ, size)
-    except OSError:
-        # Possibly file descriptor closed
-        pass
+class HiddenEcho:
+    """Removes the echo of commands from shell output.
+
+    Pending lines are combined in to a single pattern, which re2 matches in one pass
+    over the output (regardless of the number of lines), rather than searching the
+    output for each line in turn.
+
+    """
+
+    CLEAR_LINE = b"\x1b[2K"
+
+    def __init__(self) -> None:
+        self._lines: set[bytes] = set()
+        """Lines yet to be removed."""
+        self._pattern: re.Pattern | None = None
+
+    def __bool__(self) -> bool:
+        return bool(self._lines)
+
+    def add(self, line: bytes) -> None:
+        """Add a line to be removed from output.
+
+        Args:
+            line: Line (without a newline).
+        """
+        if line not in self._lines:
+            self._lines.add(line)
+            self._pattern = None
+
+    def remove(self, data: bytes) -> bytes:
+        """Remove the first occurrence of pending lines from output.
+
+        If a line is followed by a newline, the line and everything up to the newline
+        is removed. Otherwise every occurrence of the line is removed (the rest of the
+        line may not have been read yet).
+
+        Args:
+            data: Output from the shell.
+
+        Returns:
+            Output with echoed lines removed.
+        """
+        lines = self._lines
+        if not lines:
+            return data
+        if (pattern := self._pattern) is None:
+            # Longest first, so a line isn't matched by a line which is its prefix
+            pattern = self._pattern = re.compile(
+                b"|".join(
+                    re.escape(line) for line in sorted(lines, key=len, reverse=True)
+                )
+            )
+        search = pattern.search
+        clear_line = self.CLEAR_LINE
+        output: list[bytes] = []
+        replace_all: set[bytes] = set()
+        position = search_position = 0
+        while (match := search(data, search_position)) is not None:
+            start, end = match.span()
+            line = match.group()
+            if line in replace_all:
+                output.extend((data[position:start], clear_line))
+                position = search_position = end
+            elif line in lines:
+                lines.discard(line)
+                self._pattern = None
+                output.extend((data[position:start], clear_line))
+                if (next_line := data.find(b"\n", end)) == -1:
+                    replace_all.add(line)
+                    position = search_position = end
+                else:
+                    position = search_position = next_line + 1
+            else:
+                # Already removed, but may overlap another line
+                search_position = start + 1
+        if not output:
+            return data
+        output.append(data[position:])
+        return b"".join(output)
 
 
 @dataclass
@@ -68,15 +134,15 @@ class Shell:
         self.shell = shell or os.environ.get("SHELL", "sh")
         self.shell_start = start
         self.hide_start = hide_start
-        self.master: int | None = None
+        self.pty_session = PTYSession()
         self._task: asyncio.Task | None = None
         self._process: asyncio.subprocess.Process | None = None
 
         self._finished: bool = False
         self._ready_event: asyncio.Event = asyncio.Event()
 
-        self._hide_echo: set[bytes] = set()
-        """A set of byte strings to remove from output."""
+        self._hide_echo = HiddenEcho()
+        """Byte strings to remove from output."""
 
         self._hide_output = hide_start
         """Hide all output."""
@@ -88,6 +154,11 @@ class Shell:
     async def wait_for_ready(self) -> None:
         await self._ready_event.wait()
 
+    @property
+    def master(self) -> int | None:
+        """File descriptor of the shell PTY, or `None` if not running."""
+        return self.pty_session.fd
+
     async def send(self, command: str, width: int, height: int) -> None:
         await self._ready_event.wait()
         if self.master is None:
@@ -98,10 +169,7 @@ class Shell:
             self.terminal.finalize()
             self.terminal = None
 
-        try:
-            await asyncio.to_thread(resize_pty, self.master, width, max(height, 1))
-        except OSError:
-            pass
+        self.pty_session.resize(width, height)
 
         get_pwd_command = f"{command};" + r'printf "\e]2025;$(pwd);\e\\"' + "\n"
         await self.write(get_pwd_command, hide_echo=True)
@@ -122,10 +190,7 @@ class Shell:
             width: Desired width.
             height: Desired height.
         """
-        if self.master is None:
-            return
-        with suppress(OSError):
-            resize_pty(self.master, width, max(height, 1))
+        self.pty_session.resize(width, height)
 
     async def write(
         self, text: str | bytes, hide_echo: bool = False, hide_output: bool = False
@@ -138,22 +203,12 @@ class Shell:
             for line in text_bytes.split(b"\n"):
                 if line:
                     self._hide_echo.add(line)
-        try:
-            result = await asyncio.to_thread(os.write, self.master, text_bytes)
-        except OSError:
-            return 0
         self._hide_output = hide_output
-        return result
+        return await self.pty_session.write(text_bytes)
 
     async def run(self) -> None:
         current_directory = self.working_directory
 
-        master, slave = pty.openpty()
-        self.master = master
-
-        flags = fcntl.fcntl(master, fcntl.F_GETFL)
-        fcntl.fcntl(master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-
         env = os.environ.copy()
         env["FORCE_COLOR"] = "1"
         env["TTY_COMPATIBLE"] = "1"
@@ -163,20 +218,11 @@ class Shell:
         env["CLICOLOR"] = "1"
 
         shell = self.shell
-
-        def setup_pty():
-            os.setsid()
-            fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
+        pty_session = self.pty_session
 
         try:
-            _process = await asyncio.create_subprocess_shell(
-                shell,
-                stdin=slave,
-                stdout=slave,
-                stderr=slave,
-                env=env,
-                cwd=current_directory,
-                preexec_fn=setup_pty,
+            self._process = await pty_session.spawn(
+                shell, env=env, cwd=current_directory, controlling_terminal=True
             )
         except Exception as error:
             self.conversation.notify(
@@ -186,16 +232,6 @@ class Shell:
             )
             return
 
-        os.close(slave)
-        BUFFER_SIZE = 64 * 1024
-        reader = asyncio.StreamReader(BUFFER_SIZE)
-        protocol = asyncio.StreamReaderProtocol(reader)
-
-        loop = asyncio.get_event_loop()
-        transport, _ = await loop.connect_read_pipe(
-            lambda: protocol, os.fdopen(master, "rb", 0)
-        )
-
         self._ready_event.set()
 
         if shell_start := self.shell_start.strip():
@@ -207,20 +243,8 @@ class Shell:
         unicode_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
 
         while True:
-            data = await shell_read(reader, BUFFER_SIZE)
-
-            for string_bytes in list(self._hide_echo):
-                remove_bytes = string_bytes
-                if remove_bytes in data:
-                    remove_start = data.index(remove_bytes)
-                    try:
-                        next_line = data.index(b"\n", remove_start + len(remove_bytes))
-                    except ValueError:
-                        data = data.replace(remove_bytes, b"\x1b[2K")
-                    else:
-                        data = data[:remove_start] + b"\x1b[2K" + data[next_line + 1 :]
-
-                    self._hide_echo.discard(string_bytes)
+            data = await pty_session.read()
+            data = self._hide_echo.remove(data)
 
             if line := unicode_decoder.decode(data, final=not data):
                 if self.terminal is None or self.terminal.is_finalized:
@@ -258,6 +282,6 @@ class Shell:
             if not data:
                 break
 
-        self.master = None
+        pty_session.close()
         self._finished = True
         self.conversation.post_message(ShellFinished())
@@ -1,42 +1,145 @@
 import asyncio
-from contextlib import suppress
+from dataclasses import dataclass, field
 from time import monotonic
 
 
-async def shell_read(
-    reader: asyncio.StreamReader,
-    buffer_size: int,
-    *,
-    buffer_period: float | None = 1 / 100,
-    max_buffer_duration: float = 1 / 60,
-) -> bytes:
-    """Read data from a stream reader, with buffer logic to reduce the number of chunks.
+@dataclass
+class ReadStatistics:
+    """Counters for a `ShellReader`, to help tune batching."""
 
-    Args:
-        reader: A reader instance.
-        buffer_size: Maximum buffer size.
-        buffer_period: Time in seconds where reads are batched, or `None` for no batching.
-        max_buffer_duration: Maximum time in seconds to buffer.
+    bytes: int = 0
+    """Total bytes read."""
+    chunks: int = 0
+    """Number of chunks returned (each is one or more reads)."""
+    reads: int = 0
+    """Number of reads from the stream."""
+    start_time: float = field(default_factory=monotonic)
+    """Time the counters were started (or reset)."""
+
+    @property
+    def elapsed(self) -> float:
+        """Time since the counters were started."""
+        return max(monotonic() - self.start_time, 1e-9)
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Mean bytes read per second."""
+        return self.bytes / self.elapsed
+
+    @property
+    def chunks_per_second(self) -> float:
+        """Mean chunks returned per second."""
+        return self.chunks / self.elapsed
+
+    @property
+    def mean_batch_size(self) -> float:
+        """Mean size of a chunk, in bytes."""
+        return self.bytes / self.chunks if self.chunks else 0.0
+
+    def reset(self) -> None:
+        """Reset the counters."""
+        self.bytes = self.chunks = self.reads = 0
+        self.start_time = monotonic()
+
+
+class ShellReader:
+    """Reads from a stream, adapting how long reads are batched to the output.
+
+    Small reads (such as the echo of a keystroke) are returned immediately. If a read
+    is large, subsequent reads are batched for a short period, which doubles while
+    output continues, up to a frame budget. The period is reset when output pauses.
 
-    Returns:
-        Bytes read. May be empty on the last read.
     """
-    try:
-        data = await reader.read(buffer_size)
-    except OSError:
-        data = b""
-    if data and buffer_period is not None:
-        buffer_time = monotonic() + max_buffer_duration
-        with suppress(asyncio.TimeoutError):
-            while len(data) < buffer_size and (time := monotonic()) < buffer_time:
-                async with asyncio.timeout(min(buffer_time - time, buffer_period)):
-                    try:
-                        if chunk := await reader.read(buffer_size - len(data)):
-                            data += chunk
-                        else:
-                            break
-                    except OSError as error:
-                        print(repr(error))
-
-                        break
-    return data
+
+    INTERACTIVE_SIZE = 256
+    """Reads smaller than this are returned immediately, if output isn't sustained."""
+    MIN_BATCH_DURATION = 1 / 1000
+    """Initial batching period, when output is large."""
+    PAUSE_DURATION = 1 / 100
+    """Time with no output which is considered a pause."""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        buffer_size: int,
+        *,
+        frame_budget: float = 1 / 60,
+    ) -> None:
+        """
+
+        Args:
+            reader: A reader instance.
+            buffer_size: Maximum buffer size.
+            frame_budget: Maximum time in seconds to batch reads.
+        """
+        self.reader = reader
+        self.buffer_size = buffer_size
+        self.frame_budget = frame_budget
+        self.statistics = ReadStatistics()
+        self._batch_duration = 0.0
+        """Current batching period, or 0 to return small reads immediately."""
+
+    @property
+    def batch_duration(self) -> float:
+        """The current batching period."""
+        return self._batch_duration
+
+    async def read(self) -> bytes:
+        """Read data.
+
+        Returns:
+            Bytes read. May be empty on the last read.
+        """
+        reader = self.reader
+        buffer_size = self.buffer_size
+        statistics = self.statistics
+        try:
+            data = await reader.read(buffer_size)
+        except OSError:
+            data = b""
+        statistics.reads += 1
+        if not data:
+            return data
+        if self._batch_duration or len(data) >= self.INTERACTIVE_SIZE:
+            data = await self._batch(data)
+        statistics.bytes += len(data)
+        statistics.chunks += 1
+        return data
+
+    async def _batch(self, data: bytes) -> bytes:
+        """Batch reads following an initial read, and adapt the batching period.
+
+        Args:
+            data: Data from the initial read.
+
+        Returns:
+            Batched data.
+        """
+        reader = self.reader
+        buffer_size = self.buffer_size
+        statistics = self.statistics
+        batch_duration = max(self._batch_duration, self.MIN_BATCH_DURATION)
+        deadline = monotonic() + batch_duration
+        initial_size = len(data)
+        paused = False
+        while len(data) < buffer_size and (time := monotonic()) < deadline:
+            wait = min(deadline - time, self.PAUSE_DURATION)
+            try:
+                async with asyncio.timeout(wait):
+                    chunk = await reader.read(buffer_size - len(data))
+            except TimeoutError:
+                paused = wait == self.PAUSE_DURATION
+                break
+            except OSError:
+                break
+            statistics.reads += 1
+            if not chunk:
+                break
+            data += chunk
+        if paused or len(data) == initial_size:
+            # Output has paused, so return the next small read immediately
+            self._batch_duration = 0.0
+        else:
+            # Output is sustained, so batch for longer
+            self._batch_duration = min(self.frame_budget, batch_duration * 2)
+        return data
@@ -3,16 +3,12 @@ import codecs
 from dataclasses import dataclass
 
 import os
-import fcntl
-import pty
-import struct
-import termios
 
 
 from textual import events
 from textual.message import Message
 
-from toad.shell_read import shell_read
+from toad.pty_session import PTYSession
 
 from toad.widgets.terminal import Terminal
 
@@ -38,7 +34,7 @@ class CommandPane(Terminal):
     ):
         self._execute_task: asyncio.Task | None = None
         self._return_code: int | None = None
-        self._master: int | None = None
+        self._pty_session = PTYSession()
         super().__init__(name=name, id=id, classes=classes)
 
     @property
@@ -56,56 +52,28 @@ class CommandPane(Terminal):
 
     def on_resize(self, event: events.Resize):
         event.prevent_default()
-        if self._master is None:
+        if self._pty_session.fd is None:
             return
         self._size_changed()
 
     def _size_changed(self):
-        if self._master is None:
-            return
         width, height = self.scrollable_content_region.size
-        try:
-            size = struct.pack("HHHH", height, width, 0, 0)
-            fcntl.ioctl(self._master, termios.TIOCSWINSZ, size)
-        except OSError:
-            pass
+        self._pty_session.resize(width, height)
         self.update_size(width, height)
 
     @property
     def is_cooked(self) -> bool:
         """Is the terminal in 'cooked' mode?"""
-        if self._master is None:
-            return True
-        attrs = termios.tcgetattr(self._master)
-        lflag = attrs[3]
-        return bool(lflag & termios.ICANON)
+        return self._pty_session.is_cooked
 
     async def write_stdin(self, text: str | bytes, hide_echo: bool = False) -> int:
-        if self._master is None:
-            return 0
-        text_bytes = text.encode("utf-8", "ignore") if isinstance(text, str) else text
-        try:
-            return await asyncio.to_thread(os.write, self._master, text_bytes)
-        except OSError:
-            return 0
+        return await self._pty_session.write(text)
 
     async def _execute(self, command: str, *, final: bool = True) -> None:
         # width, height = self.scrollable_content_region.size
 
         await self.wait_for_refresh()
 
-        master, slave = pty.openpty()
-        self._master = master
-
-        flags = fcntl.fcntl(master, fcntl.F_GETFL)
-        fcntl.fcntl(master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-
-        # # Get terminal attributes
-        # attrs = termios.tcgetattr(slave)
-
-        # # Apply the changes
-        # termios.tcsetattr(slave, termios.TCSANOW, attrs)
-
         env = os.environ.copy()
         env["FORCE_COLOR"] = "1"
         env["TTY_COMPATIBLE"] = "1"
@@ -114,43 +82,23 @@ class CommandPane(Terminal):
         env["TOAD"] = "1"
         env["CLICOLOR"] = "1"
 
+        pty_session = self._pty_session
+        self._size_changed()
         try:
-            process = await asyncio.create_subprocess_shell(
+            process = await pty_session.spawn(
                 command,
-                stdin=slave,
-                stdout=slave,
-                stderr=slave,
                 env=env,
                 start_new_session=True,  # Linux / macOS only
             )
         except Exception as error:
             raise CommandError(f"Failed to execute {command!r}; {error}")
 
-        os.close(slave)
-
-        self._size_changed()
-
         self.set_write_to_stdin(self.write_stdin)
 
-        BUFFER_SIZE = 64 * 1024
-        reader = asyncio.StreamReader(BUFFER_SIZE)
-        protocol = asyncio.StreamReaderProtocol(reader)
-
-        loop = asyncio.get_event_loop()
-        transport, _ = await loop.connect_read_pipe(
-            lambda: protocol, os.fdopen(master, "rb", 0)
-        )
-
-        # Create write transport
-        writer_protocol = asyncio.BaseProtocol()
-        self.write_transport, _ = await loop.connect_write_pipe(
-            lambda: writer_protocol,
-            os.fdopen(os.dup(master), "wb", 0),
-        )
         unicode_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
         try:
             while True:
-                data = await shell_read(reader, BUFFER_SIZE)
+                data = await pty_session.read()
                 if line := unicode_decoder.decode(data, final=not data):
                     try:
                         await self.write(line)
@@ -164,7 +112,7 @@ class CommandPane(Terminal):
                 if not data:
                     break
         finally:
-            transport.close()
+            pty_session.close()
 
         await process.wait()
         return_code = self._return_code = process.returncode
@@ -43,6 +43,7 @@ from toad.acp.agent import Mode
 from toad.answer import Answer
 from toad.agent import AgentBase, AgentReady, AgentFail
 from toad.directory_watcher import DirectoryWatcher, DirectoryChanged
+from toad.file_index import get_file_index
 from toad.history import History
 from toad.widgets.flash import Flash
 from toad.widgets.menu import Menu
@@ -669,6 +670,7 @@ class Conversation(containers.Vertical):
     async def on_unmount(self) -> None:
         if self._directory_watcher is not None:
             self._directory_watcher.stop()
+            await asyncio.to_thread(get_file_index(self.project_path).save)
         if self.agent is not None:
             await self.agent.stop()
 
@@ -947,25 +949,6 @@ class Conversation(containers.Vertical):
         self.agent_slash_commands = slash_commands
         self.update_slash_commands()
 
-    def get_terminal(self, terminal_id: str) -> TerminalTool | None:
-        """Get a terminal from its id.
-
-        Args:
-            terminal_id: ID of the terminal.
-
-        Returns:
-            Terminal instance, or `None` if no terminal was found.
-        """
-        from toad.widgets.terminal_tool import TerminalTool
-
-        try:
-            terminal = self.contents.query_one(f"#{terminal_id}", TerminalTool)
-        except NoMatches:
-            return None
-        if terminal.released:
-            return None
-        return terminal
-
     async def action_interrupt(self) -> None:
         terminal = self._terminal
         if terminal is not None and not terminal.is_finalized:
@@ -991,7 +974,7 @@ class Conversation(containers.Vertical):
 
         terminal = TerminalTool(
             command,
-            output_byte_limit=message.output_byte_limit,
+            session=message.session,
             id=message.terminal_id,
             minimum_terminal_width=width,
         )
@@ -1012,39 +995,6 @@ class Conversation(containers.Vertical):
         else:
             message.result_future.set_result(True)
 
-    @on(acp_messages.KillTerminal)
-    async def on_acp_kill_terminal(self, message: acp_messages.KillTerminal):
-        if (terminal := self.get_terminal(message.terminal_id)) is not None:
-            terminal.kill()
-
-    @on(acp_messages.GetTerminalState)
-    def on_acp_get_terminal_state(self, message: acp_messages.GetTerminalState):
-        if (terminal := self.get_terminal(message.terminal_id)) is None:
-            message.result_future.set_exception(
-                KeyError(f"No terminal with id {message.terminal_id!r}")
-            )
-        else:
-            message.result_future.set_result(terminal.tool_state)
-
-    @on(acp_messages.ReleaseTerminal)
-    def on_acp_terminal_release(self, message: acp_messages.ReleaseTerminal):
-        if (terminal := self.get_terminal(message.terminal_id)) is not None:
-            terminal.kill()
-            terminal.release()
-
-    @work
-    @on(acp_messages.WaitForTerminalExit)
-    async def on_acp_wait_for_terminal_exit(
-        self, message: acp_messages.WaitForTerminalExit
-    ):
-        if (terminal := self.get_terminal(message.terminal_id)) is None:
-            message.result_future.set_exception(
-                KeyError(f"No terminal with id {message.terminal_id!r}")
-            )
-        else:
-            return_code, signal = await terminal.wait_for_exit()
-            message.result_future.set_result((return_code or 0, signal))
-
     async def set_mode(self, mode_id: str | None) -> None:
         """Set the mode give its id (if it exists).
 
@@ -1255,7 +1205,11 @@ class Conversation(containers.Vertical):
                 assert self._agent_data is not None
                 from toad.acp.agent import Agent
 
-                self.agent = Agent(self.project_path, self._agent_data)
+                self.agent = Agent(
+                    self.project_path,
+                    self._agent_data,
+                    update_rate=self.app.settings.get("agent.update_rate", float),
+                )
                 self.agent.start(self)
 
             self.call_after_refresh(start_agent)
@@ -1287,7 +1241,9 @@ class Conversation(containers.Vertical):
             async with asyncio.timeout(2.0):
                 await self.shell.wait_for_ready()
         if ready:
-            self._directory_watcher = DirectoryWatcher(self.project_path, self)
+            self._directory_watcher = DirectoryWatcher(
+                self.project_path, self, get_file_index(self.project_path)
+            )
             self._directory_watcher.start()
         if ready and (agent_data := self._agent_data) is not None:
             welcome = agent_data.get("welcome", None)
@@ -2,10 +2,14 @@ from __future__ import annotations
 
 
 import asyncio
-import difflib
+from bisect import bisect_right
+from collections import defaultdict
+from functools import partial
 from itertools import starmap
-from typing import Iterable, Literal
+from typing import Callable, ClassVar, Iterable, Literal
+from weakref import WeakKeyDictionary
 
+from rich.cells import cell_len
 from rich.segment import Segment
 from rich.style import Style as RichStyle
 
@@ -16,14 +20,19 @@ from textual import highlight
 from textual import events
 
 from textual.css.styles import RulesMap
+from textual.errors import NoWidget
+from textual.screen import Screen
 from textual.selection import Selection
 from textual.strip import Strip
 from textual.style import Style
 from textual.reactive import reactive, var
 from textual.visual import Visual, RenderOptions
-from textual.widget import Widget
-from textual.widgets import Static
-from textual import containers
+from textual.widget import NoScreen, Widget
+from textual.widgets import LoadingIndicator, Static
+from textual import containers, work
+
+from toad import compute, diff
+from toad.highlight_cache import highlight_cache
 
 type Annotation = Literal["+", "-", "/", " "]
 
@@ -198,8 +207,155 @@ def fill_lists[T](list_a: list[T], list_b: list[T], fill_value: T) -> None:
             list_a.extend([fill_value] * (b_length - a_length))
 
 
+def add_line_spans(
+    lines: list[Content],
+    text_lines: list[str],
+    ranges: list[tuple[int, int]],
+    style: str,
+) -> None:
+    """Style ranges within lines.
+
+    Args:
+        lines: Lines of content, which will be updated.
+        text_lines: Lines of text.
+        ranges: Ranges to style, as offsets in to the text lines joined with newlines.
+            A range should not span lines.
+        style: Style to apply.
+    """
+    if not ranges:
+        return
+    offsets = diff.get_line_offsets(text_lines)
+    line_spans: defaultdict[int, list[Span]] = defaultdict(list)
+    for start, end in ranges:
+        line_number = bisect_right(offsets, start) - 1
+        line_offset = offsets[line_number]
+        line_spans[line_number].append(
+            Span(start - line_offset, end - line_offset, style)
+        )
+    for line_number, spans in line_spans.items():
+        lines[line_number] = lines[line_number].add_spans(spans)
+
+
+_rendered_hunks: WeakKeyDictionary[Screen, WeakKeyDictionary[DiffHunk, None]] = (
+    WeakKeyDictionary()
+)
+"""Rendered hunks per screen, from least to most recently used."""
+
+
+class DiffHunk(containers.HorizontalGroup):
+    """A range of rows in a diff, which is rendered only when it scrolls in to view.
+
+    Until then, the hunk is a placeholder with the height of its rows. Rendered hunks
+    are kept in a LRU (shared by all diff views in a screen), and hunks which are
+    evicted while out of view revert to placeholders.
+
+    """
+
+    MAX_RENDERED_HUNKS: ClassVar[int] = 32
+
+    def __init__(
+        self,
+        diff_view: DiffView,
+        row_count: int,
+        compose_rows: Callable[[], ComposeResult],
+        *,
+        classes: str | None = None,
+    ) -> None:
+        """
+
+        Args:
+            diff_view: The diff view which contains the hunk.
+            row_count: Number of rows in the hunk.
+            compose_rows: Callable which composes the rows.
+            classes: Space separated list of class names.
+        """
+        super().__init__(classes=classes)
+        self.diff_view = diff_view
+        self.row_count = row_count
+        self._compose_rows = compose_rows
+        self.rendered = False
+        self._render_pending = False
+        self._rendered_hunks: WeakKeyDictionary[DiffHunk, None] | None = None
+        self.styles.height = row_count
+
+    @property
+    def in_view(self) -> bool:
+        """Is any part of the hunk visible on the screen?"""
+        try:
+            return self.screen.find_widget(self).visible_region.area > 0
+        except (NoScreen, NoWidget):
+            return False
+
+    def compose(self) -> ComposeResult:
+        if self.rendered:
+            yield from self._compose_rows()
+
+    def on_unmount(self) -> None:
+        if self._rendered_hunks is not None:
+            self._rendered_hunks.pop(self, None)
+
+    def render_line(self, y: int) -> Strip:
+        # Lines are only rendered when visible, so this is our cue to render the rows
+        if not self.rendered and not self._render_pending:
+            self._render_pending = True
+            self.call_later(self.render_rows)
+        return super().render_line(y)
+
+    async def render_rows(self) -> None:
+        """Replace the placeholder with the rendered rows."""
+        await self.diff_view.prepare_highlighting()
+        if self.rendered or not self.is_attached:
+            return
+        self.rendered = True
+        self._render_pending = False
+        screen = self.screen
+        if (rendered_hunks := _rendered_hunks.get(screen)) is None:
+            rendered_hunks = _rendered_hunks[screen] = WeakKeyDictionary()
+        self._rendered_hunks = rendered_hunks
+        rendered_hunks[self] = None
+        await self.recompose()
+        self.evict_hunks(rendered_hunks)
+
+    def evict_hunks(self, rendered_hunks: WeakKeyDictionary[DiffHunk, None]) -> None:
+        """Release the least recently used hunks which are out of view, while there
+        are more than `MAX_RENDERED_HUNKS`.
+
+        Args:
+            rendered_hunks: Rendered hunks, from least to most recently used.
+        """
+        excess_count = len(rendered_hunks) - self.MAX_RENDERED_HUNKS
+        if excess_count <= 0:
+            return
+        hunks_in_view: list[DiffHunk] = []
+        for hunk in list(rendered_hunks):
+            if not excess_count:
+                break
+            if hunk is self or hunk.in_view:
+                hunks_in_view.append(hunk)
+            else:
+                del rendered_hunks[hunk]
+                hunk.call_later(hunk.release_rows)
+                excess_count -= 1
+        # Hunks in view are in use, so become the most recently used
+        for hunk in hunks_in_view:
+            del rendered_hunks[hunk]
+            rendered_hunks[hunk] = None
+
+    async def release_rows(self) -> None:
+        """Remove the rendered rows, and revert to a placeholder."""
+        if self.rendered:
+            self.rendered = False
+            self._render_pending = False
+            if self._rendered_hunks is not None:
+                self._rendered_hunks.pop(self, None)
+            await self.recompose()
+
+
 class DiffView(containers.VerticalGroup):
-    """A formatted diff in unified or split format."""
+    """A formatted diff in unified or split format.
+
+    Hunks are rendered lazily, as they scroll in to view (see `DiffHunk`).
+    """
 
     code_before: reactive[str] = reactive("")
     code_after: reactive[str] = reactive("")
@@ -218,6 +374,7 @@ class DiffView(containers.VerticalGroup):
             height: auto;
             background: $foreground 4%;
             margin-bottom: 1;
+            &.-continued { margin-bottom: 0; }
         }                
 
         .annotations { width: 1; }
@@ -227,6 +384,7 @@ class DiffView(containers.VerticalGroup):
         .title {            
             border-bottom: dashed $foreground 20%;
         }
+        LoadingIndicator { height: 3; }
         
     }
     """
@@ -242,6 +400,8 @@ class DiffView(containers.VerticalGroup):
         " ": "",
         "/": "",
     }
+    HUNK_ROWS: ClassVar[int] = 100
+    """Maximum rows in a hunk; larger groups are split in to several hunks."""
 
     def __init__(
         self,
@@ -260,38 +420,84 @@ class DiffView(containers.VerticalGroup):
         self.set_reactive(DiffView.path2, path2)
         self.set_reactive(DiffView.code_before, code_before.expandtabs())
         self.set_reactive(DiffView.code_after, code_after.expandtabs())
-        self._grouped_opcodes: list[list[tuple[str, int, int, int, int]]] | None = None
+        self._text_lines: tuple[list[str], list[str]] | None = None
+        self._line_width: int | None = None
+        self._opcodes: list[diff.Opcode] | None = None
+        self._grouped_opcodes: list[list[diff.Opcode]] | None = None
         self._highlighted_code_lines: tuple[list[Content], list[Content]] | None = None
+        self._highlight_lock = asyncio.Lock()
+
+    @property
+    def is_prepared(self) -> bool:
+        """Has the code been diffed?"""
+        return self._grouped_opcodes is not None
 
     async def prepare(self) -> None:
-        """Do CPU work in a thread.
+        """Diff the code in the CPU pool (see `toad.compute`).
 
-        Call this method prior to composing or mounting to ensure lazy calculated
-        data structures run in a thread. Otherwise the work will be done in the async
-        loop, potentially causing a brief freeze.
+        Call this method prior to mounting to skip the loading placeholder. Otherwise
+        the diff view will prepare itself when mounted. Highlighting is done later, as
+        hunks scroll in to view.
 
         """
+        if self._opcodes is None:
+            text_lines_a, text_lines_b = await compute.run(lambda: self.text_lines)
+            self._opcodes = await compute.run_sized(
+                len(self.code_before) + len(self.code_after),
+                diff.diff_lines,
+                text_lines_a,
+                text_lines_b,
+            )
+        if self._grouped_opcodes is None:
+            self._grouped_opcodes = await compute.run(diff.group_opcodes, self._opcodes)
+        if self._line_width is None:
+            await compute.run(lambda: self.line_width)
+
+    @work(exclusive=True, group="prepare")
+    async def prepare_and_compose(self) -> None:
+        """Prepare the diff, then replace the loading placeholder."""
+        await self.prepare()
+        split = self.split
+        self._check_auto_split(self.size.width)
+        if self.split == split:
+            # Otherwise changing split will recompose
+            await self.recompose()
 
-        def prepare() -> None:
-            """Call properties which will lazily update data structures."""
-            self.grouped_opcodes
-            self.highlighted_code_lines
-
-        await asyncio.to_thread(prepare)
+    async def prepare_highlighting(self) -> None:
+        """Highlight the code in the CPU pool, if it hasn't been highlighted already."""
+        async with self._highlight_lock:
+            if self._highlighted_code_lines is None:
+                await compute.run(lambda: self.highlighted_code_lines)
 
     @property
-    def grouped_opcodes(self) -> list[list[tuple[str, int, int, int, int]]]:
-        if self._grouped_opcodes is None:
-            text_lines_a = self.code_before.splitlines()
-            text_lines_b = self.code_after.splitlines()
-            sequence_matcher = difflib.SequenceMatcher(
-                lambda character: character in " \t",
-                text_lines_a,
-                text_lines_b,
-                autojunk=True,
+    def text_lines(self) -> tuple[list[str], list[str]]:
+        """The lines of `code_before` and `code_after`."""
+        if self._text_lines is None:
+            self._text_lines = (
+                self.code_before.splitlines(),
+                self.code_after.splitlines(),
             )
-            self._grouped_opcodes = list(sequence_matcher.get_grouped_opcodes())
+        return self._text_lines
 
+    @property
+    def line_width(self) -> int:
+        """Width (in cells) of the longest line."""
+        if self._line_width is None:
+            lines_a, lines_b = self.text_lines
+            self._line_width = max(map(cell_len, lines_a + lines_b), default=0)
+        return self._line_width
+
+    @property
+    def opcodes(self) -> list[diff.Opcode]:
+        """Opcodes which transform the lines before to the lines after."""
+        if self._opcodes is None:
+            self._opcodes = diff.diff_lines(*self.text_lines)
+        return self._opcodes
+
+    @property
+    def grouped_opcodes(self) -> list[list[diff.Opcode]]:
+        if self._grouped_opcodes is None:
+            self._grouped_opcodes = diff.group_opcodes(self.opcodes)
         return self._grouped_opcodes
 
     @property
@@ -320,36 +526,18 @@ class DiffView(containers.VerticalGroup):
         if self._highlighted_code_lines is None:
             language1 = highlight.guess_language(self.code_before, self.path1)
             language2 = highlight.guess_language(self.code_after, self.path2)
-            text_lines_a = self.code_before.splitlines()
-            text_lines_b = self.code_after.splitlines()
+            text_lines_a, text_lines_b = self.text_lines
 
-            code_a = highlight.highlight(
-                "\n".join(text_lines_a), language=language1, path=self.path1
-            )
-            code_b = highlight.highlight(
-                "\n".join(text_lines_b), language=language2, path=self.path2
+            lines_a = highlight_cache.highlight(text_lines_a, language1)
+            lines_b = highlight_cache.highlight(
+                text_lines_b, language2, base=text_lines_a
             )
 
-            sequence_matcher = difflib.SequenceMatcher(
-                lambda character: character in " \t",
-                self.code_before,
-                self.code_after,
-                autojunk=True,
+            removed, added = diff.refine_opcodes(
+                text_lines_a, text_lines_b, self.opcodes
             )
-            code_a_spans: list[Span] = []
-            code_b_spans: list[Span] = []
-            for tag, i1, i2, j1, j2 in sequence_matcher.get_opcodes():
-                if tag == "delete" and "\n" not in code_a.plain[i1 : i2 + 1]:
-                    code_a_spans.append(Span(i1, i2, "on $error 40%"))
-
-                if tag == "insert" and "\n" not in code_b.plain[j1 : j2 + 1]:
-                    code_b_spans.append(Span(j1, j2, "on $success 40%"))
-
-            code_a = code_a.add_spans(code_a_spans)
-            code_b = code_b.add_spans(code_b_spans)
-
-            lines_a = code_a.split("\n")
-            lines_b = code_b.split("\n")
+            add_line_spans(lines_a, text_lines_a, removed, "on $error 40%")
+            add_line_spans(lines_b, text_lines_b, added, "on $success 40%")
             self._highlighted_code_lines = (lines_a, lines_b)
         return self._highlighted_code_lines
 
@@ -373,6 +561,9 @@ class DiffView(containers.VerticalGroup):
     def compose(self) -> ComposeResult:
         """Compose either split or unified view."""
 
+        if not self.is_prepared:
+            yield LoadingIndicator()
+            return
         yield Static(self.get_title(), classes="title")
         if self.split:
             yield from self.compose_split()
@@ -380,9 +571,9 @@ class DiffView(containers.VerticalGroup):
             yield from self.compose_unified()
 
     def _check_auto_split(self, width: int):
-        if self.auto_split:
-            lines_a, lines_b = self.highlighted_code_lines
-            split_width = max([line.cell_length for line in (lines_a + lines_b)]) * 2
+        if self.auto_split and self.is_prepared:
+            lines_a, lines_b = self.text_lines
+            split_width = self.line_width * 2
             split_width += 4 + 2 * (
                 max(
                     [
@@ -398,139 +589,158 @@ class DiffView(containers.VerticalGroup):
         self._check_auto_split(event.size.width)
 
     async def on_mount(self) -> None:
-        self._check_auto_split(self.size.width)
+        if self.is_prepared:
+            self._check_auto_split(self.size.width)
+        else:
+            self.prepare_and_compose()
 
-    def compose_unified(self) -> ComposeResult:
-        lines_a, lines_b = self.highlighted_code_lines
+    def compose_hunks(
+        self, row_count: int, compose_rows: Callable[[int, int], ComposeResult]
+    ) -> ComposeResult:
+        """Compose placeholders for the rows in a group.
 
+        Args:
+            row_count: Number of rows in the group.
+            compose_rows: Callable which composes a range of rows (from start to end).
+        """
+        hunk_rows = self.HUNK_ROWS
+        for start in range(0, row_count, hunk_rows):
+            end = min(start + hunk_rows, row_count)
+            yield DiffHunk(
+                self,
+                end - start,
+                partial(compose_rows, start, end),
+                classes="diff-group" if end == row_count else "diff-group -continued",
+            )
+
+    def compose_unified(self) -> ComposeResult:
         for group in self.grouped_opcodes:
             line_numbers_a: list[int | None] = []
             line_numbers_b: list[int | None] = []
-            annotations: list[str] = []
-            code_lines: list[Content | None] = []
+            annotations: list[Annotation] = []
             for tag, i1, i2, j1, j2 in group:
                 if tag == "equal":
-                    for line_offset, line in enumerate(lines_a[i1:i2], 1):
+                    for line_offset in range(1, i2 - i1 + 1):
                         annotations.append(" ")
                         line_numbers_a.append(i1 + line_offset)
                         line_numbers_b.append(j1 + line_offset)
-                        code_lines.append(line)
                     continue
                 if tag in {"replace", "delete"}:
-                    for line_offset, line in enumerate(lines_a[i1:i2], 1):
+                    for line_offset in range(1, i2 - i1 + 1):
                         annotations.append("-")
                         line_numbers_a.append(i1 + line_offset)
                         line_numbers_b.append(None)
-                        code_lines.append(line)
                 if tag in {"replace", "insert"}:
-                    for line_offset, line in enumerate(lines_b[j1:j2], 1):
+                    for line_offset in range(1, j2 - j1 + 1):
                         annotations.append("+")
                         line_numbers_a.append(None)
                         line_numbers_b.append(j1 + line_offset)
-                        code_lines.append(line)
-
-            NUMBER_STYLES = self.NUMBER_STYLES
-            LINE_STYLES = self.LINE_STYLES
 
             line_number_width = max(
                 len("" if line_no is None else str(line_no))
                 for line_no in (line_numbers_a + line_numbers_b)
             )
+            yield from self.compose_hunks(
+                len(annotations),
+                partial(
+                    self.compose_unified_rows,
+                    line_numbers_a,
+                    line_numbers_b,
+                    annotations,
+                    line_number_width,
+                ),
+            )
 
-            with containers.HorizontalGroup(classes="diff-group"):
-                yield LineAnnotations(
-                    [
-                        (
-                            Content(f" {' ' * line_number_width} ")
-                            if line_no is None
-                            else Content(f" {line_no:>{line_number_width}} ")
-                        ).stylize(NUMBER_STYLES[annotation])
-                        for line_no, annotation in zip(line_numbers_a, annotations)
-                    ]
-                )
-
-                yield LineAnnotations(
-                    [
-                        (
-                            Content(f" {' ' * line_number_width} ")
-                            if line_no is None
-                            else Content(f" {line_no:>{line_number_width}} ")
-                        ).stylize(NUMBER_STYLES[annotation])
-                        for line_no, annotation in zip(line_numbers_b, annotations)
-                    ]
-                )
-
-                yield LineAnnotations(
-                    [
-                        (Content(f" {annotation} "))
-                        .stylize(LINE_STYLES[annotation])
-                        .stylize("bold")
-                        for annotation in annotations
-                    ],
-                    classes="annotations",
-                )
-                code_line_styles = [
-                    LINE_STYLES[annotation] for annotation in annotations
-                ]
-                with DiffScrollContainer():
-                    yield DiffCode(LineContent(code_lines, code_line_styles))
-
-    def compose_split(self) -> ComposeResult:
+    def compose_unified_rows(
+        self,
+        line_numbers_a: list[int | None],
+        line_numbers_b: list[int | None],
+        annotations: list[Annotation],
+        line_number_width: int,
+        start: int,
+        end: int,
+    ) -> ComposeResult:
+        """Compose a range of rows in the unified view.
+
+        Args:
+            line_numbers_a: Line numbers before, for the group.
+            line_numbers_b: Line numbers after, for the group.
+            annotations: Annotations for the group.
+            line_number_width: Width of the line numbers.
+            start: First row.
+            end: End of the range of rows.
+        """
         lines_a, lines_b = self.highlighted_code_lines
+        line_numbers_a = line_numbers_a[start:end]
+        line_numbers_b = line_numbers_b[start:end]
+        annotations = annotations[start:end]
+        code_lines: list[Content | None] = [
+            lines_b[line_no_b - 1] if line_no_a is None else lines_a[line_no_a - 1]
+            for line_no_a, line_no_b in zip(line_numbers_a, line_numbers_b)
+        ]
 
-        annotation_hatch = Content.styled("╲" * 3, "$foreground 15%")
-        annotation_blank = Content(" " * 3)
+        NUMBER_STYLES = self.NUMBER_STYLES
+        LINE_STYLES = self.LINE_STYLES
 
-        def make_annotation(
-            annotation: Annotation, highlight_annotation: Literal["+", "-"]
-        ) -> Content:
-            """Format an annotation.
+        yield LineAnnotations(
+            [
+                (
+                    Content(f" {' ' * line_number_width} ")
+                    if line_no is None
+                    else Content(f" {line_no:>{line_number_width}} ")
+                ).stylize(NUMBER_STYLES[annotation])
+                for line_no, annotation in zip(line_numbers_a, annotations)
+            ]
+        )
 
-            Args:
-                annotation: Annotation to format.
-                highlight_annotation: Annotation to highlight ('+' or '-')
+        yield LineAnnotations(
+            [
+                (
+                    Content(f" {' ' * line_number_width} ")
+                    if line_no is None
+                    else Content(f" {line_no:>{line_number_width}} ")
+                ).stylize(NUMBER_STYLES[annotation])
+                for line_no, annotation in zip(line_numbers_b, annotations)
+            ]
+        )
 
-            Returns:
-                Content with annotation.
-            """
-            if annotation == highlight_annotation:
-                return (
-                    Content(f" {annotation} ")
-                    .stylize(self.LINE_STYLES[annotation])
-                    .stylize("bold")
-                )
-            if annotation == "/":
-                return annotation_hatch
-            return annotation_blank
+        yield LineAnnotations(
+            [
+                (Content(f" {annotation} "))
+                .stylize(LINE_STYLES[annotation])
+                .stylize("bold")
+                for annotation in annotations
+            ],
+            classes="annotations",
+        )
+        code_line_styles = [LINE_STYLES[annotation] for annotation in annotations]
+        with DiffScrollContainer():
+            yield DiffCode(LineContent(code_lines, code_line_styles))
+
+    def compose_split(self) -> ComposeResult:
+        text_lines_a, text_lines_b = self.text_lines
 
         for group in self.grouped_opcodes:
             line_numbers_a: list[int | None] = []
             line_numbers_b: list[int | None] = []
             annotations_a: list[Annotation] = []
             annotations_b: list[Annotation] = []
-            code_lines_a: list[Content | None] = []
-            code_lines_b: list[Content | None] = []
             for tag, i1, i2, j1, j2 in group:
                 if tag == "equal":
-                    for line_offset, line in enumerate(lines_a[i1:i2], 1):
+                    for line_offset in range(1, i2 - i1 + 1):
                         annotations_a.append(" ")
                         annotations_b.append(" ")
                         line_numbers_a.append(i1 + line_offset)
                         line_numbers_b.append(j1 + line_offset)
-                        code_lines_a.append(line)
-                        code_lines_b.append(line)
                 else:
                     if tag in {"replace", "delete"}:
-                        for line_number, line in enumerate(lines_a[i1:i2], i1 + 1):
+                        for line_number in range(i1 + 1, i2 + 1):
                             annotations_a.append("-")
                             line_numbers_a.append(line_number)
-                            code_lines_a.append(line)
                     if tag in {"replace", "insert"}:
-                        for line_number, line in enumerate(lines_b[j1:j2], j1 + 1):
+                        for line_number in range(j1 + 1, j2 + 1):
                             annotations_b.append("+")
                             line_numbers_b.append(line_number)
-                            code_lines_b.append(line)
-                    fill_lists(code_lines_a, code_lines_b, None)
                     fill_lists(annotations_a, annotations_b, "/")
                     fill_lists(line_numbers_a, line_numbers_b, None)
 
@@ -542,73 +752,160 @@ class DiffView(containers.VerticalGroup):
             else:
                 line_number_width = 1
 
-            hatch = Content.styled("╲" * (2 + line_number_width), "$foreground 15%")
+            line_width = max(
+                max(
+                    (
+                        cell_len(text_lines_a[line_no - 1])
+                        for line_no in line_numbers_a
+                        if line_no is not None
+                    ),
+                    default=0,
+                ),
+                max(
+                    (
+                        cell_len(text_lines_b[line_no - 1])
+                        for line_no in line_numbers_b
+                        if line_no is not None
+                    ),
+                    default=0,
+                ),
+            )
+            yield from self.compose_hunks(
+                len(line_numbers_a),
+                partial(
+                    self.compose_split_rows,
+                    line_numbers_a,
+                    line_numbers_b,
+                    annotations_a,
+                    annotations_b,
+                    line_number_width,
+                    line_width,
+                ),
+            )
+
+    def compose_split_rows(
+        self,
+        line_numbers_a: list[int | None],
+        line_numbers_b: list[int | None],
+        annotations_a: list[Annotation],
+        annotations_b: list[Annotation],
+        line_number_width: int,
+        line_width: int,
+        start: int,
+        end: int,
+    ) -> ComposeResult:
+        """Compose a range of rows in the split view.
+
+        Args:
+            line_numbers_a: Line numbers before, for the group.
+            line_numbers_b: Line numbers after, for the group.
+            annotations_a: Annotations before, for the group.
+            annotations_b: Annotations after, for the group.
+            line_number_width: Width of the line numbers.
+            line_width: Width of the code.
+            start: First row.
+            end: End of the range of rows.
+        """
+        lines_a, lines_b = self.highlighted_code_lines
+        line_numbers_a = line_numbers_a[start:end]
+        line_numbers_b = line_numbers_b[start:end]
+        annotations_a = annotations_a[start:end]
+        annotations_b = annotations_b[start:end]
+        code_lines_a: list[Content | None] = [
+            None if line_no is None else lines_a[line_no - 1]
+            for line_no in line_numbers_a
+        ]
+        code_lines_b: list[Content | None] = [
+            None if line_no is None else lines_b[line_no - 1]
+            for line_no in line_numbers_b
+        ]
+
+        annotation_hatch = Content.styled("╲" * 3, "$foreground 15%")
+        annotation_blank = Content(" " * 3)
 
-            def format_number(line_no: int | None, annotation: str) -> Content:
-                """Format a line number with an annotation.
+        def make_annotation(
+            annotation: Annotation, highlight_annotation: Literal["+", "-"]
+        ) -> Content:
+            """Format an annotation.
 
-                Args:
-                    line_no: Line number or `None` if there is no line here.
-                    annotation: An annotation string ('+', '-', or ' ')
+            Args:
+                annotation: Annotation to format.
+                highlight_annotation: Annotation to highlight ('+' or '-')
 
-                Returns:
-                    Content for use in the `LineAnnotations` widget.
-                """
+            Returns:
+                Content with annotation.
+            """
+            if annotation == highlight_annotation:
                 return (
-                    hatch
-                    if line_no is None
-                    else Content(f" {line_no:>{line_number_width}} ").stylize(
-                        self.NUMBER_STYLES[annotation]
-                    )
+                    Content(f" {annotation} ")
+                    .stylize(self.LINE_STYLES[annotation])
+                    .stylize("bold")
                 )
+            if annotation == "/":
+                return annotation_hatch
+            return annotation_blank
 
-            with containers.HorizontalGroup(classes="diff-group"):
-                # Before line numbers
-                yield LineAnnotations(
-                    starmap(format_number, zip(line_numbers_a, annotations_a))
-                )
-                # Before annotations
-                yield LineAnnotations(
-                    [make_annotation(annotation, "-") for annotation in annotations_a],
-                    classes="annotations",
-                )
+        hatch = Content.styled("╲" * (2 + line_number_width), "$foreground 15%")
 
-                code_line_styles = [
-                    self.LINE_STYLES[annotation] for annotation in annotations_a
-                ]
-                line_width = max(
-                    line.cell_length
-                    for line in code_lines_a + code_lines_b
-                    if line is not None
-                )
-                # Before code
-                with DiffScrollContainer() as scroll_container_a:
-                    yield DiffCode(
-                        LineContent(code_lines_a, code_line_styles, width=line_width)
-                    )
+        def format_number(line_no: int | None, annotation: str) -> Content:
+            """Format a line number with an annotation.
 
-                # After line numbers
-                yield LineAnnotations(
-                    starmap(format_number, zip(line_numbers_b, annotations_b))
-                )
-                # After annotations
-                yield LineAnnotations(
-                    [make_annotation(annotation, "+") for annotation in annotations_b],
-                    classes="annotations",
+            Args:
+                line_no: Line number or `None` if there is no line here.
+                annotation: An annotation string ('+', '-', or ' ')
+
+            Returns:
+                Content for use in the `LineAnnotations` widget.
+            """
+            return (
+                hatch
+                if line_no is None
+                else Content(f" {line_no:>{line_number_width}} ").stylize(
+                    self.NUMBER_STYLES[annotation]
                 )
+            )
 
-                code_line_styles = [
-                    self.LINE_STYLES[annotation] for annotation in annotations_b
-                ]
-                # After code
-                with DiffScrollContainer() as scroll_container_b:
-                    yield DiffCode(
-                        LineContent(code_lines_b, code_line_styles, width=line_width)
-                    )
+        # Before line numbers
+        yield LineAnnotations(
+            starmap(format_number, zip(line_numbers_a, annotations_a))
+        )
+        # Before annotations
+        yield LineAnnotations(
+            [make_annotation(annotation, "-") for annotation in annotations_a],
+            classes="annotations",
+        )
+
+        code_line_styles = [
+            self.LINE_STYLES[annotation] for annotation in annotations_a
+        ]
+        # Before code
+        with DiffScrollContainer() as scroll_container_a:
+            yield DiffCode(
+                LineContent(code_lines_a, code_line_styles, width=line_width)
+            )
+
+        # After line numbers
+        yield LineAnnotations(
+            starmap(format_number, zip(line_numbers_b, annotations_b))
+        )
+        # After annotations
+        yield LineAnnotations(
+            [make_annotation(annotation, "+") for annotation in annotations_b],
+            classes="annotations",
+        )
+
+        code_line_styles = [
+            self.LINE_STYLES[annotation] for annotation in annotations_b
+        ]
+        # After code
+        with DiffScrollContainer() as scroll_container_b:
+            yield DiffCode(
+                LineContent(code_lines_b, code_line_styles, width=line_width)
+            )
 
-                # Link scroll containers, so they scroll together
-                scroll_container_a.scroll_link = scroll_container_b
-                scroll_container_b.scroll_link = scroll_container_a
+        # Link scroll containers, so they scroll together
+        scroll_container_a.scroll_link = scroll_container_b
+        scroll_container_b.scroll_link = scroll_container_a
 
 
 if __name__ == "__main__":
@@ -2,11 +2,13 @@ from __future__ import annotations
 
 
 import asyncio
+from collections import deque
 from functools import lru_cache
-from operator import itemgetter
+import heapq
 import os
 from pathlib import Path
 import re2 as re
+import threading
 from typing import Sequence
 
 
@@ -28,10 +30,9 @@ from textual.widgets import OptionList, Input, DirectoryTree
 from textual.widgets.option_list import Option
 
 
-from toad import directory
+from toad.file_index import get_file_index
 from toad.fuzzy import FuzzySearch
 from toad.messages import Dismiss, InsertPath, PromptSuggestion
-from toad.path_filter import PathFilter
 from toad.widgets.project_directory_tree import ProjectDirectoryTree
 
 
@@ -46,36 +47,6 @@ class PathFuzzySearch(FuzzySearch):
             }
         )
 
-    def score(self, candidate: str, positions: Sequence[int]) -> float:
-        """Score a search.
-
-        Args:
-            search: Search object.
-
-        Returns:
-            Score.
-        """
-        first_letters = self.get_first_letters(candidate)
-        # This is a heuristic, and can be tweaked for better results
-        # Boost first letter matches
-        offset_count = len(positions)
-        score: float = offset_count + len(first_letters.intersection(positions))
-
-        # if 0 in first_letters:
-        #     score += 1
-
-        groups = 1
-        last_offset, *offsets = positions
-        for offset in offsets:
-            if offset != last_offset + 1:
-                groups += 1
-            last_offset = offset
-
-        # Boost to favor less groups
-        normalized_groups = (offset_count - (groups - 1)) / offset_count
-        score *= 1 + (normalized_groups * normalized_groups)
-        return score
-
 
 class FuzzyInput(Input):
     """Adds a Content placeholder to fuzzy input.
@@ -114,7 +85,6 @@ The search is *fuzzy*, and will match characters that aren't neccesarily next to
 
 
 class PathSearch(containers.VerticalGroup):
-
     BINDING_GROUP_TITLE = "Path search"
 
     CURSOR_BINDING_GROUP = Binding.Group(description="Move selection")
@@ -138,7 +108,8 @@ class PathSearch(containers.VerticalGroup):
         return PathFuzzySearch(case_sensitive=False)
 
     root: var[Path] = var(Path("./"))
-    paths: var[list[Path]] = var(list)
+    paths: var[list[str]] = var(list)
+    """Paths relative to the root, with a trailing slash for directories."""
     highlighted_paths: var[list[Content]] = var(list)
     filtered_path_indices: var[list[int]] = var(list)
     loaded = var(False)
@@ -150,9 +121,20 @@ class PathSearch(containers.VerticalGroup):
     tree_view = getters.query_one(ProjectDirectoryTree)
     input = getters.query_one(Input)
 
+    MAX_RESULTS = 20
+    """Maximum number of search results to show."""
+    SEARCH_BATCH_SIZE = 5000
+    """Number of paths to score before updating the results (or cancelling)."""
+
     def __init__(self, root: Path) -> None:
         super().__init__()
         self.root = root
+        self._search_hits: deque[tuple[str, list[int]]] = deque(maxlen=8)
+        """Recent searches, and the indices of the paths they matched."""
+        self._search_lock = threading.Lock()
+        """Prevents a cancelled search from scoring concurrently with a new one."""
+        self._paths_key: tuple[Path, int] | None = None
+        """The root and file index generation of the current paths."""
 
     def compose(self) -> ComposeResult:
         with widgets.ContentSwitcher(initial="path-search-fuzzy"):
@@ -189,30 +171,72 @@ class PathSearch(containers.VerticalGroup):
     def action_switch_picker(self) -> None:
         self.show_tree_picker = not self.show_tree_picker
 
-    async def search(self, search: str) -> None:
-        if not search:
-            self.option_list.set_options(
-                [
-                    Option(highlighted_path, highlighted_path.plain)
-                    for highlighted_path in self.highlighted_paths[:100]
-                ],
-            )
-            return
+    def _get_search_hits(self, search: str) -> list[int] | None:
+        """Get the hits from a previous search which the given search narrows.
 
-        fuzzy_search = self.fuzzy_search
-        fuzzy_search.cache.grow(len(self.paths))
-        scores: list[tuple[float, Sequence[int], Content]] = [
-            (
-                *fuzzy_search.match(search, highlighted_path.plain),
-                highlighted_path,
-            )
-            for highlighted_path in self.highlighted_paths
-        ]
+        Any path matching a query also matches the query's prefixes, so only the
+        hits of a previous search need to be rescored.
 
-        scores = sorted(
-            [score for score in scores if score[0]], key=itemgetter(0), reverse=True
-        )
-        scores = scores[:20]
+        Args:
+            search: New search.
+
+        Returns:
+            Indices in to `highlighted_paths`, or `None` to score every path.
+        """
+        if not self.fuzzy_search.case_sensitive:
+            search = search.lower()
+        best: tuple[str, list[int]] | None = None
+        for previous_search, hits in self._search_hits:
+            if search.startswith(previous_search) and (
+                best is None or len(previous_search) > len(best[0])
+            ):
+                best = (previous_search, hits)
+        return None if best is None else best[1]
+
+    def _score_paths(
+        self,
+        search: str,
+        highlighted_paths: list[Content],
+        indices: Sequence[int],
+        top: list[tuple[float, int, Sequence[int]]],
+    ) -> list[int]:
+        """Score paths, and update the best results (runs in a thread).
+
+        Args:
+            search: Search query.
+            highlighted_paths: All paths.
+            indices: Indices of paths to score.
+            top: A heap of the best results, as (score, negated index, offsets).
+
+        Returns:
+            Indices of paths which matched.
+        """
+        match = self.fuzzy_search.match
+        hits: list[int] = []
+        with self._search_lock:
+            for index in indices:
+                score, offsets = match(search, highlighted_paths[index].plain)
+                if not score:
+                    continue
+                hits.append(index)
+                result = (score, -index, offsets)
+                if len(top) < self.MAX_RESULTS:
+                    heapq.heappush(top, result)
+                elif result > top[0]:
+                    heapq.heapreplace(top, result)
+        return hits
+
+    def _show_results(
+        self,
+        highlighted_paths: list[Content],
+        top: list[tuple[float, int, Sequence[int]]],
+    ) -> None:
+        """Show the best results in the option list.
+
+        Args:
+            highlighted_paths: All paths.
+            top: A heap of the best results, as (score, negated index, offsets).
+        """
 
         def highlight_offsets(path: Content, offsets: Sequence[int]) -> Content:
             return path.add_spans(
@@ -222,14 +246,62 @@ class PathSearch(containers.VerticalGroup):
         self.option_list.set_options(
             [
                 Option(
-                    highlight_offsets(path, offsets) if index < 20 else path,
-                    id=path.plain,
+                    highlight_offsets(highlighted_paths[-negated_index], offsets),
+                    id=highlighted_paths[-negated_index].plain,
                 )
-                for index, (score, offsets, path) in enumerate(scores)
+                for _score, negated_index, offsets in sorted(top, reverse=True)
             ]
         )
         with self.option_list.prevent(OptionList.OptionHighlighted):
             self.option_list.highlighted = 0
+
+    @work(exclusive=True, group="path-search")
+    async def search(self, search: str) -> None:
+        """Search paths, and stream the best results in to the option list.
+
+        Paths are scored in a thread, a batch at a time. A new search cancels
+        this one, between batches.
+
+        Args:
+            search: Search query.
+        """
+        if not search:
+            self.option_list.set_options(
+                [
+                    Option(highlighted_path, highlighted_path.plain)
+                    for highlighted_path in self.highlighted_paths[:100]
+                ],
+            )
+            return
+
+        highlighted_paths = self.highlighted_paths
+        if (indices := self._get_search_hits(search)) is None:
+            indices = range(len(highlighted_paths))
+            self.fuzzy_search.cache.grow(len(highlighted_paths))
+
+        top: list[tuple[float, int, Sequence[int]]] = []
+        hits: list[int] = []
+        shown: list[tuple[float, int, Sequence[int]]] | None = None
+        batch_size = self.SEARCH_BATCH_SIZE
+        for batch_start in range(0, len(indices), batch_size):
+            hits.extend(
+                await asyncio.to_thread(
+                    self._score_paths,
+                    search,
+                    highlighted_paths,
+                    indices[batch_start : batch_start + batch_size],
+                    top,
+                )
+            )
+            if top != shown:
+                shown = top.copy()
+                self._show_results(highlighted_paths, top)
+        if shown is None:
+            self._show_results(highlighted_paths, top)
+
+        if not self.fuzzy_search.case_sensitive:
+            search = search.lower()
+        self._search_hits.append((search, hits))
         self.post_message(PromptSuggestion(""))
 
     def action_cursor_down(self) -> None:
@@ -293,8 +365,8 @@ class PathSearch(containers.VerticalGroup):
             self.post_message(Dismiss(self))
 
     @on(Input.Changed)
-    async def on_input_changed(self, event: Input.Changed):
-        await self.search(event.value)
+    def on_input_changed(self, event: Input.Changed):
+        self.search(event.value)
 
     @on(OptionList.OptionHighlighted)
     async def on_option_list_changed(self, event: OptionList.OptionHighlighted):
@@ -316,18 +388,6 @@ class PathSearch(containers.VerticalGroup):
                 self.post_message(InsertPath(option.id))
                 self.post_message(Dismiss(self))
 
-    def get_path_filter(self, project_path: Path) -> PathFilter:
-        """Get a PathFilter insance for the give project path.
-
-        Args:
-            project_path: Project path.
-
-        Returns:
-            `PathFilter` object.
-        """
-        path_filter = PathFilter.from_git_root(project_path)
-        return path_filter
-
     def reset(self) -> None:
         """Reset and focus input."""
         self.input.clear()
@@ -335,21 +395,22 @@ class PathSearch(containers.VerticalGroup):
 
     @work(exclusive=True)
     async def refresh_paths(self):
-        self.loading = True
         root = self.root
+        file_index = get_file_index(root)
+        if (root, file_index.generation) == self._paths_key:
+            # Apply any changes without showing the loading indicator
+            await file_index.update()
+            if (root, file_index.generation) == self._paths_key:
+                return
+        self.loading = True
 
         try:
-            path_filter = await asyncio.to_thread(self.get_path_filter, root)
-            self.tree_view.path_filter = path_filter
-            self.tree_view.clear()
+            await file_index.update()
+            self.tree_view.file_index = file_index
             await self.tree_view.reload()
-            paths = await directory.scan(
-                root, path_filter=path_filter, add_directories=True
-            )
-
-            paths = [path.absolute() for path in paths]
+            self._paths_key = (root, file_index.generation)
             self.root = root
-            self.paths = paths
+            self.paths = file_index.get_paths()
         finally:
             self.loading = False
 
@@ -366,20 +427,11 @@ class PathSearch(containers.VerticalGroup):
         content = content.highlight_regex(r"\.[^/]*$", style="italic")
         return content
 
-    def watch_paths(self, paths: list[Path]) -> None:
+    def watch_paths(self, paths: list[str]) -> None:
         self.option_list.highlighted = None
-
-        def path_display(path: Path) -> str:
-            try:
-                is_directory = path.is_dir()
-            except OSError:
-                is_directory = False
-            if is_directory:
-                return str(path.relative_to(self.root)) + "/"
-            else:
-                return str(path.relative_to(self.root))
-
-        display_paths = sorted(map(path_display, paths), key=str.lower)
+        display_paths = sorted(paths, key=str.lower)
+        self.workers.cancel_group(self, "path-search")
+        self._search_hits.clear()
         self.highlighted_paths = [self.highlight_path(path) for path in display_paths]
         self.option_list.set_options(
             [
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 import asyncio
 
@@ -7,10 +7,32 @@ from textual import work
 from textual.binding import Binding
 from textual.widgets import DirectoryTree
 from textual.widgets.directory_tree import DirEntry
+from textual.worker import Worker
 
+from toad.file_index import FileIndex
 from toad.path_filter import PathFilter
 
 
+class IndexedPath(Path):
+    """A path listed from the file index, which knows if it is a directory.
+
+    `DirectoryTree` checks if every entry is a directory (to sort, and to allow
+    expanding), which would otherwise require a stat per entry.
+
+    """
+
+    def __init__(self, *args: str | Path, is_directory: bool = False) -> None:
+        super().__init__(*args)
+        self._is_directory = is_directory
+
+    def with_segments(self, *pathsegments: str | Path) -> Path:
+        # Derived paths may not be directories
+        return Path(*pathsegments)
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        return self._is_directory
+
+
 class ProjectDirectoryTree(DirectoryTree):
     BINDING_GROUP_TITLE = "Tree view"
     HELP = """\
@@ -42,6 +64,8 @@ This shows the files in your project directory.
         disabled: bool = False,
     ) -> None:
         self._path_filter: PathFilter | None = None
+        self.file_index: FileIndex | None = None
+        """Index to list directories from, if it is current."""
         path = Path(path).resolve() if isinstance(path, str) else path.resolve()
         super().__init__(path, name=name, id=id, classes=classes, disabled=disabled)
 
@@ -63,6 +87,21 @@ This shows the files in your project directory.
         path = path.resolve()
         self._path_filter = await asyncio.to_thread(PathFilter.from_git_root, path)
 
+    def _directory_content(self, location: Path, worker: Worker) -> Iterator[Path]:
+        """List a directory from the file index, if possible.
+
+        Note that this overrides a private method of `DirectoryTree`, which has no
+        public hook to list a directory.
+        """
+        if (
+            self.file_index is not None
+            and (listing := self.file_index.list_directory(location)) is not None
+        ):
+            for name, is_directory in listing:
+                yield IndexedPath(location, name, is_directory=is_directory)
+            return
+        yield from super()._directory_content(location, worker)
+
     def filter_paths(self, paths: Iterable[Path]) -> Iterable[Path]:
         """Filter the paths before adding them to the tree.
 
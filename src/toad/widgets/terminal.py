@@ -102,6 +102,7 @@ Tap escape *twice* to exit.
         self._alternate_screen: bool = False
         self._terminal_render_cache: LRUCache[tuple, Strip] = LRUCache(1024)
         self._write_to_stdin: Callable[[str], Awaitable] | None = None
+        self._reflow_scheduled = False
 
     @property
     def is_finalized(self) -> bool:
@@ -215,8 +216,29 @@ Tap escape *twice* to exit.
         self.state.update_size(self._width, height)
         self._terminal_render_cache.clear()
         self.refresh()
+        self._schedule_reflow()
+
+    def _schedule_reflow(self) -> None:
+        """Fold the lines remaining after a resize, one slice at a time."""
+        if self.state.reflow_pending and not self._reflow_scheduled:
+            self._reflow_scheduled = True
+            self.call_later(self._continue_reflow)
+
+    def _continue_reflow(self) -> None:
+        self._reflow_scheduled = False
+        self.state.continue_reflow()
+        # Folds have moved, so cached lines may be stale
+        self._terminal_render_cache.clear()
+        self._update_from_state(None, None)
+        self._schedule_reflow()
 
     def on_mount(self) -> None:
+        from toad.app import ToadApp
+
+        if isinstance(self.app, ToadApp):
+            self.state.scrollback_lines = self.app.settings.get(
+                "terminal.scrollback_lines", int
+            )
         self.anchor()
         if self._get_terminal_dimensions is None:
             width, height = self.scrollable_content_region.size
@@ -336,11 +358,12 @@ Tap escape *twice* to exit.
             return Strip.blank(width, rich_style)
 
         line_record = buffer.lines[line_no]
+        # Not keyed on y, so lines which scroll may be rendered from the cache
         cache_key: tuple | None = (
             self.state.alternate_screen,
-            y,
             line_record.updates,
             updates,
+            line_offset,
         )
 
         # Add in cursor
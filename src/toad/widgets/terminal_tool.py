@@ -3,20 +3,16 @@ from __future__ import annotations
 import asyncio
 from asyncio.subprocess import Process
 import codecs
-import fcntl
 import os
-import pty
 import shlex
-from collections import deque
 from dataclasses import dataclass
-import struct
-import termios
 from typing import Mapping
 
 from textual.content import Content
 from textual.reactive import var
 
-from toad.shell_read import shell_read
+from toad.acp.terminals import TerminalSession
+from toad.pty_session import PTYSession
 from toad.widgets.terminal import Terminal
 
 
@@ -63,6 +59,7 @@ class TerminalTool(Terminal):
         command: Command,
         *,
         output_byte_limit: int | None = None,
+        session: TerminalSession | None = None,
         name: str | None = None,
         id: str | None = None,
         classes: str | None = None,
@@ -77,28 +74,27 @@ class TerminalTool(Terminal):
             minimum_terminal_width=minimum_terminal_width,
         )
         self._command = command
-        self._output_byte_limit = output_byte_limit
+        self.session = (
+            TerminalSession(id or "terminal", output_byte_limit)
+            if session is None
+            else session
+        )
+        """State shared with the agent."""
         self._command_task: asyncio.Task | None = None
-        self._output: deque[bytes] = deque()
 
         self._process: Process | None = None
-        self._bytes_read = 0
-        self._output_bytes_count = 0
-        self._shell_fd: int | None = None
-        self._return_code: int | None = None
-        self._released: bool = False
+        self._pty_session = PTYSession(buffer_size=64 * 1024 * 2)
         self._ready_event = asyncio.Event()
-        self._exit_event = asyncio.Event()
 
     @property
     def return_code(self) -> int | None:
         """The command return code, or `None` if not yet set."""
-        return self._return_code
+        return self.session.return_code
 
     @property
     def released(self) -> bool:
         """Has the terminal been released?"""
-        return self._released
+        return self.session.released
 
     @property
     def tool_state(self) -> ToolState:
@@ -109,26 +105,12 @@ class TerminalTool(Terminal):
             output=output, truncated=truncated, return_code=self.return_code
         )
 
-    @staticmethod
-    def resize_pty(fd: int, columns: int, rows: int) -> None:
-        """Resize the pseudo terminal.
-
-        Args:
-            fd: File descriptor.
-            columns: Columns (width).
-            rows: Rows (height).
-        """
-        # Pack the dimensions into the format expected by TIOCSWINSZ
-        size = struct.pack("HHHH", rows, columns, 0, 0)
-        fcntl.ioctl(fd, termios.TIOCSWINSZ, size)
-
     async def wait_for_exit(self) -> tuple[int | None, str | None]:
         """Wait for the terminal process to exit."""
         if self._process is None or self._command_task is None:
             return None, None
-        # await self._task
-        await self._exit_event.wait()
-        return (self.return_code or 0, None)
+        return_code, signal = await self.session.wait_for_exit()
+        return (return_code or 0, signal)
 
     def kill(self) -> bool:
         """Kill the terminal process.
@@ -137,19 +119,11 @@ class TerminalTool(Terminal):
             Returns `True` if the process was killed, or `False` if there
                 was no running process.
         """
-        if self.return_code is not None:
-            return False
-        if self._process is None:
-            return False
-        try:
-            self._process.kill()
-        except Exception:
-            return False
-        return True
+        return self.session.kill()
 
     def release(self) -> None:
         """Release the terminal (may no longer be used from ACP)."""
-        self._released = True
+        self.session.released = True
 
     def watch__command(self, command: Command) -> None:
         self.border_title = Content(str(command))
@@ -171,18 +145,14 @@ class TerminalTool(Terminal):
 
             print_exc()
         finally:
-            self._exit_event.set()
+            # Also wakes anything waiting, if the process failed to start
+            self.session.set_exit(self.session.return_code)
 
     async def _run(self) -> None:
         self._command_task = asyncio.current_task()
 
         assert self._command is not None
-        master, slave = pty.openpty()
-        self._shell_fd = master
-
-        flags = fcntl.fcntl(master, fcntl.F_GETFL)
-        fcntl.fcntl(master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-
+        pty_session = self._pty_session
         command = self._command
         environment = os.environ | command.env
 
@@ -194,14 +164,10 @@ class TerminalTool(Terminal):
         shell = os.environ.get("SHELL", "sh")
         run_command = shlex.join([shell, "-c", run_command])
 
+        pty_session.resize(self._width or 80, self._height or 24)
         try:
-            process = self._process = await asyncio.create_subprocess_shell(
-                run_command,
-                stdin=slave,
-                stdout=slave,
-                stderr=slave,
-                env=environment,
-                cwd=command.cwd,
+            process = self._process = self.session.process = await pty_session.spawn(
+                run_command, env=environment, cwd=command.cwd
             )
         except Exception as error:
             self._ready_event.set()
@@ -210,44 +176,23 @@ class TerminalTool(Terminal):
 
         self._ready_event.set()
 
-        self.resize_pty(
-            master,
-            self._width or 80,
-            self._height or 24,
-        )
-
-        os.close(slave)
-        BUFFER_SIZE = 64 * 1024 * 2
-        reader = asyncio.StreamReader(BUFFER_SIZE)
-        protocol = asyncio.StreamReaderProtocol(reader)
-
-        loop = asyncio.get_event_loop()
-        transport, _ = await loop.connect_read_pipe(
-            lambda: protocol, os.fdopen(master, "rb", 0)
-        )
-        # Create write transport
-        writer_protocol = asyncio.BaseProtocol()
-        write_transport, _ = await loop.connect_write_pipe(
-            lambda: writer_protocol,
-            os.fdopen(os.dup(master), "wb", 0),
-        )
-        self.writer = write_transport
-
         unicode_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
         try:
             while True:
-                data = await shell_read(reader, BUFFER_SIZE)
-                if process_data := unicode_decoder.decode(data, final=not data):
+                data = await pty_session.read()
+                if data:
                     self._record_output(data)
+                if process_data := unicode_decoder.decode(data, final=not data):
                     if await self.write(process_data):
                         self.display = True
                 if not data:
                     break
         finally:
-            transport.close()
+            pty_session.close()
 
         self.finalize()
-        return_code = self._return_code = await process.wait()
+        return_code = await process.wait()
+        self.session.set_exit(return_code)
 
         if return_code == 0:
             self.add_class("-success")
@@ -260,61 +205,20 @@ class TerminalTool(Terminal):
     def _record_output(self, data: bytes) -> None:
         """Keep a record of the bytes left.
 
-        Store at most the limit set in self._output_byte_limit (if set).
+        Store at most the output byte limit of the session (if set).
 
         """
-
-        self._output.append(data)
-        self._output_bytes_count += len(data)
-        self._bytes_read += len(data)
-
-        if self._output_byte_limit is None:
-            return
-
-        while self._output_bytes_count > self._output_byte_limit and self._output:
-            oldest_bytes = self._output[0]
-            oldest_bytes_count = len(oldest_bytes)
-            if self._output_bytes_count - oldest_bytes_count < self._output_byte_limit:
-                break
-            self._output.popleft()
-            self._output_bytes_count -= oldest_bytes_count
+        self.session.output.write(data)
 
     def get_output(self) -> tuple[str, bool]:
         """Get the output.
 
+        Only output since the previous call is decoded, so polling is cheap.
+
         Returns:
             A tuple of the output and a bool to indicate if the output was truncated.
         """
-        output_bytes = b"".join(self._output)
-
-        def is_continuation(byte_value: int) -> bool:
-            """Check if the given byte is a utf-8 continuation byte.
-
-            Args:
-                byte_value: Ordinal of the byte.
-
-            Returns:
-                `True` if the byte is a continuation, or `False` if it is the start of a character.
-            """
-            return (byte_value & 0b11000000) == 0b10000000
-
-        truncated = False
-        if (
-            self._output_byte_limit is not None
-            and len(output_bytes) > self._output_byte_limit
-        ):
-            truncated = True
-            output_bytes = output_bytes[-self._output_byte_limit :]
-            # Must start on a utf-8 boundary
-            # Discard initial bytes that aren't a utf-8 continuation byte.
-            for offset, byte_value in enumerate(output_bytes):
-                if not is_continuation(byte_value):
-                    if offset:
-                        output_bytes = output_bytes[offset:]
-                    break
-
-        output = output_bytes.decode("utf-8", "replace")
-        return output, truncated
+        return self.session.output.get_text()
 
 
 if __name__ == "__main__":
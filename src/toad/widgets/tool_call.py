@@ -1,5 +1,5 @@
 import re  # re2 doesn't have MULTILINE
-from typing import Iterable
+from typing import Iterable, cast
 from rich.text import Text
 
 from textual import on
@@ -11,6 +11,7 @@ from textual.content import Content
 from textual.reactive import var
 from textual.css.query import NoMatches
 from textual import containers
+from textual.widget import Widget
 from textual.widgets import Static, Markdown
 
 from toad.app import ToadApp
@@ -73,6 +74,8 @@ class ToolCall(containers.VerticalGroup):
         classes: str | None = None,
     ) -> None:
         self._tool_call = tool_call
+        self._content_blocks: list[tuple[protocol.ToolCallContent, list[Widget]]] = []
+        """Content of the tool call, and the widgets composed for each item."""
         super().__init__(id=id, classes=classes)
 
     @property
@@ -82,7 +85,7 @@ class ToolCall(containers.VerticalGroup):
     @tool_call.setter
     def tool_call(self, tool_call: protocol.ToolCall):
         self._tool_call = tool_call
-        self.refresh(recompose=True)
+        self.call_later(self.update_tool_call)
 
     def get_block_menu(self) -> Iterable[MenuItem]:
         if self.expanded:
@@ -116,16 +119,77 @@ class ToolCall(containers.VerticalGroup):
         content: list[protocol.ToolCallContent] = tool_call.get("content", None) or []
         title = tool_call.get("title", "title")
 
-        self.has_content = False
-        content_update = list(self._compose_content(content))
+        self.has_content = any(map(self._is_content, content))
+        self._content_blocks = [
+            (item, list(self._compose_content(item))) for item in content
+        ]
 
         yield (header := ToolCallHeader(self.tool_call_header_content, markup=False))
         header.tooltip = title
         with containers.VerticalGroup(id="tool-content"):
-            yield from content_update
+            for _item, widgets in self._content_blocks:
+                yield from widgets
 
         self.call_after_refresh(self.check_expand)
 
+    async def update_tool_call(self) -> None:
+        """Update the mounted widgets for the current tool call.
+
+        The header is updated in place. Content items which are unchanged keep their
+        widgets (so diffs aren't prepared again); widgets are only composed for new or
+        changed items.
+
+        """
+        try:
+            header = self.query_one(ToolCallHeader)
+            content_container = self.query_one("#tool-content")
+        except NoMatches:
+            # Not composed yet
+            return
+        tool_call = self._tool_call
+        content: list[protocol.ToolCallContent] = tool_call.get("content", None) or []
+
+        previous_blocks = self._content_blocks
+        content_blocks: list[tuple[protocol.ToolCallContent, list[Widget] | None]] = []
+        stale_widgets: list[Widget] = []
+        for index, item in enumerate(content):
+            if index < len(previous_blocks):
+                previous_item, widgets = previous_blocks[index]
+                if previous_item is item or previous_item == item:
+                    content_blocks.append((item, widgets))
+                    continue
+                stale_widgets.extend(widgets)
+            content_blocks.append((item, None))
+        for _item, widgets in previous_blocks[len(content) :]:
+            stale_widgets.extend(widgets)
+
+        self.has_content = any(map(self._is_content, content))
+        with self.app.batch_update():
+            header.update(self.tool_call_header_content)
+            header.tooltip = tool_call.get("title", "title")
+            if stale_widgets:
+                await content_container.remove_children(stale_widgets)
+            for index, (item, widgets) in enumerate(content_blocks):
+                if widgets is not None:
+                    continue
+                widgets = list(self._compose_content(item))
+                content_blocks[index] = (item, widgets)
+                if widgets:
+                    # Mount before the widgets of the next unchanged item
+                    before = next(
+                        (
+                            next_widgets[0]
+                            for _next_item, next_widgets in content_blocks[index + 1 :]
+                            if next_widgets
+                        ),
+                        None,
+                    )
+                    await content_container.mount_all(widgets, before=before)
+        self._content_blocks = cast(
+            list[tuple[protocol.ToolCallContent, list[Widget]]], content_blocks
+        )
+        self.call_after_refresh(self.check_expand)
+
     def check_expand(self) -> None:
         """Check if the tool call should auto-expand."""
         if not self.has_content:
@@ -199,9 +263,17 @@ class ToolCall(containers.VerticalGroup):
         else:
             self.app.bell()
 
-    def _compose_content(
-        self, tool_call_content: list[protocol.ToolCallContent]
-    ) -> ComposeResult:
+    @classmethod
+    def _is_content(cls, item: protocol.ToolCallContent) -> bool:
+        """Is the item displayed as content (which may be expanded)?"""
+        match item:
+            case {"type": "content", "content": _}:
+                return True
+            case {"type": "diff", "path": _, "oldText": _, "newText": _}:
+                return True
+        return False
+
+    def _compose_content(self, item: protocol.ToolCallContent) -> ComposeResult:
         def compose_content_block(
             content_block: protocol.ContentBlock,
         ) -> ComposeResult:
@@ -223,30 +295,26 @@ class ToolCall(containers.VerticalGroup):
                     else:
                         yield TextContent(text, markup=False)
 
-        for content in tool_call_content:
-            match content:
-                case {"type": "content", "content": sub_content}:
-                    yield from compose_content_block(sub_content)
-                    self.has_content = True
-                case {
-                    "type": "diff",
-                    "path": path,
-                    "oldText": old_text,
-                    "newText": new_text,
-                }:
-                    from toad.widgets.diff_view import DiffView
-
-                    yield (diff_view := DiffView(path, path, old_text or "", new_text))
-
-                    if isinstance(self.app, ToadApp):
-                        diff_view_setting = self.app.settings.get("diff.view", str)
-                        diff_view.split = diff_view_setting == "split"
-                        diff_view.auto_split = diff_view_setting == "auto"
-
-                    self.has_content = True
-
-                case {"type": "terminal", "terminalId": terminal_id}:
-                    pass
+        match item:
+            case {"type": "content", "content": sub_content}:
+                yield from compose_content_block(sub_content)
+            case {
+                "type": "diff",
+                "path": path,
+                "oldText": old_text,
+                "newText": new_text,
+            }:
+                from toad.widgets.diff_view import DiffView
+
+                yield (diff_view := DiffView(path, path, old_text or "", new_text))
+
+                if isinstance(self.app, ToadApp):
+                    diff_view_setting = self.app.settings.get("diff.view", str)
+                    diff_view.split = diff_view_setting == "split"
+                    diff_view.auto_split = diff_view_setting == "auto"
+
+            case {"type": "terminal", "terminalId": terminal_id}:
+                pass
 
 
 if __name__ == "__main__":
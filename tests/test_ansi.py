@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from toad.ansi import TerminalState
+from toad.ansi._ansi import ScrollMargin
+from toad.ansi._fold_index import FoldIndex
+
+
+def test_fold_index_out_of_range() -> None:
+    fold_index = FoldIndex([1, 2, 3])
+    with pytest.raises(IndexError):
+        fold_index.set_count(-1, 1)
+    with pytest.raises(IndexError):
+        fold_index.set_count(3, 1)
+    with pytest.raises(IndexError):
+        fold_index.prefix(-1)
+    with pytest.raises(IndexError):
+        fold_index.prefix(4)
+    with pytest.raises(IndexError):
+        fold_index.find(-1)
+    with pytest.raises(IndexError):
+        fold_index.find(6)
+    assert fold_index.prefix(3) == 6
+    assert fold_index.find(5) == (2, 2)
+
+
+def test_scroll_margin_zero() -> None:
+    """A scroll margin of 0 is treated as 1 (the first line)."""
+
+    async def write() -> list[str]:
+        state = TerminalState(None, width=20, height=5)
+        await state.write("a\nb\nc\n")
+        await state.write("x" * 37 + "\x1b[0;3r\x1b[1T")
+        return [line.content.plain for line in state.buffer.lines]
+
+    assert asyncio.run(write()) == ["", "a", "b", "x" * 37]
+
+
+def test_reflow_cursor_past_end() -> None:
+    """The cursor stays past the last line, when a reflow is spread over slices."""
+
+    async def reflow(line_count: int) -> tuple[int, int, int]:
+        state = TerminalState(None, width=40, height=6)
+        await state.write("\theo\x1b[25B\x1b[22Ge\x1b[11B")
+        state.update_size(10, 6)
+        while state.continue_reflow(line_count):
+            pass
+        buffer = state.buffer
+        return (buffer.cursor_line, buffer.cursor_offset, buffer.fold_index.total)
+
+    assert asyncio.run(reflow(1)) == asyncio.run(reflow(1000)) == (29, 0, 29)
+
+
+def test_scroll_negative_margin() -> None:
+    """Scrolling with a negative margin doesn't wrap around to the end of the buffer."""
+
+    async def write() -> TerminalState:
+        state = TerminalState(None, width=20, height=5)
+        await state.write("a\nb\nc\nd\ne")
+        state.buffer.scroll_margin = ScrollMargin(-1, 2)
+        await state.write("\x1b[1T")
+        return state
+
+    state = asyncio.run(write())
+    lines = state.buffer.lines
+    assert [line.content.plain for line in lines] == ["", "a", "b", "d", "e"]
+    assert [fold.line_no for line in lines for fold in line.folds] == [0, 1, 2, 3, 4]
+
+
+def test_scrollback_keeps_screen_lines() -> None:
+    """Lines on screen aren't evicted, when the terminal is taller than the cap."""
+
+    async def write() -> tuple[TerminalState, int, int]:
+        state = TerminalState(None, width=40, height=24, scrollback_lines=100)
+        state.update_size(40, 150)
+        await state.write("".join(f"line {line_no}\r\n" for line_no in range(400)))
+        spill_file = state._scrollback_lines._spill_file
+        assert spill_file is not None
+        spill_size = spill_file.size
+        for _ in range(2000):
+            await state.write("\x1b[1;1Hstatus")
+        return state, spill_size, spill_file.size
+
+    state, spill_size, updated_spill_size = asyncio.run(write())
+    scrollback_lines = state._scrollback_lines
+    assert scrollback_lines.evicted_count <= len(scrollback_lines) - state.height
+    # Updates to an evicted line are written in place
+    assert updated_spill_size == spill_size
+    assert scrollback_lines[0].content.plain == "status"
+    assert scrollback_lines[1].content.plain == "line 1"
@@ -0,0 +1,40 @@
+import difflib
+
+import pytest
+
+from toad import diff
+
+
+def refine_text(
+    a: list[str], b: list[str]
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """Find removed and added characters by comparing the whole text, as the diff
+    view did previously."""
+    text_a = "\n".join(a)
+    text_b = "\n".join(b)
+    sequence_matcher = difflib.SequenceMatcher(
+        lambda character: character in " \t", text_a, text_b, autojunk=True
+    )
+    removed: list[tuple[int, int]] = []
+    added: list[tuple[int, int]] = []
+    for tag, i1, i2, j1, j2 in sequence_matcher.get_opcodes():
+        if tag == "delete" and "\n" not in text_a[i1 : i2 + 1]:
+            removed.append((i1, i2))
+        if tag == "insert" and "\n" not in text_b[j1 : j2 + 1]:
+            added.append((j1, j2))
+    return removed, added
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        (["foo bar", "baz qux", "z"], ["foo", "baz", "z"]),
+        (["foo", "baz", "z"], ["foo bar", "baz qux", "z"]),
+        (["a", "foo bar"], ["a", "foo"]),
+        (["a", "foo"], ["a", "foo bar"]),
+        (["foo(a)", "z"], ["foo(a, b)", "z"]),
+        (["x", "foo(a, b)", "bar(c, d)", "y"], ["x", "foo(a)", "bar(c)", "y"]),
+    ],
+)
+def test_refine_opcodes(a: list[str], b: list[str]) -> None:
+    assert diff.refine_opcodes(a, b, diff.diff_lines(a, b)) == refine_text(a, b)
@@ -0,0 +1,139 @@
+import asyncio
+import zlib
+from pathlib import Path
+
+import pytest
+from watchdog.events import (
+    DirDeletedEvent,
+    DirMovedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileMovedEvent,
+)
+
+from toad.file_index import INDEX_VERSION, FileIndex
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    root = tmp_path / "project"
+    (root / ".git").mkdir(parents=True)
+    (root / "src" / "package").mkdir(parents=True)
+    (root / "README.md").write_text("")
+    (root / "src" / "main.py").write_text("")
+    (root / "src" / "package" / "module.py").write_text("")
+    return root
+
+
+def get_paths(file_index: FileIndex) -> set[str]:
+    return {path for path in file_index.get_paths() if not path.startswith(".git")}
+
+
+def scan(root: Path, index_path: Path | None = None) -> FileIndex:
+    file_index = FileIndex(root, index_path)
+    file_index.watching = True
+    asyncio.run(file_index.update())
+    return file_index
+
+
+def test_scan(project: Path) -> None:
+    assert get_paths(scan(project)) == {
+        "README.md",
+        "src/",
+        "src/main.py",
+        "src/package/",
+        "src/package/module.py",
+    }
+
+
+def test_save_load(project: Path, tmp_path: Path) -> None:
+    index_path = tmp_path / "file_index.zlib"
+    file_index = scan(project, index_path)
+    file_index.save()
+    data = zlib.decompress(index_path.read_bytes()).decode("utf-8")
+    assert data.partition("\n")[0] == f"toad-file-index {INDEX_VERSION}"
+
+    loaded_index = FileIndex(project, index_path)
+    assert loaded_index._load()
+    assert get_paths(loaded_index) == get_paths(file_index)
+
+
+def test_load_version_mismatch(project: Path, tmp_path: Path) -> None:
+    index_path = tmp_path / "file_index.zlib"
+    index_path.write_bytes(zlib.compress(b"toad-file-index 0\n0README.md"))
+    assert not FileIndex(project, index_path)._load()
+
+
+def test_created_and_deleted(project: Path) -> None:
+    file_index = scan(project)
+    (project / "new.py").write_text("")
+    (project / "README.md").unlink()
+    file_index.record_event(FileCreatedEvent(str(project / "new.py")))
+    file_index.record_event(FileDeletedEvent(str(project / "README.md")))
+    asyncio.run(file_index.update())
+    paths = get_paths(file_index)
+    assert "new.py" in paths
+    assert "README.md" not in paths
+
+
+def test_nested_removal(project: Path) -> None:
+    file_index = scan(project)
+    file_index.record_event(DirDeletedEvent(str(project / "src")))
+    asyncio.run(file_index.update())
+    assert get_paths(file_index) == {"README.md"}
+    assert file_index.list_directory(project / "src" / "package") is None
+
+
+def test_moved(project: Path) -> None:
+    file_index = scan(project)
+    (project / "src" / "main.py").rename(project / "src" / "app.py")
+    file_index.record_event(
+        FileMovedEvent(
+            str(project / "src" / "main.py"), str(project / "src" / "app.py")
+        )
+    )
+    asyncio.run(file_index.update())
+    paths = get_paths(file_index)
+    assert "src/app.py" in paths
+    assert "src/main.py" not in paths
+
+
+def test_directory_moved_in(project: Path, tmp_path: Path) -> None:
+    file_index = scan(project)
+    outside = tmp_path / "outside"
+    (outside / "nested").mkdir(parents=True)
+    (outside / "nested" / "data.txt").write_text("")
+    outside.rename(project / "moved")
+    # There are no events for the contents of a directory moved in to the project
+    file_index.record_event(DirMovedEvent(str(outside), str(project / "moved")))
+    asyncio.run(file_index.update())
+    paths = get_paths(file_index)
+    assert {"moved/", "moved/nested/", "moved/nested/data.txt"} <= paths
+
+
+def test_gitignore_rescan(project: Path) -> None:
+    file_index = scan(project)
+    (project / "debug.log").write_text("")
+    (project / ".gitignore").write_text("*.log\n")
+    file_index.record_event(FileCreatedEvent(str(project / "debug.log")))
+    file_index.record_event(FileCreatedEvent(str(project / ".gitignore")))
+    asyncio.run(file_index.update())
+    # The filter has changed, so the index isn't current until it is rescanned
+    assert file_index.list_directory(project) is None
+    asyncio.run(file_index.update())
+    assert "debug.log" not in get_paths(file_index)
+    listing = file_index.list_directory(project, include_ignored=True)
+    assert listing is not None and ("debug.log", False) in listing
+
+
+def test_list_directory_not_current(project: Path) -> None:
+    file_index = FileIndex(project)
+    assert file_index.list_directory(project) is None
+    file_index.watching = True
+    asyncio.run(file_index.update())
+    listing = file_index.list_directory(project / "src")
+    assert listing is not None
+    assert sorted(listing) == [("main.py", False), ("package", True)]
+    # Without a watcher, changes may be missed
+    file_index.watching = False
+    assert file_index.list_directory(project / "src") is None
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from toad.jsonrpc import API, ConnectionClosed, RequestTimeout
+
+api = API()
+
+
+@api.method()
+def add(a: int, b: int) -> int: ...
+
+
+def test_wait_timeout() -> None:
+    async def call() -> None:
+        connection = API()
+        with connection.request():
+            method_call = add(1, 2)
+        with pytest.raises(RequestTimeout):
+            await method_call.wait(0.01)
+        assert method_call.future.cancelled()
+        assert connection.pending_calls == []
+        # A late response is dropped
+        connection.process_response(
+            {"jsonrpc": "2.0", "id": method_call.id, "result": 3}
+        )
+        assert method_call.future.cancelled()
+
+    asyncio.run(call())
+
+
+def test_default_timeout() -> None:
+    async def call() -> None:
+        connection = API(timeout=0.01)
+        with connection.request():
+            method_call = add(1, 2)
+        assert method_call.timeout == 0.01
+        with pytest.raises(RequestTimeout):
+            await method_call.wait()
+
+    asyncio.run(call())
+
+
+def test_close() -> None:
+    async def call() -> None:
+        connection = API()
+        with connection.request():
+            first_call = add(1, 2)
+            second_call = add(3, 4)
+        assert connection.close("agent exited") == [first_call, second_call]
+        assert connection.pending_calls == []
+        for method_call in (first_call, second_call):
+            with pytest.raises(ConnectionClosed, match="agent exited"):
+                await method_call.wait()
+
+    asyncio.run(call())
+
+
+def test_done_callback_removes_call() -> None:
+    async def call() -> None:
+        connection = API()
+        with connection.request():
+            answered_call = add(1, 2)
+            cancelled_call = add(3, 4)
+        assert connection.pending_calls == [answered_call, cancelled_call]
+        connection.process_response(
+            {"jsonrpc": "2.0", "id": answered_call.id, "result": 3}
+        )
+        assert await answered_call.wait() == 3
+        cancelled_call.future.cancel()
+        await asyncio.sleep(0)
+        assert connection._calls == {}
+
+    asyncio.run(call())
+
+
+def test_separate_request_ids() -> None:
+    async def call() -> None:
+        first_connection = API()
+        second_connection = API()
+        with first_connection.request():
+            first_call = add(1, 2)
+        with second_connection.request():
+            second_call = add(3, 4)
+        assert first_call.id == second_call.id == 1
+        first_connection.process_response({"jsonrpc": "2.0", "id": 1, "result": 3})
+        assert await first_call.wait() == 3
+        assert not second_call.future.done()
+        assert second_connection.pending_calls == [second_call]
+
+    asyncio.run(call())
@@ -0,0 +1,118 @@
+"""
+Benchmark how quickly session updates from an ACP agent are ingested.
+
+Launches a fake agent (in the style of `echo_client.py`, but with no dependencies), which
+responds to a prompt with a burst of `agent_message_chunk` notifications. Chunks are
+coalesced, so the number of messages which reach the conversation is also reported.
+
+    uv run python tools/benchmark_acp_ingest.py
+
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from toad.acp import messages
+
+NOTIFICATIONS = 50_000
+ROUNDS = 3
+
+FAKE_AGENT = """\
+import json
+import sys
+
+write = sys.stdout.write
+for line in sys.stdin:
+    request = json.loads(line)
+    method = request.get("method")
+    if method == "initialize":
+        result = {"protocolVersion": 1, "agentCapabilities": {}}
+    elif method == "session/new":
+        result = {"sessionId": "sess-1"}
+    elif method == "session/prompt":
+        for index in range(NOTIFICATIONS):
+            notification = {
+                "jsonrpc": "2.0",
+                "method": "session/update",
+                "params": {
+                    "sessionId": "sess-1",
+                    "update": {
+                        "sessionUpdate": "agent_message_chunk",
+                        "content": {"type": "text", "text": f"token {index} "},
+                    },
+                },
+            }
+            write(json.dumps(notification) + "\\n")
+        result = {"stopReason": "end_turn"}
+    else:
+        continue
+    write(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": result}) + "\\n")
+    sys.stdout.flush()
+""".replace("NOTIFICATIONS", str(NOTIFICATIONS))
+
+
+class MessageCounter:
+    """Stands in for the conversation, and counts the messages it receives."""
+
+    def __init__(self) -> None:
+        self.updates = 0
+        self.text: list[str] = []
+        self.ready = asyncio.Event()
+
+    def post_message(self, message: object) -> bool:
+        if isinstance(message, messages.Update):
+            self.updates += 1
+            self.text.append(message.text)
+        elif type(message).__name__ == "AgentReady":
+            self.ready.set()
+        return True
+
+    def call_later(self, callback, *args) -> bool:
+        asyncio.get_running_loop().call_soon(
+            lambda: asyncio.ensure_future(callback(*args))
+        )
+        return True
+
+
+async def main() -> None:
+    from toad.acp.agent import Agent
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        agent_path = Path(temp_directory) / "fake_agent.py"
+        agent_path.write_text(FAKE_AGENT)
+        os.environ["TOAD_LOG"] = str(Path(temp_directory) / "agent.log")
+
+        agent = Agent(
+            Path(temp_directory),
+            {
+                "identity": "fake.example.org",
+                "name": "Fake",
+                "run_command": {"*": f"{sys.executable} {agent_path}"},
+            },  # type: ignore[typeddict-item]
+        )
+        counter = MessageCounter()
+        agent.start(counter)  # type: ignore[arg-type]
+        await counter.ready.wait()
+
+        expected_text = "".join(f"token {index} " for index in range(NOTIFICATIONS))
+        for _ in range(ROUNDS):
+            counter.updates = 0
+            counter.text.clear()
+            start = perf_counter()
+            await agent.acp_session_prompt([{"type": "text", "text": "go"}])
+            elapsed = perf_counter() - start
+            assert "".join(counter.text) == expected_text
+            print(
+                f"{NOTIFICATIONS / elapsed:12,.0f} notifications/s "
+                f"({counter.updates:,} messages)"
+            )
+
+        await agent.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
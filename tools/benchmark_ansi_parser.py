@@ -0,0 +1,83 @@
+"""
+Compare the throughput of the ANSI parsers.
+
+Record a PTY capture with something like:
+
+    script -q cargo.txt cargo build
+
+Then run:
+
+    uv run python tools/benchmark_ansi_parser.py cargo.txt
+
+If no captures are given, a synthetic capture is generated.
+
+"""
+
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from toad.ansi._ansi import ANSIParser, GeneratorANSIParser
+
+CHUNK_SIZE = 4096
+
+
+def synthetic_capture() -> str:
+    """Build a capture resembling colorized build and test output."""
+    lines: list[str] = []
+    for index in range(20_000):
+        lines.append(
+            f"\x1b[1m\x1b[32m   Compiling\x1b[0m crate-{index} v0.{index % 10}.0 "
+            f"(/home/user/project/crates/crate-{index})\r\n"
+        )
+        lines.append(
+            f"tests/test_module_{index % 50}.py::test_case_{index} "
+            f"\x1b[32mPASSED\x1b[0m\x1b[32m    [{index % 100:>3}%]\x1b[0m\r\n"
+        )
+        if index % 20 == 0:
+            lines.append(f"\x1b]2025;/home/user/project/{index}\x07")
+            lines.append(f"\r\x1b[2K⠙ installing {index} packages\x1b[K")
+    return "".join(lines)
+
+
+def chunk(text: str) -> list[str]:
+    return [
+        text[offset : offset + CHUNK_SIZE] for offset in range(0, len(text), CHUNK_SIZE)
+    ]
+
+
+def run_parser(parser_type: type, chunks: list[str]) -> tuple[float, list]:
+    parser = parser_type()
+    tokens = []
+    start = perf_counter()
+    for text in chunks:
+        tokens.extend(token for token in parser.feed(text) if isinstance(token, tuple))
+    return perf_counter() - start, tokens
+
+
+def benchmark(name: str, text: str) -> None:
+    chunks = chunk(text)
+    size_mb = len(text.encode("utf-8", errors="replace")) / (1024 * 1024)
+    generator_time, generator_tokens = run_parser(GeneratorANSIParser, chunks)
+    scanner_time, scanner_tokens = run_parser(ANSIParser, chunks)
+    if generator_tokens != scanner_tokens:
+        print(f"{name}: TOKEN MISMATCH")
+    print(
+        f"{name}: {size_mb:.2f}MB, {len(scanner_tokens)} tokens\n"
+        f"  generator {size_mb / generator_time:8.2f} MB/s\n"
+        f"  scanner   {size_mb / scanner_time:8.2f} MB/s "
+        f"({generator_time / scanner_time:.1f}x)"
+    )
+
+
+def main() -> None:
+    paths = sys.argv[1:]
+    if not paths:
+        benchmark("synthetic", synthetic_capture())
+    for path in paths:
+        text = Path(path).read_bytes().decode("utf-8", errors="replace")
+        benchmark(path, text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark diffing large files, as the diff view does.
+
+Compares the previous approach (a `difflib.SequenceMatcher` over lines, and another over
+every character of both files) with `toad.diff` (a patience diff over lines, and
+character comparisons only within replaced lines).
+
+By default, the "before" files are real source from the standard library, and the
+"after" files are copies with scattered edits. Alternatively, pass two paths to diff.
+
+    uv run python tools/benchmark_diff.py
+    uv run python tools/benchmark_diff.py before.py after.py
+
+"""
+
+import difflib
+import inspect
+import random
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from toad import diff
+
+LINE_COUNTS = [5_000, 10_000, 20_000]
+EDIT_COUNT = 50
+DIFFLIB_MAX_LINES = 5_000
+"""The previous approach is quadratic in the size of the file; skip it for larger files."""
+SEED = 42
+
+
+def get_source_lines(line_count: int) -> list[str]:
+    """Get lines of real Python source, from the standard library."""
+    stdlib_path = Path(inspect.getfile(difflib)).parent
+    lines: list[str] = []
+    for path in sorted(stdlib_path.glob("*.py")):
+        lines.extend(path.read_text(encoding="utf-8", errors="replace").splitlines())
+        if len(lines) >= line_count:
+            break
+    return lines[:line_count]
+
+
+def edit_lines(lines: list[str], edit_count: int) -> list[str]:
+    """Make a copy of lines with edits, in the style of an agent editing a file."""
+    rng = random.Random(SEED)
+    edited = list(lines)
+    for _ in range(edit_count):
+        position = rng.randrange(len(edited))
+        edit = rng.random()
+        if edit < 0.5:
+            edited[position] = edited[position].replace("self", "this", 1) + "  # edit"
+        elif edit < 0.75:
+            edited[position:position] = [f"    added_line_{position} = None"] * 3
+        else:
+            del edited[position : position + 3]
+    return edited
+
+
+def diff_difflib(lines_a: list[str], lines_b: list[str]) -> int:
+    """Diff as the diff view did previously."""
+    sequence_matcher = difflib.SequenceMatcher(
+        lambda character: character in " \t", lines_a, lines_b, autojunk=True
+    )
+    groups = list(sequence_matcher.get_grouped_opcodes())
+    sequence_matcher = difflib.SequenceMatcher(
+        lambda character: character in " \t",
+        "\n".join(lines_a),
+        "\n".join(lines_b),
+        autojunk=True,
+    )
+    sequence_matcher.get_opcodes()
+    return len(groups)
+
+
+def diff_toad(lines_a: list[str], lines_b: list[str]) -> int:
+    """Diff with `toad.diff`."""
+    opcodes = diff.diff_lines(lines_a, lines_b)
+    groups = diff.group_opcodes(opcodes)
+    diff.refine_opcodes(lines_a, lines_b, opcodes)
+    return len(groups)
+
+
+def benchmark(name: str, lines_a: list[str], lines_b: list[str]) -> None:
+    print(f"{name} ({len(lines_a):,} lines before, {len(lines_b):,} lines after)")
+    for label, diff_function in (("difflib", diff_difflib), ("toad.diff", diff_toad)):
+        if diff_function is diff_difflib and len(lines_a) > DIFFLIB_MAX_LINES:
+            print(f"    {label:10}    skipped")
+            continue
+        start = perf_counter()
+        group_count = diff_function(lines_a, lines_b)
+        elapsed = perf_counter() - start
+        print(f"    {label:10} {elapsed * 1000:10.1f}ms {group_count:6} hunks")
+
+
+def main() -> None:
+    if len(sys.argv) == 3:
+        path_a, path_b = sys.argv[1:]
+        benchmark(
+            f"{path_a} -> {path_b}",
+            Path(path_a).read_text(encoding="utf-8", errors="replace").splitlines(),
+            Path(path_b).read_text(encoding="utf-8", errors="replace").splitlines(),
+        )
+        return
+    for line_count in LINE_COUNTS:
+        lines = get_source_lines(line_count)
+        benchmark(f"{EDIT_COUNT} edits", lines, edit_lines(lines, EDIT_COUNT))
+
+
+if __name__ == "__main__":
+    main()
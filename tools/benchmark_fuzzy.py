@@ -0,0 +1,115 @@
+"""
+Benchmark the fuzzy matcher used by the path search.
+
+Matches a number of queries against a corpus of 200k paths. To use the paths from a
+directory, rather than a synthetic corpus, run:
+
+    uv run python tools/benchmark_fuzzy.py ~/projects/linux
+
+"""
+
+import gc
+import os
+import sys
+from itertools import islice
+from time import perf_counter
+
+from toad.widgets.path_search import PathFuzzySearch
+
+CORPUS_SIZE = 200_000
+QUERIES = ["swtt", "widgets", "tdtt", "conv.py", "srctoadwidgets", "setattr"]
+
+PATHOLOGICAL_QUERY = "tttttttt"
+PATHOLOGICAL_PATH = "/".join(["tests/test_tools/tt_templates/state/attributes"] * 3)
+"""A path with many ways to match the query."""
+
+DIRECTORIES = [
+    "src",
+    "toad",
+    "widgets",
+    "tests",
+    "static",
+    "assets",
+    "data",
+    "tools",
+    "settings",
+    "templates",
+    "test_data",
+    "utilities",
+]
+NAMES = [
+    "terminal_tool",
+    "conversation",
+    "settings_schema",
+    "text_area",
+    "state",
+    "tree",
+    "toast",
+    "attributes",
+    "__init__",
+    "widget_test",
+]
+EXTENSIONS = [".py", ".tcss", ".txt", ".toml", ".ts", ".json"]
+
+
+def synthetic_corpus() -> list[str]:
+    """Generate paths with plenty of repeated letters."""
+    paths: list[str] = []
+    index = 0
+    while len(paths) < CORPUS_SIZE:
+        depth = 2 + index % 5
+        directories = [
+            DIRECTORIES[(index // (7**level) + level) % len(DIRECTORIES)]
+            for level in range(depth)
+        ]
+        name = NAMES[index % len(NAMES)]
+        extension = EXTENSIONS[index % len(EXTENSIONS)]
+        paths.append(f"{'/'.join(directories)}/{name}_{index}{extension}")
+        index += 1
+    return paths
+
+
+def directory_corpus(root: str) -> list[str]:
+    """Collect paths from a directory."""
+
+    def walk():
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                yield os.path.relpath(os.path.join(directory, filename), root)
+
+    return list(islice(walk(), CORPUS_SIZE))
+
+
+def main() -> None:
+    paths = directory_corpus(sys.argv[1]) if len(sys.argv) > 1 else synthetic_corpus()
+    print(f"{len(paths):,} paths")
+    # Garbage collection of the cache would dominate the slowest match
+    gc.disable()
+    for query in QUERIES:
+        fuzzy_search = PathFuzzySearch(case_sensitive=False, cache_size=len(paths))
+        slowest = 0.0
+        matches = 0
+        start = perf_counter()
+        for path in paths:
+            match_start = perf_counter()
+            score, _offsets = fuzzy_search.match(query, path)
+            slowest = max(slowest, perf_counter() - match_start)
+            if score:
+                matches += 1
+        elapsed = perf_counter() - start
+        print(
+            f"{query!r:>18}: {len(paths) / elapsed:10,.0f} paths/s, "
+            f"slowest {slowest * 1000:6.2f}ms, {matches:,} matches"
+        )
+    gc.enable()
+
+    start = perf_counter()
+    PathFuzzySearch().match(PATHOLOGICAL_QUERY, PATHOLOGICAL_PATH)
+    print(
+        f"{PATHOLOGICAL_QUERY!r} against {len(PATHOLOGICAL_PATH)} characters "
+        f"of repeated letters: {(perf_counter() - start) * 1000:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
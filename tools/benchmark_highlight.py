@@ -0,0 +1,72 @@
+"""
+Benchmark syntax highlighting code for diffs.
+
+Highlights real source from the standard library, then an edited copy: from scratch,
+from the cache (as when the same diff is shown again), and incrementally (reusing the
+highlighted lines of the unedited code).
+
+    uv run python tools/benchmark_highlight.py
+
+"""
+
+import difflib
+import inspect
+import random
+from pathlib import Path
+from time import perf_counter
+
+from toad.highlight_cache import HighlightCache, highlight_lines
+
+LINE_COUNTS = [5_000, 20_000]
+EDIT_COUNT = 10
+SEED = 42
+
+
+def get_source_lines(line_count: int) -> list[str]:
+    """Get lines of real Python source, from the standard library."""
+    stdlib_path = Path(inspect.getfile(difflib)).parent
+    lines: list[str] = []
+    for path in sorted(stdlib_path.glob("*.py")):
+        lines.extend(path.read_text(encoding="utf-8", errors="replace").splitlines())
+        if len(lines) >= line_count:
+            break
+    return lines[:line_count]
+
+
+def edit_lines(lines: list[str], edit_count: int) -> list[str]:
+    """Make a copy of lines with edits, in the style of an agent editing a file."""
+    rng = random.Random(SEED)
+    edited = list(lines)
+    for _ in range(edit_count):
+        position = rng.randrange(len(edited))
+        edited[position] = edited[position] + "  # edit"
+        edited[position:position] = ["    added_line = None"] * 3
+    return edited
+
+
+def main() -> None:
+    for line_count in LINE_COUNTS:
+        lines = get_source_lines(line_count)
+        edited = edit_lines(lines, EDIT_COUNT)
+        print(f"{line_count:,} lines, {EDIT_COUNT} edits")
+
+        start = perf_counter()
+        highlight_lines(edited, "python")
+        print(f"    {'uncached':12} {(perf_counter() - start) * 1000:10.1f}ms")
+
+        cache = HighlightCache(100 * 1024 * 1024)
+        cache.highlight(lines, "python")
+        cache.highlight(edited, "python")
+        start = perf_counter()
+        cache.highlight(edited, "python")
+        print(f"    {'cached':12} {(perf_counter() - start) * 1000:10.1f}ms")
+
+        cache = HighlightCache(100 * 1024 * 1024)
+        cache.highlight(lines, "python")
+        start = perf_counter()
+        cache.highlight(edited, "python", base=lines)
+        print(f"    {'incremental':12} {(perf_counter() - start) * 1000:10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
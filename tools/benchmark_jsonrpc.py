@@ -0,0 +1,103 @@
+"""
+Benchmark dispatching JSON-RPC calls from an agent.
+
+Dispatches `session/update` notifications (tool call updates with a diff, in the style of
+an agent editing a file) with full and shallow parameter validation. Then dispatches a
+batch of calls to a method which waits (in the style of a terminal or permission
+request).
+
+    uv run python tools/benchmark_jsonrpc.py
+
+"""
+
+import asyncio
+from time import perf_counter
+from typing import Any
+
+from toad import jsonrpc
+from toad.acp import protocol
+
+NOTIFICATIONS = 20_000
+DIFF_LINES = 200
+BATCH_SIZE = 50
+WAIT_TIME = 0.01
+
+
+def session_update(index: int) -> jsonrpc.JSONObject:
+    """A tool call update notification, with a diff."""
+    old_text = "\n".join(f"line {line}" for line in range(DIFF_LINES))
+    new_text = old_text.replace("line 1", "changed 1")
+    return {
+        "jsonrpc": "2.0",
+        "method": "session/update",
+        "params": {
+            "sessionId": "sess-1",
+            "update": {
+                "sessionUpdate": "tool_call_update",
+                "toolCallId": f"call-{index % 10}",
+                "status": "in_progress",
+                "content": [
+                    {
+                        "type": "diff",
+                        "path": f"/project/src/module_{index % 10}.py",
+                        "oldText": old_text,
+                        "newText": new_text,
+                    }
+                ],
+                "locations": [{"path": f"/project/src/module_{index % 10}.py"}],
+            },
+        },
+    }
+
+
+def make_server(validation: jsonrpc.Validation) -> jsonrpc.Server:
+    server = jsonrpc.Server()
+
+    @server.method("session/update", validation=validation)
+    def session_update(
+        sessionId: str,
+        update: protocol.SessionUpdate,
+        _meta: dict[str, Any] | None = None,
+    ) -> None:
+        pass
+
+    @server.method("wait")
+    async def wait(delay: float) -> float:
+        await asyncio.sleep(delay)
+        return delay
+
+    return server
+
+
+async def run() -> None:
+    notifications = [session_update(index) for index in range(NOTIFICATIONS)]
+    for validation in ("full", "shallow"):
+        server = make_server(validation)
+        start = perf_counter()
+        for notification in notifications:
+            await server.call(notification)
+        elapsed = perf_counter() - start
+        print(
+            f"session/update ({validation}): {NOTIFICATIONS / elapsed:10,.0f} calls/s"
+        )
+
+    server = make_server("full")
+    batch: jsonrpc.JSONList = [
+        {"jsonrpc": "2.0", "method": "wait", "params": [WAIT_TIME], "id": index}
+        for index in range(BATCH_SIZE)
+    ]
+    start = perf_counter()
+    await server.call(batch)
+    elapsed = perf_counter() - start
+    print(
+        f"batch of {BATCH_SIZE} calls waiting {WAIT_TIME * 1000:.0f}ms: "
+        f"{elapsed * 1000:.1f}ms ({BATCH_SIZE / elapsed:,.0f} calls/s)"
+    )
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark reading from a PTY, with fixed and adaptive batching.
+
+Floods the PTY with `yes`, then types in to `cat` a character at a time (in the style of
+a user typing) and measures how long the echo takes to be read.
+
+    uv run python tools/benchmark_shell_read.py
+
+"""
+
+import asyncio
+import os
+import pty
+import signal
+from contextlib import suppress
+from time import monotonic, perf_counter
+
+from toad.shell_read import ReadStatistics, ShellReader
+
+BUFFER_SIZE = 64 * 1024
+FLOOD_DURATION = 3.0
+KEYSTROKES = 100
+KEYSTROKE_INTERVAL = 1 / 50
+
+
+async def spawn(
+    command: str,
+) -> tuple[asyncio.subprocess.Process, int, asyncio.StreamReader]:
+    """Run a command in a PTY, and connect a reader to it."""
+    master, slave = pty.openpty()
+    process = await asyncio.create_subprocess_shell(
+        command, stdin=slave, stdout=slave, stderr=slave, start_new_session=True
+    )
+    os.close(slave)
+    reader = asyncio.StreamReader(BUFFER_SIZE)
+    await asyncio.get_running_loop().connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(os.dup(master), "rb", 0)
+    )
+    return process, master, reader
+
+
+async def read_fixed(
+    reader: asyncio.StreamReader,
+    buffer_size: int,
+    buffer_period: float = 1 / 100,
+    max_buffer_duration: float = 1 / 60,
+) -> bytes:
+    """Read as the shell did previously, batching every read for a fixed period."""
+    try:
+        data = await reader.read(buffer_size)
+    except OSError:
+        data = b""
+    if data:
+        buffer_time = monotonic() + max_buffer_duration
+        with suppress(asyncio.TimeoutError):
+            while len(data) < buffer_size and (time := monotonic()) < buffer_time:
+                async with asyncio.timeout(min(buffer_time - time, buffer_period)):
+                    try:
+                        if chunk := await reader.read(buffer_size - len(data)):
+                            data += chunk
+                        else:
+                            break
+                    except OSError:
+                        break
+    return data
+
+
+def make_read(name: str, reader: asyncio.StreamReader):
+    """Make a read function, and the statistics it updates."""
+    if name == "adaptive":
+        shell_reader = ShellReader(reader, BUFFER_SIZE)
+        return shell_reader.read, shell_reader.statistics
+    statistics = ReadStatistics()
+
+    async def read() -> bytes:
+        data = await read_fixed(reader, BUFFER_SIZE)
+        statistics.bytes += len(data)
+        statistics.chunks += 1
+        return data
+
+    return read, statistics
+
+
+async def flood(name: str) -> None:
+    process, master, reader = await spawn("yes")
+    read, statistics = make_read(name, reader)
+    end_time = monotonic() + FLOOD_DURATION
+    while monotonic() < end_time:
+        await read()
+    print(
+        f"{name:>8} flood: {statistics.bytes_per_second / 1e6:7.1f} MB/s, "
+        f"{statistics.chunks_per_second:7.1f} chunks/s, "
+        f"mean batch {statistics.mean_batch_size / 1024:7.1f} KB"
+    )
+    os.killpg(process.pid, signal.SIGKILL)
+    await process.wait()
+    os.close(master)
+
+
+async def typing(name: str) -> None:
+    process, master, reader = await spawn("cat")
+    read, _statistics = make_read(name, reader)
+    latencies: list[float] = []
+    for keystroke in range(KEYSTROKES):
+        character = b"abcdefghijklmnopqrstuvwxyz"[keystroke % 26 : keystroke % 26 + 1]
+        start = perf_counter()
+        os.write(master, character)
+        while character not in await read():
+            pass
+        latencies.append(perf_counter() - start)
+        await asyncio.sleep(KEYSTROKE_INTERVAL)
+    latencies.sort()
+    print(
+        f"{name:>8} typing: mean {sum(latencies) / len(latencies) * 1000:6.2f}ms, "
+        f"p95 {latencies[len(latencies) * 95 // 100] * 1000:6.2f}ms"
+    )
+    os.killpg(process.pid, signal.SIGKILL)
+    await process.wait()
+    os.close(master)
+
+
+async def run() -> None:
+    for name in ("fixed", "adaptive"):
+        await flood(name)
+    for name in ("fixed", "adaptive"):
+        await typing(name)
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
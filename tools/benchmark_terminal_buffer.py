@@ -0,0 +1,111 @@
+"""
+Benchmark line updates in the terminal buffer.
+
+Replays a 100k line log, then animates a spinner on the last line, and on the first line.
+Then resizes the terminal, and resizes back again. Then streams a 1MB line (in the style
+of minified JSON) in small chunks. Finally, redraws a full screen application (in the
+style of htop) in the alternate screen.
+
+    uv run python tools/benchmark_terminal_buffer.py
+
+"""
+
+import asyncio
+from time import perf_counter
+
+from toad.ansi import TerminalState
+
+LOG_LINES = 100_000
+SPINNER_FRAMES = 10_000
+SPINNER = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+SCREEN_FRAMES = 500
+LONG_LINE_SIZE = 1024 * 1024
+LONG_LINE_CHUNK_SIZE = 1024
+
+
+def screen_frame(frame: int, width: int = 80, height: int = 24) -> str:
+    """Draw a frame of a full screen application, a cell at a time in places."""
+    rows: list[str] = []
+    for row in range(1, height + 1):
+        value = (frame * 7 + row * 13) % 100
+        bar = "|" * (value * 30 // 100)
+        rows.append(
+            f"\x1b[{row};1H\x1b[1;36m{row:>3}\x1b[0m "
+            f"\x1b[32m[\x1b[31m{bar:<30}\x1b[32m]\x1b[0m "
+            f"\x1b[33m{value:>3}%\x1b[0m process-{(row + frame) % 50:<12}\x1b[K"
+        )
+    # Status line, drawn a cell at a time
+    rows.append(f"\x1b[{height};60H")
+    rows.extend(f"\x1b[7m{character}" for character in f"frame {frame:>8}")
+    rows.append("\x1b[0m")
+    return "".join(rows)
+
+
+async def replay(state: TerminalState, chunks: list[str]) -> float:
+    start = perf_counter()
+    for chunk in chunks:
+        await state.write(chunk)
+    return perf_counter() - start
+
+
+async def main() -> None:
+    state = TerminalState(None, width=80, height=24)
+
+    log = [
+        f"\x1b[32mINFO\x1b[0m {index:>6} processed request /api/items/{index} "
+        f"in {index % 97}ms with status 200 OK and a moderately long tail\r\n"
+        for index in range(LOG_LINES)
+    ]
+    log_time = await replay(
+        state,
+        ["".join(log[offset : offset + 100]) for offset in range(0, LOG_LINES, 100)],
+    )
+    print(f"log:           {LOG_LINES / log_time:12,.0f} lines/s")
+
+    spinner = [
+        f"\r{SPINNER[frame % len(SPINNER)]} building {frame}\x1b[K"
+        for frame in range(SPINNER_FRAMES)
+    ]
+    spinner_time = await replay(state, spinner)
+    print(f"spinner last:  {SPINNER_FRAMES / spinner_time:12,.0f} frames/s")
+
+    top_spinner = [f"\x1b[1;1H{frame}\x1b[K" for frame in spinner]
+    top_spinner_time = await replay(state, top_spinner)
+    print(f"spinner first: {SPINNER_FRAMES / top_spinner_time:12,.0f} frames/s")
+
+    print(f"{state.scrollback_buffer.line_count:,} lines")
+
+    for width in (60, 80):
+        start = perf_counter()
+        state.update_size(width, 24)
+        visible_time = perf_counter() - start
+        while state.continue_reflow():
+            pass
+        reflow_time = perf_counter() - start
+        print(
+            f"resize to {width}:  {visible_time * 1000:8.2f}ms visible, "
+            f"{reflow_time * 1000:8.2f}ms total"
+        )
+
+    long_line = "".join(
+        f'{{"id":{index},"name":"\x1b[33mitem {index}\x1b[0m","tags":["a","b"]}},'
+        for index in range(LONG_LINE_SIZE // 40)
+    )
+    long_line_time = await replay(
+        state,
+        [
+            long_line[offset : offset + LONG_LINE_CHUNK_SIZE]
+            for offset in range(0, len(long_line), LONG_LINE_CHUNK_SIZE)
+        ],
+    )
+    print(f"long line:     {len(long_line) / long_line_time / 1024:12,.0f} KB/s")
+    await state.write("\r\n")
+
+    await state.write("\x1b[?1049h\x1b[2J")
+    frames = [screen_frame(frame) for frame in range(SCREEN_FRAMES)]
+    screen_time = await replay(state, frames)
+    print(f"full screen:   {SCREEN_FRAMES / screen_time:12,.0f} frames/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())